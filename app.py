@@ -17,63 +17,371 @@
 
 # %% ---- flask app ----
 # import libraries
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, request, jsonify, make_response, send_file, url_for
 import geopandas as gpd
+import logging
 import os
-import sys
-import json
+import time
 
 # custom plet functions
-import plet_functions as plet
+import main as plet
+import plet_cache
+import plet_diagnostics
+import plet_geojson
+import plet_jobs
+import plet_logging
+import plet_lookups
 
 # set up the flask app
 app = Flask(__name__)
 
+# set up the request log (see plet_logging.py)
+plet_logging.setup_logging()
+
+# do not print plet module messages (they are counted and logged per
+# request instead) unless PLET_VERBOSITY is set
+if "PLET_VERBOSITY" not in os.environ:
+    plet_diagnostics.set_verbosity(plet_diagnostics.QUIET)
+
+# load lookup tables once at startup (shared by all requests)
+plet_lookups.load_lookups()
+
+# streamed response formats (opt-in with ?format=...) and their mimetypes
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'geojsonseq': 'application/geo+json-seq'}
+
+# stream plet results
+def stream_result(features, stream_format, batch_size, request_id, start_time):
+    '''
+    description:
+    run the plet module on batches of fields and send the results of
+    each batch as soon as they are ready, one feature per line (see
+    STREAM_FORMATS), so the first bytes go out after the first batch and
+    only one batch of results is kept in memory
+
+    parameters:
+        features (list of dict): geojson features from the request
+        stream_format (str): "ndjson" or "geojsonseq"
+        batch_size (int): number of fields per batch
+        request_id (str): request id (for the request log)
+        start_time (float): time the request was received
+
+    yields:
+        chunk (bytes): features of the next batch, one per line
+    '''
+    # set the request id (the response is sent after result() returns)
+    request_id_token = plet_logging.request_id_var.set(request_id)
+    first_batch_seconds = None
+
+    try:
+        # run plet module in batches
+        diag = plet_diagnostics.new_diagnostics()
+        batches = plet.iter_plet_features(features, batch_size=batch_size, diag=diag)
+
+        # send each batch
+        for chunk in plet_geojson.iter_geojson_seq(batches, rs=(stream_format == 'geojsonseq')):
+            if first_batch_seconds is None:
+                first_batch_seconds = round(time.perf_counter() - start_time, 4)
+            yield chunk
+
+        # log
+        plet_logging.log_event(
+            "calculated",
+            n_fields=len(features),
+            diagnostics=diag,
+            seconds=round(time.perf_counter() - start_time, 4))
+        plet_logging.log_event(
+            "responded",
+            status=200,
+            stream_format=stream_format,
+            first_batch_seconds=first_batch_seconds,
+            seconds=round(time.perf_counter() - start_time, 4))
+
+    # log errors (the response is cut short)
+    except Exception:
+        plet_logging.log_event("failed", level=logging.ERROR, exc_info=True, seconds=round(time.perf_counter() - start_time, 4))
+        raise
+
+    # reset the request id
+    finally:
+        plet_logging.request_id_var.reset(request_id_token)
+
 # direct the request
 # allows for post (initial geojson request) and get (updated geojson response)
 @app.route('/result', methods = ['POST', 'GET'])
 
 # define the app functions
 def result():
-    # save the current state of sys.stdout
-    old_stdout = sys.stdout
+    # set the request id (use the client's if given)
+    request_id = request.headers.get('X-Request-ID') or plet_logging.new_request_id()
+    request_id_token = plet_logging.request_id_var.set(request_id)
+    start_time = time.perf_counter()
+
+    try:
+        # get the request
+        data = request.get_json()
+
+        # log
+        plet_logging.log_event("received", n_features=len(data["features"]))
+
+        # streamed response (opt-in, e.g., /result?format=ndjson&batch_size=1000)
+        stream_format = request.args.get('format', 'geojson')
+        if stream_format in STREAM_FORMATS:
+            batch_size = max(request.args.get('batch_size', plet_geojson.BATCH_SIZE, type = int), 1)
+            response = Response(
+                stream_result(data["features"], stream_format, batch_size, request_id, start_time),
+                mimetype = STREAM_FORMATS[stream_format])
+            response.headers['X-Request-ID'] = request_id
+            return response
+
+        # run plet module (only fields that are not cached are calculated,
+        # see plet_cache.py)
+        diag = plet_diagnostics.new_diagnostics()
+        if plet_cache.CACHE_ENABLED:
+            plet_result_json, n_cached = plet_cache.run_plet_cached(data["features"], diag=diag)
+
+        # run plet module (without the cache)
+        else:
+            # convert geojson to geopandas df
+            gdf = gpd.GeoDataFrame.from_features(data["features"])
+
+            # run plet module
+            plet_result = plet.run_plet_gdf(gdf, diag=diag)
+            # TODO update this based on plet module inputs
+
+            # convert plet output from geopandas df to geojson
+            # (encoded once, see plet_geojson.py)
+            plet_result_json = plet_geojson.to_geojson(plet_result)
+            n_cached = 0
+        # TODO check that this is what austin wants > maybe he wants the geojson instead?
+
+        # log (with the number of fields that hit each special condition
+        # for each column, see plet_diagnostics.py)
+        plet_logging.log_event(
+            "calculated",
+            n_fields=len(data["features"]),
+            n_cached=n_cached,
+            diagnostics=diag,
+            seconds=round(time.perf_counter() - start_time, 4))
+
+        # define the response
+        response = make_response(plet_result_json, 200) # sms edited
+        response.mimetype = 'application/json'
+        response.headers['X-Request-ID'] = request_id
+
+        # log
+        plet_logging.log_event("responded", status=200, seconds=round(time.perf_counter() - start_time, 4))
+
+    # log errors
+    except Exception:
+        plet_logging.log_event("failed", level=logging.ERROR, exc_info=True, seconds=round(time.perf_counter() - start_time, 4))
+        raise
+
+    # reset the request id
+    finally:
+        plet_logging.request_id_var.reset(request_id_token)
+
+    # return
+    return response
+
+# run many field collections in one request
+@app.route('/result/batch', methods = ['POST'])
+
+# define the app functions
+def result_batch():
+    # set the request id (use the client's if given)
+    request_id = request.headers.get('X-Request-ID') or plet_logging.new_request_id()
+    request_id_token = plet_logging.request_id_var.set(request_id)
+    start_time = time.perf_counter()
+
+    try:
+        # get the request ({"collections": [feature collection, ...]},
+        # each collection can have an "id")
+        data = request.get_json()
+        collections = data.get("collections") if isinstance(data, dict) else None
+        if not isinstance(collections, list):
+            response = make_response(jsonify({"error": "request must have a collections list"}), 400)
+            response.headers['X-Request-ID'] = request_id
+            plet_logging.log_event("responded", status=400, seconds=round(time.perf_counter() - start_time, 4))
+            return response
+
+        # log
+        plet_logging.log_event("received", n_collections=len(collections))
+
+        # run plet module on all collections in one shared pass
+        diag = plet_diagnostics.new_diagnostics()
+        collection_results = plet.run_plet_collections(collections, diag=diag)
+
+        # log
+        plet_logging.log_event(
+            "calculated",
+            n_collections=len(collection_results),
+            n_errors=sum(res["error"] is not None for res in collection_results),
+            diagnostics=diag,
+            seconds=round(time.perf_counter() - start_time, 4))
+
+        # write results (geojson for each collection, encoded once)
+        collection_json = []
+        for res in collection_results:
+            if res["error"] is None:
+                collection_json.append(
+                    b'{"id":' + plet_geojson.dumps(res["id"]) + b',"status":"ok","n_fields":' + plet_geojson.dumps(len(res["result"]))
+                    + b',"result":' + plet_geojson.to_geojson(res["result"]) + b'}')
+            else:
+                collection_json.append(plet_geojson.dumps({"id": res["id"], "status": "error", "error": res["error"]}))
 
-    # open log file for saving print statements to
-    log_file = open("message.log", "w")
+        # define the response
+        response = make_response(b'{"collections":[' + b",".join(collection_json) + b']}', 200)
+        response.mimetype = 'application/json'
+        response.headers['X-Request-ID'] = request_id
 
-    # define sys.stdout
-    sys.stdout = log_file
+        # log
+        plet_logging.log_event("responded", status=200, seconds=round(time.perf_counter() - start_time, 4))
 
+    # log errors
+    except Exception:
+        plet_logging.log_event("failed", level=logging.ERROR, exc_info=True, seconds=round(time.perf_counter() - start_time, 4))
+        raise
+
+    # reset the request id
+    finally:
+        plet_logging.request_id_var.reset(request_id_token)
+
+    # return
+    return response
+
+# compare bmp scenarios for each field
+@app.route('/result/scenarios', methods = ['POST'])
+
+# define the app functions
+def result_scenarios():
+    # set the request id (use the client's if given)
+    request_id = request.headers.get('X-Request-ID') or plet_logging.new_request_id()
+    request_id_token = plet_logging.request_id_var.set(request_id)
+    start_time = time.perf_counter()
+
+    try:
+        # get the request (same geojson as /result, bmps to compare are
+        # optional, e.g., /result/scenarios?bmp_name=cov_crop_1&bmp_name=terrace,
+        # default is all bmps for the land use of each field)
+        data = request.get_json(silent = True)
+        bmp_names = request.args.getlist('bmp_name') or None
+
+        # check the features (see check_features in main.py)
+        features = data.get("features") if isinstance(data, dict) else None
+        error = plet.check_features(features)
+        if error is not None:
+            response = make_response(jsonify({"error": error}), 400)
+            response.headers['X-Request-ID'] = request_id
+            plet_logging.log_event("responded", status=400, seconds=round(time.perf_counter() - start_time, 4))
+            return response
+
+        # log
+        plet_logging.log_event("received", n_features=len(features), bmp_names=bmp_names)
+
+        # run plet module, then all scenarios in one pass
+        diag = plet_diagnostics.new_diagnostics()
+        plet_result = plet.run_plet_gdf(gpd.GeoDataFrame.from_features(features), diag=diag)
+        scenario_df = plet.run_plet_scenarios(plet_result, bmp_names=bmp_names, diag=diag)
+
+        # log
+        plet_logging.log_event(
+            "calculated",
+            n_fields=len(plet_result),
+            n_scenarios=len(scenario_df),
+            diagnostics=diag,
+            seconds=round(time.perf_counter() - start_time, 4))
+
+        # write results (one record per field and bmp, field is the
+        # position of the feature in the request)
+        scenario_cols = [plet_geojson.column_values(scenario_df[col]) for col in scenario_df.columns]
+        scenario_json = b",".join(plet_geojson.dumps(dict(zip(scenario_df.columns, row))) for row in zip(*scenario_cols))
+
+        # define the response
+        response = make_response(b'{"scenarios":[' + scenario_json + b']}', 200)
+        response.mimetype = 'application/json'
+        response.headers['X-Request-ID'] = request_id
+
+        # log
+        plet_logging.log_event("responded", status=200, seconds=round(time.perf_counter() - start_time, 4))
+
+    # log errors
+    except Exception:
+        plet_logging.log_event("failed", level=logging.ERROR, exc_info=True, seconds=round(time.perf_counter() - start_time, 4))
+        raise
+
+    # reset the request id
+    finally:
+        plet_logging.request_id_var.reset(request_id_token)
+
+    # return
+    return response
+
+# submit a job (returns right away, see plet_jobs.py)
+@app.route('/jobs', methods = ['POST'])
+
+# define the app functions
+def submit_job():
     # get the request
-    data = request.get_json()   
+    data = request.get_json(silent = True)
+    batch_size = max(request.args.get('batch_size', plet_jobs.BATCH_SIZE, type = int), 1)
 
-    # convert geojson to geopandas df
-    gdf = gpd.GeoDataFrame.from_features(data["features"])
+    # check the features before queuing (see check_features in main.py)
+    features = data.get("features") if isinstance(data, dict) else None
+    error = plet.check_features(features)
+    if error is not None:
+        plet_logging.log_event("responded", status=400, error=error)
+        return make_response(jsonify({"error": error}), 400)
 
-    # run plet module
-    plet_result = plet.run_plet(gdf)
-    # TODO update this based on plet module inputs
-    
-    # convert plet output from geopandas df to geojson
-    plet_result = plet_result.to_json()
+    # add job to the queue
+    job = plet_jobs.submit_job(features, batch_size=batch_size)
 
-    # convert geojson to dictionary
-    plet_result_dict = json.loads(plet_result)
-    # TODO check that this is what austin wants > maybe he wants the geojson instead?
-    # TODO check if this step is needed? can't just put run_plet into jsonify()?
+    # log
+    plet_logging.log_event("job_submitted", job_id=job["job_id"], n_fields=job["n_fields"])
 
     # define the response
-    response = make_response(jsonify(plet_result_dict), 200) # sms edited
-    
-    # reset to the initial state of std.out
-    sys.stdout = old_stdout
-
-    # close the log file
-    log_file.close()
+    job_urls = {
+        "status_url": url_for('job_status', job_id=job["job_id"]),
+        "result_url": url_for('job_result', job_id=job["job_id"])}
+    response = make_response(jsonify({**job, **job_urls}), 202)
+    response.headers['Location'] = job_urls["status_url"]
 
     # return
     return response
 
+# get job status and progress
+@app.route('/jobs/<job_id>', methods = ['GET'])
+
+# define the app functions
+def job_status(job_id):
+    # get job
+    job = plet_jobs.get_job(job_id)
+    if job is None:
+        return make_response(jsonify({"error": "job not found"}), 404)
+
+    # return
+    return make_response(jsonify(job), 200)
+
+# get job result
+@app.route('/jobs/<job_id>/result', methods = ['GET'])
+
+# define the app functions
+def job_result(job_id):
+    # get job
+    job = plet_jobs.get_job(job_id)
+    if job is None:
+        return make_response(jsonify({"error": "job not found"}), 404)
+
+    # failed
+    if job["status"] == "failed":
+        return make_response(jsonify(job), 500)
+
+    # not finished yet
+    if job["status"] != "done":
+        return make_response(jsonify(job), 409)
+
+    # return (geojson feature collection, sent from the result file)
+    return send_file(plet_jobs.job_file(job_id, "geojson"), mimetype = 'application/json')
+
 # if script is run directly (i.e., __name__ is set to __main__)
 # run it in debug mode
 if __name__ == '__main__':
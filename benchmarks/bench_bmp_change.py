@@ -0,0 +1,104 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-11-25
+# email: sheila.saia@tetratech.com
+
+# script name: bench_bmp_change.py
+
+# script description: this script benchmarks what-if bmp changes for
+# increasing numbers of fields, comparing a full plet module run with
+# new bmp inputs to run_plet_bmp_change in main.py (which only runs the
+# practice change calculations again), and comparing all bmps with one
+# run_plet_bmp_change call per bmp to one run_plet_scenarios call
+
+# notes:
+# run from the repository root: python benchmarks/bench_bmp_change.py
+# each pair of methods gives the same results
+
+# to do:
+
+
+# %% ---- load libraries ----
+import json
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+
+# custom plet functions
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main as plet
+import plet_diagnostics
+import plet_lookups
+
+
+# %% ---- benchmark functions ----
+# make field data
+def make_features(n_fields):
+    '''
+    description:
+    make n_fields copies of the test fields (as read by the /result
+    endpoint)
+
+    parameters:
+        n_fields (int): number of fields
+
+    returns:
+        features (list of dict): geojson features (one per field)
+    '''
+    repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(repo_path, "data", "fields", "test_field_file_output2.geojson")) as field_file:
+        features = json.load(field_file)["features"]
+
+    # return
+    return (features * (n_fields // len(features) + 1))[:n_fields]
+
+
+# full run with new bmp inputs
+def full_run(features, bmp_name, bmp_ac):
+    '''
+    description:
+    run the plet module on all fields with the new bmp inputs
+    '''
+    field_gdf = gpd.GeoDataFrame.from_features(features)
+    field_gdf["bmp_name"] = bmp_name
+    field_gdf["bmp_ac"] = bmp_ac
+    return plet.run_plet_gdf(field_gdf)
+
+
+# %% ---- run benchmark ----
+if __name__ == "__main__":
+    # quiet plet module messages
+    plet_diagnostics.set_verbosity(plet_diagnostics.QUIET)
+    lookups = plet_lookups.get_lookups()
+    bmp_vals = lookups[plet.BMP_EFF_LOOKUP].index.get_level_values("bmp_name").unique().to_numpy()
+    rng = np.random.default_rng(0)
+
+    # run
+    print("fields   full run (s)   bmp change (s)   bmp loop (s)   scenarios (s)")
+    for n_fields in [1000, 10000, 100000]:
+        features = make_features(n_fields)
+        plet_result = plet.run_plet_gdf(gpd.GeoDataFrame.from_features(features))
+        bmp_name = rng.choice(bmp_vals, n_fields)
+        bmp_ac = rng.uniform(0, 100, n_fields)
+
+        start = time.perf_counter()
+        full_run(features, bmp_name, bmp_ac)
+        full_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        plet.run_plet_bmp_change(plet_result, bmp_name=bmp_name, bmp_ac=bmp_ac)
+        change_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for bmp in bmp_vals:
+            plet.run_plet_bmp_change(plet_result, bmp_name=bmp)
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        plet.run_plet_scenarios(plet_result, bmp_names=bmp_vals)
+        scenario_seconds = time.perf_counter() - start
+        print(f"{n_fields:>6}   {full_seconds:>12.3f}   {change_seconds:>14.3f}   {loop_seconds:>12.3f}   {scenario_seconds:>13.3f}")
@@ -0,0 +1,122 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-11-04
+# email: sheila.saia@tetratech.com
+
+# script name: bench_geojson_response.py
+
+# script description: this script benchmarks writing the /result
+# response body for increasing numbers of fields, comparing the original
+# to_json/json.loads/jsonify round trip with the direct geojson writer in
+# plet_geojson.py (time and peak memory)
+
+# notes:
+# run from the repository root: python benchmarks/bench_geojson_response.py
+# peak memory is measured with tracemalloc (python and numpy allocations)
+# the direct writer uses orjson if it is installed
+
+# to do:
+
+
+# %% ---- load libraries ----
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import geopandas as gpd
+from flask import Flask, jsonify
+
+# custom plet functions
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main as plet
+import plet_diagnostics
+import plet_geojson
+
+
+# %% ---- benchmark functions ----
+# make plet results
+def make_results(n_fields):
+    '''
+    description:
+    run the plet module on n_fields copies of the test fields (as read
+    by the /result endpoint)
+
+    parameters:
+        n_fields (int): number of fields
+
+    returns:
+        plet_result (geopandas geodataframe): plet module results
+    '''
+    repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(repo_path, "data", "fields", "test_field_file_output2.geojson")) as field_file:
+        features = json.load(field_file)["features"]
+    features = (features * (n_fields // len(features) + 1))[:n_fields]
+
+    # return
+    return plet.run_plet_gdf(gpd.GeoDataFrame.from_features(features))
+
+
+# original response body
+def round_trip_body(app, plet_result):
+    '''
+    description:
+    write the response body with to_json, json.loads, and jsonify (the
+    original /result response)
+    '''
+    with app.app_context():
+        return jsonify(json.loads(plet_result.to_json())).get_data()
+
+
+# direct response body
+def direct_body(app, plet_result):
+    '''
+    description:
+    write the response body with plet_geojson.to_geojson
+    '''
+    return plet_geojson.to_geojson(plet_result)
+
+
+# time and peak memory of one call
+def measure(body_func, app, plet_result):
+    '''
+    description:
+    time one call of body_func and get its peak memory
+
+    returns:
+        seconds (float): time (seconds)
+        peak_mb (float): peak memory (MB)
+        body_mb (float): size of the response body (MB)
+    '''
+    # time (without tracemalloc, which slows things down)
+    start = time.perf_counter()
+    body = body_func(app, plet_result)
+    seconds = time.perf_counter() - start
+    del body
+
+    # peak memory
+    tracemalloc.start()
+    body = body_func(app, plet_result)
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+
+    # return
+    return seconds, peak_mb, len(body) / 1e6
+
+
+# %% ---- run benchmark ----
+if __name__ == "__main__":
+    # quiet plet module messages
+    plet_diagnostics.set_verbosity(plet_diagnostics.QUIET)
+    app = Flask(__name__)
+
+    # run
+    print("encoder: " + ("orjson" if plet_geojson.orjson is not None else "json"))
+    print("fields     method       seconds   peak memory (MB)   body (MB)")
+    for n_fields in [1000, 10000, 100000]:
+        plet_result = make_results(n_fields)
+        for name, body_func in [("round trip", round_trip_body), ("direct", direct_body)]:
+            seconds, peak_mb, body_mb = measure(body_func, app, plet_result)
+            print(f"{n_fields:>6}   {name:<10}   {seconds:>7.3f}   {peak_mb:>16.1f}   {body_mb:>9.1f}")
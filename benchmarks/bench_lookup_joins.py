@@ -0,0 +1,204 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-09-30
+# email: sheila.saia@tetratech.com
+
+# script name: bench_lookup_joins.py
+
+# script description: this script benchmarks the plet module lookup
+# joins (usle, cn, runoff nutrients, bmp efficiency) for increasing
+# numbers of fields, comparing the original isin/merge/reset_index/drop
+# chain with the key index gather in plet_lookups.py (one gather per
+# lookup table, and one gather of the precomputed coefficient table
+# instead of the usle and cn gathers)
+
+# notes:
+# run from the repository root: python benchmarks/bench_lookup_joins.py
+# time per field should stay about the same as the number of fields
+# grows (i.e., the gather scales linearly)
+
+# to do:
+
+
+# %% ---- load libraries ----
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import plet_lookups
+
+
+# %% ---- benchmark functions ----
+# make random field data
+def make_fields(n_fields, lookups, seed=0):
+    '''
+    description:
+    make random field data with the key columns used by the lookup joins
+
+    parameters:
+        n_fields (int): number of fields
+        lookups (read-only dict): lookup registry, see plet_lookups.py
+        seed (int): random seed (optional, default is 0)
+
+    returns:
+        field_df (pandas dataframe): field data
+    '''
+    rng = np.random.default_rng(seed)
+    fips_vals = lookups["usle"].index.get_level_values("fips").unique().to_numpy()
+    bmp_vals = lookups["bmp_eff"].index.get_level_values("bmp_name").unique().to_numpy()
+
+    # return
+    return pd.DataFrame({
+        "fips": rng.choice(fips_vals, n_fields),
+        "user_lu": rng.choice(["cropland", "pastureland"], n_fields),
+        "hsg": rng.choice(["a", "b", "c", "d"], n_fields),
+        "animal_inten": rng.choice(["low", "medium", "high"], n_fields),
+        "bmp_name": rng.choice(bmp_vals, n_fields),
+    })
+
+
+# original lookup joins (see main.py before the key index)
+def merge_chain(field_df, lookup_dfs):
+    '''
+    description:
+    original isin/merge/reset_index/drop lookup joins
+
+    parameters:
+        field_df (pandas dataframe): field data, see make_fields function
+        lookup_dfs (dict): raw lookup tables read from csv
+
+    returns:
+        field_df_bmp (pandas dataframe): field data with lookup columns
+    '''
+    usle_lookup = lookup_dfs["usle"]
+    lu_lookup = lookup_dfs["lu"]
+    cn_val_lookup = lookup_dfs["cn_val"].assign(user_lu=lookup_dfs["cn_val"]["land_use"])
+    runoff_nutr_lookup = lookup_dfs["runoff_nutr"].assign(user_lu=lookup_dfs["runoff_nutr"]["land_use"])
+    bmp_eff_lookup = lookup_dfs["bmp_eff"].assign(user_lu=lookup_dfs["bmp_eff"]["land_use"])
+
+    # usle
+    fips_list = field_df["fips"].unique().astype("float64")
+    usle_lookup_sel = (
+        usle_lookup[usle_lookup["fips"].isin(fips_list)]
+        .merge(lu_lookup, how="left", on="land_use")
+        .dropna(subset="user_lu")
+        .reset_index()
+        .drop(["index", "name", "state_name", "land_use"], axis=1)
+    )
+    field_df_usle = field_df.merge(usle_lookup_sel, how="left", on=["fips", "user_lu"])
+
+    # cn
+    hsg_list = field_df_usle["hsg"].unique()
+    cn_val_lookup_sel = (
+        cn_val_lookup[cn_val_lookup["hsg"].isin(hsg_list)]
+        .reset_index()
+        .drop(["index", "land_use", "notes"], axis=1)
+    )
+    field_df_cn = field_df_usle.merge(cn_val_lookup_sel, how="left", on=["hsg", "user_lu"])
+
+    # runoff nutrients
+    inten_list = field_df_cn["animal_inten"].unique()
+    runoff_nutr_lookup_sel = (
+        runoff_nutr_lookup[runoff_nutr_lookup["animal_inten"].isin(inten_list)]
+        .reset_index()
+        .drop(["index", "land_use"], axis=1)
+    )
+    field_df_man = field_df_cn.merge(runoff_nutr_lookup_sel, how="left", on=["user_lu", "animal_inten"])
+
+    # bmp efficiency
+    bmp_list = field_df_man["bmp_name"].unique()
+    bmp_eff_lookup_sel = (
+        bmp_eff_lookup[bmp_eff_lookup["bmp_name"].isin(bmp_list)]
+        .reset_index()
+        .drop(["index", "bmp_full_name", "land_use"], axis=1)
+    )
+
+    # return
+    return field_df_man.merge(bmp_eff_lookup_sel, how="left", on=["bmp_name", "user_lu"])
+
+
+# key index lookup joins
+def gather_chain(field_df, lookups):
+    '''
+    description:
+    key index lookup joins (one gather per lookup table)
+
+    parameters:
+        field_df (pandas dataframe): field data, see make_fields function
+        lookups (read-only dict): lookup registry, see plet_lookups.py
+
+    returns:
+        field_df_bmp (pandas dataframe): field data with lookup columns
+    '''
+    # return
+    return pd.concat([
+        field_df,
+        plet_lookups.gather_lookup(lookups, "usle", field_df, on=["fips", "user_lu"]),
+        plet_lookups.gather_lookup(lookups, "cn_val", field_df, on=["user_lu", "hsg"]),
+        plet_lookups.gather_lookup(lookups, "runoff_nutr", field_df, on=["user_lu", "animal_inten"]),
+        plet_lookups.gather_lookup(lookups, "bmp_eff", field_df, on=["user_lu", "bmp_name"]),
+    ], axis=1)
+
+
+# coefficient table lookup joins
+def coef_chain(field_df, lookups):
+    '''
+    description:
+    key index lookup joins with the coefficient table (usle factors and
+    cn values in one gather, see COEF_TABLES in plet_lookups.py)
+
+    parameters:
+        field_df (pandas dataframe): field data, see make_fields function
+        lookups (read-only dict): lookup registry, see plet_lookups.py
+
+    returns:
+        field_df_bmp (pandas dataframe): field data with lookup columns
+    '''
+    # return
+    return pd.concat([
+        field_df,
+        plet_lookups.gather_lookup(lookups, "coef", field_df, on=["fips", "user_lu", "hsg"]),
+        plet_lookups.gather_lookup(lookups, "runoff_nutr", field_df, on=["user_lu", "animal_inten"]),
+        plet_lookups.gather_lookup(lookups, "bmp_eff", field_df, on=["user_lu", "bmp_name"]),
+    ], axis=1)
+
+
+# time a function
+def time_it(func, *args, n_repeat=3):
+    '''
+    description:
+    best wall clock time of n_repeat calls of func(*args) (seconds)
+    '''
+    times = []
+    for i in range(n_repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    # return
+    return min(times)
+
+
+# %% ---- run benchmark ----
+if __name__ == "__main__":
+    # load lookup tables
+    lookups = plet_lookups.load_lookups()
+    lookup_dfs = {
+        name: plet_lookups.read_lookup(plet_lookups.LOOKUP_PATH, plet_lookups.LOOKUP_TABLES[name][0])
+        for name in ["usle", "lu", "cn_val", "runoff_nutr", "bmp_eff"]
+    }
+
+    # run
+    print("n_fields   merge (s)   gather (s)   gather (us/field)   coef gather (s)")
+    for n_fields in [1_000, 10_000, 100_000, 1_000_000]:
+        field_df = make_fields(n_fields, lookups)
+        merge_time = time_it(merge_chain, field_df, lookup_dfs)
+        gather_time = time_it(gather_chain, field_df, lookups)
+        coef_time = time_it(coef_chain, field_df, lookups)
+        print(f"{n_fields:>8}   {merge_time:>9.3f}   {gather_time:>10.3f}   {gather_time / n_fields * 1e6:>17.3f}   {coef_time:>15.3f}")
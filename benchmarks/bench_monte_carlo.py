@@ -0,0 +1,56 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-12-02
+# email: sheila.saia@tetratech.com
+
+# script name: bench_monte_carlo.py
+
+# script description: this script benchmarks the monte carlo
+# uncertainty engine in plet_uncertainty.py for increasing numbers of
+# fields and draws (time and peak memory)
+
+# notes:
+# run from the repository root: python benchmarks/bench_monte_carlo.py
+# peak memory is measured with tracemalloc (python and numpy allocations)
+# and should stay about the same as the number of fields and draws grows
+# (fields are run in chunks, see CHUNK_ROWS in plet_uncertainty.py)
+
+# to do:
+
+
+# %% ---- load libraries ----
+import os
+import sys
+import time
+import tracemalloc
+
+# custom plet functions
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_geojson_response
+import plet_diagnostics
+import plet_uncertainty
+
+
+# %% ---- run benchmark ----
+if __name__ == "__main__":
+    # quiet plet module messages
+    plet_diagnostics.set_verbosity(plet_diagnostics.QUIET)
+
+    # run
+    print("fields   draws   seconds   peak memory (MB)")
+    for n_fields, n_draws in [(1000, 100), (1000, 1000), (10000, 1000)]:
+        plet_result = bench_geojson_response.make_results(n_fields)
+
+        # time (without tracemalloc, which slows things down)
+        start = time.perf_counter()
+        plet_uncertainty.run_monte_carlo(plet_result, n_draws=n_draws, seed=0)
+        seconds = time.perf_counter() - start
+
+        # peak memory
+        tracemalloc.start()
+        plet_uncertainty.run_monte_carlo(plet_result, n_draws=n_draws, seed=0)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        print(f"{n_fields:>6}   {n_draws:>5}   {seconds:>7.2f}   {peak_mb:>16.1f}")
@@ -0,0 +1,83 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-10-14
+# email: sheila.saia@tetratech.com
+
+# script name: bench_result_endpoint.py
+
+# script description: this script measures the throughput of the plet
+# module /result endpoint of a running server
+
+# notes:
+# start the server first, e.g.: gunicorn --config gunicorn.conf.py app:app
+# then run from the repository root:
+# python benchmarks/bench_result_endpoint.py [url] [n_requests]
+# each request sends the test fields in data/fields, repeated to give
+# 4, 400, and 4000 fields per request
+
+# to do:
+
+
+# %% ---- load libraries ----
+import json
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+# %% ---- benchmark functions ----
+# make request body
+def make_body(n_copies):
+    '''
+    description:
+    make a /result request body with n_copies of the test fields
+
+    parameters:
+        n_copies (int): number of copies of the test fields
+
+    returns:
+        body (bytes): geojson feature collection
+    '''
+    repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(repo_path, "data", "fields", "test_field_file_output2.geojson")) as field_file:
+        field_data = json.load(field_file)
+    field_data["features"] = field_data["features"] * n_copies
+
+    # return
+    return json.dumps(field_data).encode()
+
+
+# post one request
+def post(url, body):
+    '''
+    description:
+    post a request body to url and return the response time (seconds)
+    '''
+    start = time.perf_counter()
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as response:
+        response.read()
+
+    # return
+    return time.perf_counter() - start
+
+
+# %% ---- run benchmark ----
+if __name__ == "__main__":
+    # get settings (optional)
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8080/result"
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    # run
+    print("fields/request   clients   requests/s   fields/s   median latency (s)")
+    for n_copies in [1, 100, 1000]:
+        body = make_body(n_copies)
+        for n_clients in [1, 4]:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(n_clients) as pool:
+                times = sorted(pool.map(lambda i: post(url, body), range(n_requests)))
+            total = time.perf_counter() - start
+            print(f"{4 * n_copies:>14}   {n_clients:>7}   {n_requests / total:>10.1f}   {4 * n_copies * n_requests / total:>8.0f}   {times[len(times) // 2]:>18.3f}")
@@ -0,0 +1,37 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-10-07
+# email: sheila.saia@tetratech.com
+
+# script name: build_lookup_bundle.py
+
+# script description: this script compiles the plet module lookup tables
+# (csv files in data/lookups) into the binary lookup bundle that the
+# flask app memory-maps at startup
+
+# notes:
+# run this after every lookup table update (e.g., the annual data
+# update) and when building the docker image:
+# python build_lookup_bundle.py [lookup_path] [bundle_path]
+# the csv files stay the source of truth, the bundle is skipped (and the
+# csv files are read instead) if it was built from other csv files
+
+# to do:
+
+
+# %% ---- load libraries ----
+import sys
+
+# custom plet functions
+import plet_lookups
+
+
+# %% ---- build lookup bundle ----
+if __name__ == "__main__":
+    # get paths (optional)
+    lookup_path = sys.argv[1] if len(sys.argv) > 1 else plet_lookups.LOOKUP_PATH
+    bundle_path = sys.argv[2] if len(sys.argv) > 2 else plet_lookups.BUNDLE_PATH
+
+    # build
+    plet_lookups.build_bundle(lookup_path, bundle_path)
@@ -0,0 +1,66 @@
+# %% --- header ---
+
+# author: brian pickard and sheila saia
+# date created: 2024-10-14
+# email: brian.pickard@tetratech.com and sheila.saia@tetratech.com
+
+# script name: gunicorn.conf.py
+
+# script description: this script contains the gunicorn settings used to
+# serve the plet module flask app in production
+
+# notes:
+# run with: gunicorn --config gunicorn.conf.py app:app
+# the app is preloaded in the gunicorn master process, so the plet
+# module code and the lookup tables are loaded once and shared
+# (copy-on-write) by all worker processes
+# settings can be changed with environment variables:
+# PORT (default 8080), PLET_WORKERS (default number of cpus),
+# PLET_THREADS (default 1), PLET_TIMEOUT (seconds, default 120)
+
+# to do:
+
+
+# %% ---- load libraries ----
+import gc
+import multiprocessing
+import os
+
+
+# %% ---- server settings ----
+# address to listen on
+bind = "0.0.0.0:" + os.environ.get("PORT", "8080")
+
+# number of worker processes (plet calculations are cpu bound so
+# default to one worker per cpu)
+workers = int(os.environ.get("PLET_WORKERS", multiprocessing.cpu_count()))
+
+# number of threads per worker (more than 1 uses the gthread worker)
+threads = int(os.environ.get("PLET_THREADS", 1))
+
+# seconds before a busy worker is restarted
+timeout = int(os.environ.get("PLET_TIMEOUT", 120))
+
+# import the app (and load the lookup tables) before forking workers
+preload_app = True
+
+# log requests and errors to stdout/stderr
+accesslog = "-"
+errorlog = "-"
+
+
+# %% ---- server hooks ----
+# after the app is preloaded and before workers are forked
+def when_ready(server):
+    # move all preloaded objects out of the garbage collector's view so
+    # collections in the workers do not touch (and copy) shared pages
+    gc.freeze()
+
+
+# after a worker is forked
+def post_fork(server, worker):
+    # reload the lookup tables if the csv files changed since the app was
+    # preloaded (e.g., workers restarted with kill -HUP after the annual
+    # data update, see plet_lookups.py)
+    import plet_lookups
+    plet_lookups.check_lookups(force=True)
@@ -13,9 +13,6 @@
 
 
 # to do:
-# how to reference the lookup tables on the server?
-# how to handle multiple types of animals? > current script only
-# considersone animal type (beef cattle)
 # how to handle practice change water quanity calcs?
 # check that plet module values match stepl values
 # send all messages to stdout
@@ -25,7 +22,6 @@
 # how do we handle gw infiltration volume and gw nutrient load
 # baseline vs practice change calcs? > (hold off?) plet doesn't seem to
 # estimate practice change impact (just baseline) on gw loads
-# how do we handle multiple bmps on one field?
 
 
 # %% --- import libraries ---
@@ -33,69 +29,379 @@
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-import os, random, json, sys, importlib
+import os, random, json, sys, importlib, logging
 from flask import Flask, request, jsonify
 
 # custom plet functions
 import plet_functions as plet
+import plet_diagnostics as diagnostics
+import plet_engine as engine
+import plet_logging
+import plet_lookups
 
 # reimport for testing plet functions
 # importlib.reload(plet)
 
 
-# %% ---- plet module ----
-# run plet module
-def run_plet(plet_project_path, gdf_epsg="EPSG:5070"):
+# %% ---- lookup settings ----
+# bmp efficiency and usle lookup tables (see plet_lookups.py)
+# BMP_EFF_LOOKUP = "bmp_eff"
+# USLE_LOOKUP = "usle"
+
+# coefficient table of the usle lookup (usle factors and cn values, see
+# COEF_TABLES in plet_lookups.py)
+# COEF_LOOKUP = "coef"
+
+# for testing only!
+BMP_EFF_LOOKUP = "bmp_eff_testing"
+USLE_LOOKUP = "usle_testing"
+COEF_LOOKUP = "coef_testing"
+
+# animal type of fields without one
+DEFAULT_ANIMAL_TYPE = "beef_cattle"
+
+# other field string columns carried as categoricals (key columns are
+# encoded with the category dictionaries of the lookup registry, see
+# encode_categories in plet_lookups.py)
+CATEGORY_COLUMNS = ["state", "county"]
+
+
+# %% ---- field data checks ----
+# field properties needed by the plet module (all others are optional)
+FIELD_INPUTS = [
+    "user_lu",
+    "area_ac",
+    "bmp_name",
+    "bmp_ac",
+    "n_animals",
+    "n_months",
+    "aa_rain",
+    "r_cor",
+    "rd_cor",
+    "rain_days",
+    "hsg",
+    "fips",
+]
+
+
+# check geojson features
+def check_features(features):
     """
     description:
-    this function performs all plet module functionality for esmc, including:
-    input dataset preprocessing, plet module calculations, and export of
-    new gdf with all calculations included in new files
+    check that a list of geojson features has everything the plet module
+    needs (i.e., properties with all FIELD_INPUTS for every feature)
 
     parameters:
-        # TODO need to add this information
+        features (list of dict): geojson features (one per field)
+
     returns:
-        # TODO need to add this information
+        error (str): description of the first problem found (None if
+        there are no problems)
     """
-    # check function input formats and values
-    # TODO add fucticion to run tests
+    # check list
+    if not isinstance(features, list) or len(features) == 0:
+        return "features must be a list with at least one feature"
+
+    # check each feature
+    for i, feature in enumerate(features):
+        props = feature.get("properties") if isinstance(feature, dict) else None
+        if not isinstance(props, dict):
+            return "feature " + str(i) + " has no properties"
+        missing = [col for col in FIELD_INPUTS if col not in props]
+        if missing:
+            return "feature " + str(i) + " is missing " + ", ".join(missing)
 
-    # define data path
-    data_path = plet_project_path + "/data/"
+    # return
+    return None
 
-    # define lookup data path
-    lookup_path = plet_project_path + "/lookups/"
 
-    # define input field data path
-    input_data_path = data_path + "fields/test_field_file_output2.geojson"
-    # TODO need to fix these paths for app functionality (ask b)
+# %% ---- coefficient inputs ----
+# look up the usle factors and cn value of each field
+def gather_coefs(lookups, field_df, diag=None):
+    """
+    description:
+    this function gets the usle factors and cn value of each field with
+    one gather from the precomputed coefficient table (see COEF_TABLES
+    in plet_lookups.py), if any field is not in the coefficient table
+    (e.g., no usle values for its fips) the usle and cn lookup tables
+    are gathered separately instead, so results and diagnostics are
+    always the same as separate gathers
 
-    # define output data path
-    output_data_gdf_path = data_path + "scratch/test_plet_output.geojson"
-    output_data_df_path = data_path + "scratch/test_plet_output.csv"
-    # TODO need to fix these paths for app functionality (ask b)
+    parameters:
+        lookups (read-only dict): lookup registry, see plet_lookups.py
+        field_df (pandas dataframe): field data with fips, user_lu, and
+        hsg columns
+        diag (dict): diagnostics collector (optional, default is None,
+        see plet_diagnostics.py)
 
-    # input field data
-    field_gdf_raw = gpd.read_file(input_data_path)
+    returns:
+        coef_vals (pandas dataframe): usle factor and cn value columns
+        for each field
+    """
+    # one gather (all fields in the coefficient table)
+    coef_vals = plet_lookups.gather_lookup(
+        lookups, COEF_LOOKUP, field_df, on=["fips", "user_lu", "hsg"]
+    )
+    if not coef_vals.isna().to_numpy().any():
+        return coef_vals
+
+    # usle columns
+    # (usle lookup is indexed by fips and user land use)
+    usle_vals = plet_lookups.gather_lookup(
+        lookups, USLE_LOOKUP, field_df, on=["fips", "user_lu"], diag=diag
+    )
+
+    # cn value column
+    # (cn lookup is indexed by land use and hsg)
+    cn_vals = plet_lookups.gather_lookup(
+        lookups, "cn_val", field_df, on=["user_lu", "hsg"], diag=diag
+    )
+
+    # return
+    return pd.concat([usle_vals, cn_vals], axis=1)
+
+
+# %% ---- bmp inputs ----
+# look up and combine the bmps of each field
+def gather_bmps(lookups, field_df, diag=None):
+    """
+    description:
+    this function looks up the bmp efficiency values of each field and
+    gets the kernel bmp inputs, where a field with more than one bmp has
+    a list of bmp names (bmp_name) and a list of bmp areas (bmp_ac, same
+    order), which are combined into one set of inputs for the field (see
+    combine_bmps in plet_engine.py)
+
+    parameters:
+        lookups (read-only dict): lookup registry, see plet_lookups.py
+        field_df (pandas dataframe): field data with user_lu, area_ac,
+        bmp_name, and bmp_ac columns
+        diag (dict): diagnostics collector (optional, default is None,
+        see plet_diagnostics.py)
+
+    returns:
+        bmp_vals (pandas dataframe): bmp efficiency lookup columns for
+        each field (combined efficiencies for fields with more than one
+        bmp)
+        bmp_cols (dict): kernel bmp inputs for each field, see
+        get_kernel_inputs in plet_engine.py
+    """
+    # one row per bmp (index is the position of the field, encoded
+    # columns stay categorical, see encode_categories in plet_lookups.py)
+    n_fields = len(field_df)
+    bmp_names = pd.Series(
+        field_df["bmp_name"].array, index=np.arange(n_fields)
+    ).explode()
+    bmp_acs = pd.Series(
+        field_df["bmp_ac"].to_numpy(), index=np.arange(n_fields)
+    ).explode()
+    if not np.array_equal(bmp_names.index, bmp_acs.index):
+        raise ValueError(
+            "bmp_name and bmp_ac must have the same number of bmps for each field"
+        )
+    field_pos = bmp_names.index.to_numpy()
+    starts = np.searchsorted(field_pos, np.arange(n_fields + 1))
+
+    # bmp efficiency values of each bmp
+    # (bmp efficiency lookup is indexed by land use and bmp name)
+    bmp_df = pd.DataFrame(
+        {
+            "user_lu": field_df["user_lu"].array.take(field_pos),
+            "bmp_name": bmp_names.array,
+        }
+    )
+    bmp_vals = plet_lookups.gather_lookup(
+        lookups, BMP_EFF_LOOKUP, bmp_df, on=["user_lu", "bmp_name"], diag=diag
+    )
 
+    # kernel bmp inputs of each bmp
+    bmp_cols = {
+        "bmp_ac": bmp_acs.to_numpy(dtype="float64"),
+        "bmp_cc": bmp_df["bmp_name"].isin(engine.CC_BMP_LIST).to_numpy(dtype="int8"),
+    }
+    for col in bmp_vals.columns:
+        bmp_cols[col] = bmp_vals[col].to_numpy(dtype="float64")
+
+    # one bmp per field
+    if len(bmp_df) == n_fields:
+        bmp_vals.index = field_df.index
+        return bmp_vals, bmp_cols
+
+    # combine the bmps of each field
+    field_bmp_cols = engine.combine_bmps(
+        starts, field_df["area_ac"].to_numpy(dtype="float64"), bmp_cols
+    )
+    # (integer lookup columns stay nullable integers, so the values of a
+    # field do not depend on the other fields)
+    field_bmp_vals = pd.DataFrame(
+        {
+            col: field_bmp_cols[col]
+            if bmp_vals[col].dtype.kind == "f"
+            else pd.array(field_bmp_cols[col], dtype="Int64")
+            for col in bmp_vals.columns
+        },
+        index=field_df.index,
+    )
+
+    # return
+    return field_bmp_vals, field_bmp_cols
+
+
+# %% ---- animal inputs ----
+# look up the live animal weight of each field
+def gather_animals(lookups, field_df):
+    """
+    description:
+    this function gets the live animal weight of each field from the
+    animal weight lookup table, where a field with more than one animal
+    type has a list of animal types (animal_type) and a list of animal
+    numbers (n_animals, same order), which are added up with array
+    operations over all animals (no loop over fields)
+
+    parameters:
+        lookups (read-only dict): lookup registry, see plet_lookups.py
+        field_df (pandas dataframe): field data with an n_animals column
+        and an optional animal_type column (fields without an animal
+        type get DEFAULT_ANIMAL_TYPE)
+
+    returns:
+        animal_vals (pandas dataframe): animal_lbs (live animal weight
+        in lbs) for each field, nan if any animal type of the field is
+        not in the animal weight lookup table
+        no_wt (numpy array of bool): True for fields with an animal type
+        that is not in the animal weight lookup table (recorded as
+        unsupported_animal_type by calc_animal_stats)
+    """
+    # animal types (default for fields without one)
+    n_fields = len(field_df)
+    if "animal_type" in field_df.columns:
+        animal_types = field_df["animal_type"].to_numpy(dtype=object)
+    else:
+        animal_types = np.full(n_fields, None, dtype=object)
+
+    # one row per animal type (index is the position of the field)
+    animal_types = pd.Series(animal_types, index=np.arange(n_fields)).explode()
+    animal_types = animal_types.where(animal_types.notna(), DEFAULT_ANIMAL_TYPE)
+    n_animals = pd.Series(
+        field_df["n_animals"].to_numpy(), index=np.arange(n_fields)
+    ).explode()
+    if not np.array_equal(animal_types.index, n_animals.index):
+        raise ValueError(
+            "animal_type and n_animals must have the same number of animal types for each field"
+        )
+
+    # live weight of each animal type
+    # (animal weight lookup is indexed by animal type)
+    wt_vals = plet_lookups.gather_lookup(
+        lookups,
+        "animal_wts",
+        pd.DataFrame({"animal": animal_types.to_numpy()}),
+        on=["animal"],
+    )
+    animal_wt = wt_vals["weight_lb"].to_numpy(dtype="float64")
+    animal_lbs = n_animals.to_numpy(dtype="float64") * animal_wt
+    no_wt = np.isnan(animal_wt)
+
+    # add up the animal types of each field
+    if len(animal_lbs) != n_fields:
+        starts = np.searchsorted(animal_types.index.to_numpy(), np.arange(n_fields))
+        animal_lbs = np.add.reduceat(animal_lbs, starts)
+        no_wt = np.logical_or.reduceat(no_wt, starts)
+
+    # return
+    return pd.DataFrame({"animal_lbs": animal_lbs}, index=field_df.index), no_wt
+
+
+# %% ---- groundwater inputs ----
+# look up the groundwater inputs of each field
+def gather_groundwater(lookups, field_df, diag=None):
+    """
+    description:
+    this function gets the groundwater infiltration fraction (indexed by
+    land use and hsg) and the groundwater nitrogen and phosphorus
+    concentrations (indexed by land use) of each field from the
+    groundwater lookup tables
+
+    parameters:
+        lookups (read-only dict): lookup registry, see plet_lookups.py
+        field_df (pandas dataframe): field data with user_lu and hsg
+        columns
+        diag (dict): diagnostics collector (optional, default is None,
+        see plet_diagnostics.py)
+
+    returns:
+        gw_vals (pandas dataframe): gw_infil_frac, gw_conc_n, and
+        gw_conc_p (mg/L) for each field, nan if there is no lookup match
+    """
+    # infiltration fraction
+    # (groundwater infiltration lookup is indexed by land use and hsg)
+    gw_vals = plet_lookups.gather_lookup(
+        lookups, "gw_infil", field_df, on=["user_lu", "hsg"], diag=diag
+    )
+
+    # nutrient concentrations
+    # (groundwater nutrient lookup is indexed by land use and nutrient)
+    for nutrient, col in [("nitrogen", "gw_conc_n"), ("phosphorus", "gw_conc_p")]:
+        nutrient_df = pd.DataFrame(
+            {"user_lu": field_df["user_lu"].to_numpy(), "nutrient": nutrient},
+            index=field_df.index,
+        )
+        gw_vals[col] = plet_lookups.gather_lookup(
+            lookups, "gw_nutr", nutrient_df, on=["user_lu", "nutrient"], diag=diag
+        )["gw_conc_mgl"]
+
+    # return
+    return gw_vals
+
+
+# %% ---- plet module ----
+# run plet module on field data
+def run_plet_gdf(
+    field_gdf_raw, gdf_epsg="EPSG:5070", lookups=None, diag=None, groundwater=False
+):
+    """
+    description:
+    this function performs the plet module calculations for a set of
+    fields: lookup table joins, plet module calculations, and a new gdf
+    with all calculations included (used by run_plet and the flask app)
+
+    parameters:
+        field_gdf_raw (geopandas geodataframe): field data provided by
+        the user (one row per field)
+        gdf_epsg (str): crs of the field data (optional, default is
+        "EPSG:5070")
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector that is filled with the number
+        of fields that hit each special condition, e.g., no lookup match
+        or no bmp efficiency value (optional, default is None, see
+        plet_diagnostics.py)
+        groundwater (bool): also calculate the baseline and practice
+        change groundwater infiltration volumes and nutrient loads, see
+        gather_groundwater (optional, default is False)
+
+    returns:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended
+    """
     # set data to correct crs
-    field_gdf = field_gdf_raw.set_crs(gdf_epsg, allow_override=True)
+    field_gdf_crs = field_gdf_raw.set_crs(gdf_epsg, allow_override=True)
+
+    # keep attributes only for all calculations below
+    # (geometry is joined back once at the end)
+    field_gdf = pd.DataFrame(field_gdf_crs.drop(columns="geometry"))
 
     # check gdf formats and values provided by the user
     # TODO add fucticion to run tests
 
-    # load lookup tables
-    animal_nutr_lookup = pd.read_csv(str(lookup_path + "animal_nutrient_ratio.csv"))
-    animal_wts_lookup = pd.read_csv(str(lookup_path + "animal_wts.csv"))
-    # bmp_eff_lookup = pd.read_csv(str(lookup_path + "bmp_eff_vals.csv"))
-    cn_val_lookup = pd.read_csv(str(lookup_path + "cn.csv"))
-    lu_lookup = pd.read_csv(str(lookup_path + "lu.csv"))
-    runoff_nutr_lookup = pd.read_csv(str(lookup_path + "runoff_nutrients.csv"))
-    # usle_lookup = pd.read_csv(str(lookup_path + "usle.csv"))
+    # get lookup tables (loaded once per process, see plet_lookups.py)
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
 
-    # for testing only!
-    bmp_eff_lookup = pd.read_csv(str(lookup_path + "bmp_eff_vals_testing.csv"))
-    usle_lookup = pd.read_csv(str(lookup_path + "usle_testing.csv"))
+    # encode string columns as categoricals (small integer codes)
+    field_gdf = plet_lookups.encode_categories(
+        lookups, field_gdf, cols=CATEGORY_COLUMNS
+    )
 
     # append tiger columns
     # TODO insert code to calculate and add columns:
@@ -122,113 +428,573 @@ def run_plet(plet_project_path, gdf_epsg="EPSG:5070"):
     # TODO insert code to calculate and add columns:
     # aa_rain, r_cor, rd_cor, rain_days, fall_frost, frost_avg
 
-    # append usle columns
-    # TODO get unique fips values for fields
-    fips_list = field_gdf["fips"].unique().astype("float64")
-    # get subset of usle data based in fips and land use
-    usle_lookup_sel = (
-        usle_lookup[usle_lookup["fips"].isin(fips_list)]
-        .merge(lu_lookup, how="left", on="land_use")
-        .dropna(subset="user_lu")
-        .reset_index()
-        .drop(["index", "name", "state_name", "land_use"], axis=1)
-    )
-    # merge usle data with field data
-    field_gdf_usle = field_gdf.merge(
-        usle_lookup_sel, how="left", on=["fips", "user_lu"]
-    )
-
-    # append cn value column
-    # get unique hsg values for fields
-    hsg_list = field_gdf_usle["hsg"].unique()
-    # rename column so can merge later
-    cn_val_lookup["user_lu"] = cn_val_lookup["land_use"]
-    # get subset of cn lookup data based in hsg
-    cn_val_lookup_sel = (
-        cn_val_lookup[cn_val_lookup["hsg"].isin(hsg_list)]
-        .reset_index()
-        .drop(["index", "land_use", "notes"], axis=1)
-    )
-    # merge with field data
-    field_gdf_cn = field_gdf_usle.merge(
-        cn_val_lookup_sel, how="left", on=["hsg", "user_lu"]
-    )
+    # append usle and cn value columns
+    # (coefficient table is indexed by fips, user land use, and hsg)
+    coef_vals = gather_coefs(lookups, field_gdf, diag=diag)
+
+    # append live animal weight column (unless the fields have one)
+    # (fields can have a list of animal types, see gather_animals)
+    if "animal_lbs" in field_gdf.columns:
+        field_gdf_cn = pd.concat([field_gdf, coef_vals], axis=1)
+        no_wt = None
+    else:
+        animal_vals, no_wt = gather_animals(lookups, field_gdf)
+        field_gdf_cn = pd.concat([field_gdf, coef_vals, animal_vals], axis=1)
 
     # append animal stats columns
-    field_gdf_ani = plet.calc_animal_stats(field_gdf_cn, animal_type="beef_cattle")
-    # TODO need to adjust this for various animals types
+    field_gdf_ani = plet.calc_animal_stats(field_gdf_cn, diag=diag, unsupported=no_wt)
+
+    # live animal weight is only returned if the fields had one
+    if no_wt is not None:
+        field_gdf_ani = field_gdf_ani.drop(columns="animal_lbs")
 
     # append manure columns
-    # get unique lu values for fields
-    inten_list = field_gdf_ani["animal_inten"].unique()
-    # rename column so can merge later
-    runoff_nutr_lookup["user_lu"] = runoff_nutr_lookup["land_use"]
-    # get subset of gw infiltration data based in hsg
-    runoff_nutr_lookup_sel = (
-        runoff_nutr_lookup[runoff_nutr_lookup["animal_inten"].isin(inten_list)]
-        .reset_index()
-        .drop(["index", "land_use"], axis=1)
+    # (runoff nutrient lookup is indexed by land use and animal intensity)
+    man_vals = plet_lookups.gather_lookup(
+        lookups,
+        "runoff_nutr",
+        field_gdf_ani,
+        on=["user_lu", "animal_inten"],
+        diag=diag,
+    )
+
+    # append bmp efficiency value columns
+    # (fields can have a list of bmps, see gather_bmps)
+    bmp_vals, bmp_cols = gather_bmps(lookups, field_gdf_ani, diag=diag)
+    field_gdf_bmp = pd.concat([field_gdf_ani, man_vals, bmp_vals], axis=1)
+
+    # append groundwater columns (optional)
+    if groundwater:
+        gw_vals = gather_groundwater(lookups, field_gdf_bmp, diag=diag)
+        field_gdf_bmp = pd.concat([field_gdf_bmp, gw_vals], axis=1)
+
+    # run calc_p through calc_perc_change (and the groundwater
+    # calculations) in one pass on column arrays
+    kernel_inputs = engine.get_kernel_inputs(field_gdf_bmp, bmp_cols)
+    kernel_results = engine.run_kernel(kernel_inputs, diag=diag)
+    field_df_results = engine.kernel_frame(kernel_results, index=field_gdf_bmp.index)
+
+    # join results and geometry back to field data (once)
+    field_gdf_final = gpd.GeoDataFrame(
+        pd.concat([field_gdf_bmp, field_df_results], axis=1),
+        geometry=field_gdf_crs.geometry.to_numpy(),
+        crs=field_gdf_crs.crs,
+    )
+
+    # return
+    return field_gdf_final
+
+
+# run plet module again for new bmp inputs
+def run_plet_bmp_change(
+    field_gdf_final, bmp_name=None, bmp_ac=None, lookups=None, diag=None
+):
+    """
+    description:
+    this function recalculates the plet module results of fields that
+    were already run (see run_plet_gdf) for new bmp inputs, only the
+    practice change calculations are run again and the baseline results
+    are reused (see run_kernel in plet_engine.py), so what-if bmp
+    comparisons cost a fraction of a full run
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        bmp_name (str or array-like): new bmp name for all fields or for
+        each field (optional, default is None, i.e., no change)
+        bmp_ac (float or array-like): new bmp area (acres) for all
+        fields or for each field (optional, default is None, i.e., no
+        change)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector (optional, default is None,
+        see plet_diagnostics.py)
+
+    returns:
+        field_gdf_bmp_final (geopandas geodataframe): field data with the
+        new bmp inputs, bmp efficiency values, and plet module results
+        (same columns as field_gdf_final)
+    """
+    # get lookup tables (loaded once per process, see plet_lookups.py)
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # earlier kernel inputs and results
+    field_df = pd.DataFrame(field_gdf_final.drop(columns="geometry"))
+    prev_cols = engine.get_kernel_inputs(field_df, gather_bmps(lookups, field_df)[1])
+    prev_out = {col: field_df[col].to_numpy(dtype="float64") for col in engine.KERNEL_OUTPUTS}
+
+    # new bmp inputs
+    if bmp_name is not None:
+        field_df["bmp_name"] = bmp_name
+    if bmp_ac is not None:
+        field_df["bmp_ac"] = bmp_ac
+
+    # new bmp efficiency values
+    bmp_vals, bmp_cols = gather_bmps(lookups, field_df, diag=diag)
+    field_df[list(bmp_vals.columns)] = bmp_vals
+
+    # run only the calculations downstream of the changed inputs
+    kernel_inputs = engine.get_kernel_inputs(field_df, bmp_cols)
+    kernel_results = engine.run_kernel(
+        kernel_inputs, diag=diag, prev=(prev_cols, prev_out)
+    )
+    field_df_results = engine.kernel_frame(kernel_results, index=field_df.index)
+    field_df[list(field_df_results.columns)] = field_df_results
+
+    # return
+    return gpd.GeoDataFrame(
+        field_df,
+        geometry=field_gdf_final.geometry.to_numpy(),
+        crs=field_gdf_final.crs,
+    )
+
+
+# compare bmp scenarios
+def run_plet_scenarios(
+    field_gdf_final, bmp_names=None, bmp_ac=None, lookups=None, diag=None
+):
+    """
+    description:
+    this function calculates the plet module results of fields that were
+    already run (see run_plet_gdf) for many bmp scenarios at once, e.g.,
+    to rank candidate bmps for each field, only the practice change
+    calculations are run for all fields and scenarios in one pass (see
+    run_kernel_scenarios in plet_engine.py)
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        bmp_names (list of str): bmps to compare for every field
+        (optional, default is None, i.e., all bmps in the bmp efficiency
+        lookup table for the land use of each field)
+        bmp_ac (float or array-like): bmp area (acres) for all fields or
+        for each field (optional, default is None, i.e., the bmp_ac of
+        each field, or the total of its bmp areas if it has more than
+        one bmp)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector (optional, default is None,
+        see plet_diagnostics.py)
+
+    returns:
+        scenario_df (pandas dataframe): one row per field and bmp with
+        field (index label of the field in field_gdf_final), bmp_name,
+        bmp_ac, and the practice change results (e.g., p_run_n, pc_n)
+    """
+    # get lookup tables (loaded once per process, see plet_lookups.py)
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # field kernel inputs and results
+    kernel_inputs = engine.get_kernel_inputs(
+        field_gdf_final, gather_bmps(lookups, field_gdf_final)[1]
+    )
+    kernel_results = {
+        col: field_gdf_final[col].to_numpy(dtype="float64")
+        for col in engine.KERNEL_OUTPUTS + engine.KERNEL_GW_OUTPUTS
+        if col in field_gdf_final.columns
+    }
+    user_lu = field_gdf_final["user_lu"].array
+
+    # scenario rows (field position and bmp of each row)
+    if bmp_names is None:
+        # all bmps for the land use of each field
+        bmp_pairs = lookups[BMP_EFF_LOOKUP].index.to_frame(index=False)
+        bmp_pairs.columns = ["user_lu", "bmp_name"]
+        scenario_rows = pd.DataFrame(
+            {"field_pos": np.arange(len(field_gdf_final)), "user_lu": user_lu}
+        ).merge(bmp_pairs, on="user_lu", sort=False)
+        scenario_rows = scenario_rows.sort_values("field_pos", kind="stable")
+        field_pos = scenario_rows["field_pos"].to_numpy()
+        scenario_bmps = scenario_rows["bmp_name"].to_numpy(dtype=object)
+    else:
+        field_pos = np.repeat(np.arange(len(field_gdf_final)), len(bmp_names))
+        scenario_bmps = np.tile(np.asarray(bmp_names, dtype=object), len(field_gdf_final))
+
+    # bmp inputs of each scenario row (bmp names encoded as categoricals)
+    scenario_df = plet_lookups.encode_categories(
+        lookups,
+        pd.DataFrame({"user_lu": user_lu.take(field_pos), "bmp_name": scenario_bmps}),
     )
-    # merge with field data
-    field_gdf_man = field_gdf_ani.merge(
-        runoff_nutr_lookup_sel, how="left", on=["user_lu", "animal_inten"]
+    bmp_vals = plet_lookups.gather_lookup(
+        lookups, BMP_EFF_LOOKUP, scenario_df, on=["user_lu", "bmp_name"], diag=diag
     )
+    if bmp_ac is None:
+        field_bmp_ac = pd.to_numeric(
+            pd.Series(field_gdf_final["bmp_ac"].to_numpy()).explode()
+        )
+        scenario_bmp_ac = (
+            field_bmp_ac.groupby(level=0).sum(min_count=1).to_numpy(dtype="float64")[field_pos]
+        )
+    else:
+        scenario_bmp_ac = np.broadcast_to(
+            np.asarray(bmp_ac, dtype="float64"), (len(field_gdf_final),)
+        )[field_pos]
+    bmp_cols = {
+        "bmp_ac": scenario_bmp_ac,
+        "bmp_cc": scenario_df["bmp_name"].isin(engine.CC_BMP_LIST).to_numpy(dtype="int8"),
+    }
+    for col in engine.KERNEL_BMP_INPUTS[2:]:
+        bmp_cols[col] = bmp_vals[col].to_numpy(dtype="float64")
+
+    # run practice change calculations for all scenario rows
+    scenario_results = engine.run_kernel_scenarios(
+        kernel_inputs, kernel_results, field_pos, bmp_cols, diag=diag
+    )
+
+    # return (tidy table)
+    scenario_cols = {
+        "field": field_gdf_final.index.to_numpy()[field_pos],
+        "bmp_name": scenario_df["bmp_name"].array,
+        "bmp_ac": scenario_bmp_ac,
+    }
+    for col in engine.KERNEL_OUTPUTS + engine.KERNEL_GW_OUTPUTS:
+        if col in scenario_results:
+            scenario_cols[col] = scenario_results[col]
+    return pd.DataFrame(scenario_cols)
 
-    # append bmp efficiency value column
-    # get unique hsg values for fields
-    bmp_list = field_gdf_man["bmp_name"].unique()
-    # rename column so can merge later
-    bmp_eff_lookup["user_lu"] = bmp_eff_lookup["land_use"]
-    # get subset of bmp eff value lookup data based in bmp_name
-    bmp_eff_lookup_sel = (
-        bmp_eff_lookup[bmp_eff_lookup["bmp_name"].isin(bmp_list)]
-        .reset_index()
-        .drop(["index", "bmp_full_name", "land_use"], axis=1)
+
+# get derivatives of the results
+def run_plet_gradients(field_gdf_final, wrt=None, outputs=None, lookups=None, diag=None):
+    """
+    description:
+    this function calculates the partial derivatives of the plet module
+    results of fields that were already run (see run_plet_gdf) with
+    respect to some kernel inputs, e.g., how much the practice change
+    nitrogen load of each field changes per acre of bmp (see
+    run_kernel_grad in plet_engine.py)
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        wrt (list of str): kernel inputs to get derivatives with respect
+        to (optional, default is None, i.e., engine.GRAD_INPUTS)
+        outputs (list of str): kernel outputs to get derivatives of
+        (optional, default is None, i.e., engine.GRAD_OUTPUTS)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector (optional, default is None,
+        see plet_diagnostics.py)
+
+    returns:
+        grad_df (pandas dataframe): one row per field (same index as
+        field_gdf_final) with a column for each output and input, e.g.,
+        d_p_run_n_d_bmp_ac
+    """
+    # defaults
+    wrt = engine.GRAD_INPUTS if wrt is None else wrt
+    outputs = engine.GRAD_OUTPUTS if outputs is None else outputs
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # field kernel inputs
+    kernel_inputs = engine.get_kernel_inputs(
+        field_gdf_final, gather_bmps(lookups, field_gdf_final)[1]
     )
-    # merge with field data
-    field_gdf_bmp = field_gdf_man.merge(
-        bmp_eff_lookup_sel, how="left", on=["bmp_name", "user_lu"]
+
+    # run kernel with derivatives
+    kernel_grad = engine.run_kernel_grad(kernel_inputs, wrt=wrt, diag=diag)[1]
+
+    # return
+    grad_cols = {}
+    for col in outputs:
+        for i, wrt_col in enumerate(wrt):
+            grad_cols["d_" + col + "_d_" + wrt_col] = kernel_grad[col][i]
+    return pd.DataFrame(grad_cols, index=field_gdf_final.index)
+
+
+# run plet module for many years
+def run_plet_years(field_gdf_final, year_df, lookups=None, diag=None):
+    """
+    description:
+    this function calculates the plet module results of fields that were
+    already run (see run_plet_gdf) for many years of precipitation inputs
+    at once, the static inputs of each field (e.g., usle factors, cn
+    value, bmps) are shared by all years (not copied for each year) and
+    only the calculations that use the precipitation inputs are run for
+    each field and year (see run_kernel in plet_engine.py)
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        year_df (pandas dataframe): one row per field and year with field
+        (index label of the field in field_gdf_final), year, and the
+        precipitation inputs of that year (any of
+        engine.KERNEL_YEAR_INPUTS, e.g., aa_rain and rain_days, inputs
+        that are not given are the same as in field_gdf_final)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector (optional, default is None,
+        see plet_diagnostics.py), counts of the calculations that are run
+        for each year are per field and year
+
+    returns:
+        year_results (pandas dataframe): one row per row of year_df with
+        field, year, and the results that change by year (e.g., b_run_n,
+        p_run_n, pc_n), other results are the same as in field_gdf_final
+    """
+    # get lookup tables (loaded once per process, see plet_lookups.py)
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # check year inputs
+    year_cols = [
+        col for col in engine.KERNEL_YEAR_INPUTS if col in year_df.columns
+    ]
+    if not year_cols:
+        raise ValueError(
+            "year_df must have at least one of "
+            + ", ".join(engine.KERNEL_YEAR_INPUTS)
+        )
+    if year_df.duplicated(["field", "year"]).any():
+        raise ValueError("year_df must have one row per field and year")
+
+    # field and year position of each row
+    field_pos = pd.Index(field_gdf_final.index).get_indexer(year_df["field"])
+    if (field_pos < 0).any():
+        raise ValueError("year_df has fields that are not in field_gdf_final")
+    years, year_pos = np.unique(year_df["year"].to_numpy(), return_inverse=True)
+
+    # earlier kernel inputs and results (fields x 1)
+    prev_cols = {
+        col: vals[:, None]
+        for col, vals in engine.get_kernel_inputs(
+            field_gdf_final, gather_bmps(lookups, field_gdf_final)[1]
+        ).items()
+    }
+    prev_out = {
+        col: field_gdf_final[col].to_numpy(dtype="float64")[:, None]
+        for col in engine.KERNEL_OUTPUTS
+    }
+
+    # precipitation inputs (fields x years)
+    kernel_inputs = dict(prev_cols)
+    for col in year_cols:
+        year_vals = np.broadcast_to(
+            prev_cols[col], (len(field_gdf_final), len(years))
+        ).copy()
+        year_vals[field_pos, year_pos] = year_df[col].to_numpy(dtype="float64")
+        kernel_inputs[col] = year_vals
+
+    # run only the calculations downstream of the precipitation inputs
+    kernel_results = engine.run_kernel(
+        kernel_inputs, diag=diag, prev=(prev_cols, prev_out)
     )
 
-    # TODO is it better to just overwrite/append in the code below,
-    # rather than redefining each time (or maybe it doesn't matter?)
-    # (ask b)
+    # return (tidy table)
+    year_outputs = set()
+    for step, _, _, outputs in engine.KERNEL_STEPS:
+        if step in engine.downstream_steps(year_cols):
+            year_outputs.update(outputs)
+    year_results = {
+        "field": year_df["field"].to_numpy(),
+        "year": year_df["year"].to_numpy(),
+    }
+    for col in engine.KERNEL_OUTPUTS + engine.KERNEL_GW_OUTPUTS:
+        if col in year_outputs and col in kernel_results:
+            year_results[col] = np.broadcast_to(
+                kernel_results[col], (len(field_gdf_final), len(years))
+            )[field_pos, year_pos]
+    return pd.DataFrame(year_results, index=year_df.index)
+
+
+# run plet module on field data in batches
+def iter_plet_features(
+    features, batch_size=1000, gdf_epsg="EPSG:5070", lookups=None, diag=None
+):
+    """
+    description:
+    this function performs the plet module calculations (see
+    run_plet_gdf) on batches of geojson features, so results for the
+    first fields are ready before all fields are calculated (used for
+    streamed responses in the flask app)
+
+    parameters:
+        features (list of dict): geojson features provided by the user
+        (one per field)
+        batch_size (int): number of fields per batch (optional, default
+        is 1000)
+        gdf_epsg (str): crs of the field data (optional, default is
+        "EPSG:5070")
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector that is filled for all
+        batches (optional, default is None, see plet_diagnostics.py)
+
+    yields:
+        batch_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended for the next batch of
+        fields (indexed by the position of each field in features)
+    """
+    # get lookup tables once (all batches use the same lookup tables,
+    # even if they are reloaded part way through)
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # run batches
+    for start in range(0, len(features), batch_size):
+        batch_gdf_raw = gpd.GeoDataFrame.from_features(
+            features[start : start + batch_size]
+        )
+        batch_gdf_final = run_plet_gdf(
+            batch_gdf_raw, gdf_epsg=gdf_epsg, lookups=lookups, diag=diag
+        )
+        batch_gdf_final.index = pd.RangeIndex(start, start + len(batch_gdf_final))
+
+        # return batch
+        yield batch_gdf_final
+
+
+# run plet module on many field collections
+def run_plet_collections(collections, gdf_epsg="EPSG:5070", lookups=None, diag=None):
+    """
+    description:
+    this function performs the plet module calculations (see
+    run_plet_gdf) for many independent field collections (e.g., one per
+    producer or program year) in one shared pass, and splits the
+    results back out by collection (used by the flask app batch
+    endpoint)
 
-    # calculate p
-    field_gdf_p = plet.calc_p(field_gdf_bmp)
+    notes:
+    collections that fail check_features get an error and are left out
+    of the shared pass, if the shared pass fails then each collection is
+    run on its own so only the collections that fail get an error
 
-    # calculate s
-    field_gdf_p = plet.calc_s(field_gdf_p)
+    parameters:
+        collections (list of dict): geojson feature collections, each
+        with a "features" list and an optional "id"
+        gdf_epsg (str): crs of the field data (optional, default is
+        "EPSG:5070")
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector that is filled for all
+        collections (optional, default is None, see plet_diagnostics.py)
 
-    # calculate q
-    field_gdf_q = plet.calc_q(field_gdf_p)
+    returns:
+        collection_results (list of dict): one per collection (in the
+        same order) with the following keys:
+            id: collection id (position in collections if not given)
+            result (geopandas geodataframe): field data with all lookup
+            and plet module columns appended (None if there is an error)
+            error (str): error message (None if there is no error)
+    """
+    # get lookup tables once (all collections use the same lookup tables)
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # check collections
+    collection_results = []
+    for i, collection in enumerate(collections):
+        if not isinstance(collection, dict):
+            collection = {}
+        collection_results.append(
+            {
+                "id": collection.get("id", i),
+                "result": None,
+                "error": check_features(collection.get("features")),
+                "features": collection.get("features"),
+            }
+        )
+    ok_results = [res for res in collection_results if res["error"] is None]
+
+    # run all checked collections in one shared pass
+    # (diagnostics are only kept for runs that finish)
+    try:
+        all_features = [feature for res in ok_results for feature in res["features"]]
+        if all_features:
+            all_diag = diagnostics.new_diagnostics()
+            all_gdf_final = run_plet_gdf(
+                gpd.GeoDataFrame.from_features(all_features),
+                gdf_epsg=gdf_epsg,
+                lookups=lookups,
+                diag=all_diag,
+            )
+
+            # split results by collection
+            start = 0
+            for res in ok_results:
+                end = start + len(res["features"])
+                res["result"] = all_gdf_final.iloc[start:end].reset_index(drop=True)
+                start = end
+            if diag is not None:
+                diagnostics.merge(diag, all_diag)
+
+    # shared pass failed, run each collection on its own to find the error
+    except Exception:
+        plet_logging.log_event(
+            "shared_pass_failed",
+            level=logging.ERROR,
+            exc_info=True,
+            n_collections=len(ok_results),
+        )
+        for res in ok_results:
+            try:
+                res_diag = diagnostics.new_diagnostics()
+                res["result"] = run_plet_gdf(
+                    gpd.GeoDataFrame.from_features(res["features"]),
+                    gdf_epsg=gdf_epsg,
+                    lookups=lookups,
+                    diag=res_diag,
+                )
+                if diag is not None:
+                    diagnostics.merge(diag, res_diag)
+            # log the exception, clients only get a generic error
+            except Exception:
+                plet_logging.log_event(
+                    "collection_failed",
+                    level=logging.ERROR,
+                    exc_info=True,
+                    collection_id=res["id"],
+                )
+                res["result"] = None
+                res["error"] = "plet module calculations failed for this collection"
+
+    # drop input features
+    for res in collection_results:
+        del res["features"]
 
-    # calculate baseline runoff volume
-    field_gdf_brv = plet.calc_base_run_v(field_gdf_q)
+    # return
+    return collection_results
 
-    # calculate baseline runoff nutrient load (for n and p)
-    field_gdf_brn = plet.calc_base_run_nl(field_gdf_brv)
 
-    # calculate sediment loss from uniform erosion
-    field_gdf_e = plet.calc_e(field_gdf_brn)
+# run plet module
+def run_plet(plet_project_path, gdf_epsg="EPSG:5070"):
+    """
+    description:
+    this function performs all plet module functionality for esmc, including:
+    input dataset preprocessing, plet module calculations, and export of
+    new gdf with all calculations included in new files
+
+    parameters:
+        plet_project_path (str): path to the plet project folder
+        gdf_epsg (str): crs of the field data (optional, default is
+        "EPSG:5070")
 
-    # calculate baseline runoff sediment load
-    field_gdf_brs = plet.calc_base_run_sl(field_gdf_e)
+    returns:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+    """
+    # check function input formats and values
+    # TODO add fucticion to run tests
 
-    # calculate practice change runoff volume
-    field_gdf_prv = plet.calc_prac_run_v(field_gdf_brs)
+    # define data path
+    data_path = plet_project_path + "/data/"
 
-    # calculate practice change sediment-bound nutrient load
-    field_gdf_psb = plet.calc_prac_sed_nl(field_gdf_prv)
+    # define input field data path
+    input_data_path = data_path + "fields/test_field_file_output2.geojson"
+    # TODO need to fix these paths for app functionality (ask b)
 
-    # calculate practice change runoff nutrient load (for n and p)
-    field_gdf_prn = plet.calc_prac_run_nl(field_gdf_psb)
+    # define output data path
+    output_data_gdf_path = data_path + "scratch/test_plet_output.geojson"
+    output_data_df_path = data_path + "scratch/test_plet_output.csv"
+    # TODO need to fix these paths for app functionality (ask b)
 
-    # calculate practice change runoff sediment load
-    field_gdf_prs = plet.calc_prac_run_sl(field_gdf_prn)
+    # input field data
+    field_gdf_raw = gpd.read_file(input_data_path)
 
-    # calculate percent change
-    field_gdf_final = plet.calc_perc_change(field_gdf_prs)
+    # run plet module calculations
+    field_gdf_final = run_plet_gdf(field_gdf_raw, gdf_epsg=gdf_epsg)
 
     # export
     field_gdf_final.to_file(output_data_gdf_path)
@@ -0,0 +1,360 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-11-18
+# email: sheila.saia@tetratech.com
+
+# script name: plet_cache.py
+
+# script description: this script contains the plet module result
+# cache, which keeps the encoded result of each field so fields that are
+# sent again without changes are not recalculated
+
+# notes:
+# the cache key of a field is a hash of its properties and geometry,
+# its crs (gdf_epsg), the lookup table version (see plet_lookups.py),
+# and the plet module code version, so results are recalculated after
+# lookup updates or code changes
+# a cached result is the same as a result for the field on its own (its
+# own properties and types, see feature_bodies in plet_geojson.py), not
+# the batch of fields it was first calculated with
+# there are two cache tiers:
+#   memory - least recently used results, up to PLET_CACHE_MB (default
+#   64 MB) per process
+#   disk - files in PLET_CACHE_PATH (default is a plet_cache folder in
+#   the temp directory), shared by all gunicorn workers, oldest files
+#   are deleted when the folder is over PLET_CACHE_DISK_MB (default
+#   1024 MB), set PLET_CACHE_DISK_MB to 0 to turn off the disk tier
+# disk tier files are written by a background thread (made on the first
+# write, i.e., after gunicorn forks the workers), so writes do not slow
+# down requests (results are dropped from the disk tier if the write
+# queue is full)
+# set PLET_CACHE to 0 to turn off the cache
+
+# to do:
+
+
+# %% ---- load libraries ----
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+import geopandas as gpd
+import pyproj
+
+# custom plet functions
+import main as plet
+import plet_geojson
+import plet_lookups
+
+
+# %% ---- cache settings ----
+# turn cache on or off
+CACHE_ENABLED = os.environ.get("PLET_CACHE", "1") != "0"
+
+# memory tier size (bytes)
+CACHE_BYTES = int(float(os.environ.get("PLET_CACHE_MB", 64)) * 1e6)
+
+# disk tier folder and size (bytes)
+CACHE_PATH = os.environ.get("PLET_CACHE_PATH", os.path.join(tempfile.gettempdir(), "plet_cache"))
+CACHE_DISK_BYTES = int(float(os.environ.get("PLET_CACHE_DISK_MB", 1024)) * 1e6)
+
+# number of disk writes between disk tier size checks
+DISK_CHECK_WRITES = 1000
+
+# maximum number of results waiting to be written to disk
+DISK_QUEUE_SIZE = 100000
+
+# plet module code version (hash of the code that makes the results)
+CODE_FILES = ["main.py", "plet_engine.py", "plet_functions.py", "plet_geojson.py", "plet_lookups.py"]
+
+# memory tier (key: encoded feature body, least recently used first)
+_memory = OrderedDict()
+_memory_bytes = 0
+_lock = threading.Lock()
+
+# disk tier write queue and thread (made on the first write)
+_disk_queue = queue.Queue(maxsize=DISK_QUEUE_SIZE)
+_disk_writer = None
+
+
+# %% ---- key functions ----
+# code version
+def code_version(code_path=None):
+    '''
+    description:
+    hash the plet module code that makes the results
+
+    parameters:
+        code_path (str): path to the plet module code (optional, default
+        is the folder of this script)
+
+    returns:
+        version (str): code version (16 hex characters)
+    '''
+    # hash code files
+    code_path = code_path or os.path.dirname(os.path.abspath(__file__))
+    code_hash = hashlib.sha256()
+    for file_name in CODE_FILES:
+        with open(os.path.join(code_path, file_name), "rb") as code_file:
+            code_hash.update(code_file.read())
+
+    # return
+    return code_hash.hexdigest()[:16]
+
+
+# code version (once per process)
+CODE_VERSION = code_version()
+
+
+# field key
+def feature_key(feature, lookup_version, gdf_epsg="EPSG:5070"):
+    '''
+    description:
+    get the cache key of a geojson feature (a hash of its properties,
+    geometry, crs, the lookup version, and the code version)
+
+    parameters:
+        feature (dict): geojson feature
+        lookup_version (str): lookup table version, see plet_lookups.py
+        gdf_epsg (str): crs of the feature (optional, default is
+        "EPSG:5070")
+
+    returns:
+        key (str): cache key (64 hex characters)
+    '''
+    # canonical json (sorted keys, no spaces)
+    feature_vals = [feature.get("properties"), feature.get("geometry")]
+    if plet_geojson.orjson is not None:
+        feature_json = plet_geojson.orjson.dumps(feature_vals, option=plet_geojson.orjson.OPT_SORT_KEYS)
+    else:
+        feature_json = json.dumps(feature_vals, sort_keys=True, separators=(",", ":")).encode()
+
+    # return
+    return hashlib.sha256((lookup_version + CODE_VERSION + str(gdf_epsg) + "\n").encode() + feature_json).hexdigest()
+
+
+# %% ---- cache functions ----
+# disk file path
+def disk_file(key):
+    '''
+    description:
+    get the disk tier file path of a cache key
+    '''
+    # return (split into folders by the first two characters)
+    return os.path.join(CACHE_PATH, key[:2], key)
+
+
+# get cached result
+def get(key):
+    '''
+    description:
+    get a cached result (from memory, else from disk)
+
+    parameters:
+        key (str): cache key, see feature_key function
+
+    returns:
+        value (bytes): cached result (None if not cached)
+    '''
+    # memory tier
+    with _lock:
+        value = _memory.get(key)
+        if value is not None:
+            _memory.move_to_end(key)
+            return value
+
+    # disk tier
+    if CACHE_DISK_BYTES <= 0:
+        return None
+    try:
+        with open(disk_file(key), "rb") as cache_file:
+            value = cache_file.read()
+        os.utime(disk_file(key))
+    except FileNotFoundError:
+        return None
+
+    # keep in memory
+    put_memory(key, value)
+
+    # return
+    return value
+
+
+# add result to memory tier
+def put_memory(key, value):
+    '''
+    description:
+    add a result to the memory tier, removing the least recently used
+    results if the memory tier is full
+    '''
+    global _memory_bytes
+    with _lock:
+        if key in _memory:
+            return
+        _memory[key] = value
+        _memory_bytes += len(value)
+        while _memory_bytes > CACHE_BYTES and _memory:
+            _memory_bytes -= len(_memory.popitem(last=False)[1])
+
+
+# add result
+def put(key, value):
+    '''
+    description:
+    add a result to the cache (memory and disk)
+
+    parameters:
+        key (str): cache key, see feature_key function
+        value (bytes): result to cache
+    '''
+    # memory tier
+    put_memory(key, value)
+
+    # disk tier (written by the disk writer thread)
+    if CACHE_DISK_BYTES <= 0:
+        return
+    global _disk_writer
+    with _lock:
+        if _disk_writer is None:
+            _disk_writer = threading.Thread(target=write_disk, name="plet_cache_writer", daemon=True)
+            _disk_writer.start()
+    try:
+        _disk_queue.put_nowait((key, value))
+    except queue.Full:
+        pass
+
+
+# write disk tier
+def write_disk():
+    '''
+    description:
+    write queued results to the disk tier (runs in the disk writer
+    thread), checking the disk tier size every DISK_CHECK_WRITES writes
+    '''
+    n_writes = 0
+    while True:
+        key, value = _disk_queue.get()
+
+        # write (to a temporary file first and then renamed, so readers
+        # never see a partial file)
+        try:
+            file_path = disk_file(key)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = file_path + "." + uuid.uuid4().hex[:8] + ".tmp"
+            with open(tmp_path, "wb") as cache_file:
+                cache_file.write(value)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            pass
+        _disk_queue.task_done()
+
+        # check disk tier size
+        n_writes += 1
+        if n_writes % DISK_CHECK_WRITES == 0:
+            trim_disk()
+
+
+# trim disk tier
+def trim_disk(max_bytes=None):
+    '''
+    description:
+    delete the least recently used disk tier files until the disk tier
+    is under 90% of its maximum size
+
+    parameters:
+        max_bytes (int): maximum size of the disk tier (optional,
+        default is CACHE_DISK_BYTES)
+    '''
+    # get files (oldest first)
+    max_bytes = CACHE_DISK_BYTES if max_bytes is None else max_bytes
+    cache_files = []
+    for dir_path, _, file_names in os.walk(CACHE_PATH):
+        for file_name in file_names:
+            # skip files that are being written
+            if file_name.endswith(".tmp"):
+                continue
+            try:
+                file_stat = os.stat(os.path.join(dir_path, file_name))
+            except FileNotFoundError:
+                continue
+            cache_files.append((file_stat.st_mtime, file_stat.st_size, os.path.join(dir_path, file_name)))
+    cache_files.sort()
+
+    # delete oldest files
+    total_bytes = sum(file_size for _, file_size, _ in cache_files)
+    for _, file_size, file_path in cache_files:
+        if total_bytes <= 0.9 * max_bytes:
+            break
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= file_size
+
+
+# clear cache
+def clear(disk=False):
+    '''
+    description:
+    clear the memory tier (and the disk tier if disk is True, after
+    queued results are written)
+    '''
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+    if disk:
+        _disk_queue.join()
+        trim_disk(max_bytes=0)
+
+
+# %% ---- cached plet module ----
+# run plet module with the cache
+def run_plet_cached(features, gdf_epsg="EPSG:5070", lookups=None, diag=None):
+    '''
+    description:
+    get the plet module results of geojson features from the cache and
+    calculate (and cache) only the fields that are not cached
+
+    parameters:
+        features (list of dict): geojson features (one per field)
+        gdf_epsg (str): crs of the field data (optional, default is
+        "EPSG:5070")
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+        diag (dict): diagnostics collector for the calculated fields
+        (optional, default is None, see plet_diagnostics.py)
+
+    returns:
+        result_json (bytes): geojson feature collection, see
+        plet_geojson.feature_collection function
+        n_cached (int): number of fields from the cache
+    '''
+    # get lookup tables once
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # get cached results
+    keys = [feature_key(feature, lookups["version"], gdf_epsg) for feature in features]
+    bodies = [get(key) for key in keys]
+    miss = [i for i, body in enumerate(bodies) if body is None]
+
+    # calculate the rest (and cache them), each body has only the
+    # properties of its own feature with their own types, so it does not
+    # depend on the other fields it was calculated with
+    if miss:
+        miss_gdf = gpd.GeoDataFrame.from_features([features[i] for i in miss])
+        miss_gdf_final = plet.run_plet_gdf(miss_gdf, gdf_epsg=gdf_epsg, lookups=lookups, diag=diag)
+        miss_props = [features[i].get("properties") for i in miss]
+        for i, body in zip(miss, plet_geojson.feature_bodies(miss_gdf_final, properties=miss_props)):
+            bodies[i] = body
+            put(keys[i], body)
+
+    # return
+    return plet_geojson.feature_collection(bodies, pyproj.CRS(gdf_epsg)), len(features) - len(miss)
@@ -0,0 +1,155 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-10-28
+# email: sheila.saia@tetratech.com
+
+# script name: plet_diagnostics.py
+
+# script description: this script contains the plet module diagnostics
+# collector, which counts how many fields hit each special condition
+# (e.g., no bmp efficiency value, zero baseline) for each output column
+
+# notes:
+# a diagnostics collector is a plain dictionary of
+# {column: {condition: number of fields}}, so it can be logged or
+# returned as json as is
+# the verbosity level only controls what is printed, counts are always
+# recorded when a collector is passed in
+# verbosity levels:
+#   0 (QUIET) - print nothing (use this on the server)
+#   1 (WARN) - print condition messages only
+#   2 (INFO) - also print a message for each calculated column (default)
+# the default verbosity level can be set with the PLET_VERBOSITY
+# environment variable
+
+# to do:
+
+
+# %% ---- load libraries ----
+import os
+
+
+# %% ---- verbosity settings ----
+# verbosity levels
+QUIET = 0
+WARN = 1
+INFO = 2
+
+# current verbosity level
+_verbosity = int(os.environ.get("PLET_VERBOSITY", INFO))
+
+
+# %% ---- verbosity functions ----
+# get verbosity level
+def get_verbosity():
+    '''
+    description:
+    get the current verbosity level
+
+    returns:
+        verbosity (int): QUIET, WARN, or INFO
+    '''
+    # return
+    return _verbosity
+
+
+# set verbosity level
+def set_verbosity(level):
+    '''
+    description:
+    set the verbosity level for all plet module messages
+
+    parameters:
+        level (int): QUIET, WARN, or INFO
+    '''
+    # check level
+    if level not in (QUIET, WARN, INFO):
+        raise ValueError("verbosity level must be 0 (QUIET), 1 (WARN), or 2 (INFO)")
+
+    # set
+    global _verbosity
+    _verbosity = level
+
+
+# %% ---- diagnostics functions ----
+# new diagnostics collector
+def new_diagnostics():
+    '''
+    description:
+    make a new (empty) diagnostics collector
+
+    returns:
+        diag (dict): diagnostics collector, {column: {condition: count}}
+    '''
+    # return
+    return {}
+
+
+# record a condition
+def record(diag, column, condition, count, message = None):
+    '''
+    description:
+    record the number of fields that hit a condition for an output
+    column, and print the condition message (if verbosity is WARN or
+    higher)
+
+    parameters:
+        diag (dict): diagnostics collector, see new_diagnostics function
+        (if None then nothing is recorded)
+        column (str): output column (e.g., "p_run_n")
+        condition (str): condition name (e.g., "no_efficiency")
+        count (int): number of fields that hit the condition (nothing is
+        recorded or printed if zero)
+        message (str): condition message, where "{n}" is replaced by
+        count (optional, default is no message)
+    '''
+    # nothing to record
+    if count == 0:
+        return
+
+    # record
+    if diag is not None:
+        column_diag = diag.setdefault(column, {})
+        column_diag[condition] = column_diag.get(condition, 0) + int(count)
+
+    # print
+    if message is not None and _verbosity >= WARN:
+        print(message.format(n = count))
+
+
+# print a progress message
+def info(message):
+    '''
+    description:
+    print a progress message (if verbosity is INFO)
+
+    parameters:
+        message (str): progress message
+    '''
+    # print
+    if _verbosity >= INFO:
+        print(message)
+
+
+# combine diagnostics collectors
+def merge(diag, other):
+    '''
+    description:
+    add the counts of one diagnostics collector to another (e.g., to
+    combine the diagnostics of several batches)
+
+    parameters:
+        diag (dict): diagnostics collector that is updated
+        other (dict): diagnostics collector to add
+
+    returns:
+        diag (dict): updated diagnostics collector
+    '''
+    # add counts
+    for column, column_other in other.items():
+        for condition, count in column_other.items():
+            record(diag, column, condition, count)
+
+    # return
+    return diag
@@ -0,0 +1,848 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-09-16
+# email: sheila.saia@tetratech.com
+
+# script name: plet_engine.py
+
+# script description: this script contains the columnar plet module
+# engine, which runs the full calculation chain (calc_p through
+# calc_perc_change) on plain numpy arrays instead of a geodataframe
+
+# notes:
+# all calculations are assumed to be at an annual timestep
+# sediment load is in units of tons
+# nutrient load (nitrogen and phosphorous) is in units of lbs
+# runoff volumnes (all water quantity stuff) are in units of acre-feet
+# results match the step-by-step functions in plet_functions.py to within
+# the last bits of each value (numpy power can differ from python pow in
+# the last bit, see tests/test_engine.py)
+# baseline groundwater infiltration volumes and nutrient loads
+# (calc_base_gw_v and calc_base_gw_nl) are calculated in the same pass
+# when the groundwater inputs are given (see KERNEL_GW_INPUTS)
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+import plet_diagnostics as diagnostics
+
+
+# %% ---- engine columns ----
+# numeric input columns (passed to the kernel as float64 arrays)
+KERNEL_NUM_INPUTS = [
+    'area_ac', 'bmp_ac', 'n_months',
+    'aa_rain', 'r_cor', 'rd_cor', 'rain_days',
+    'cn_value',
+    'r_avg', 'k_avg', 'ls_avg', 'c_avg', 'p_avg',
+    'conc_n', 'conc_p', 'conc_mn', 'conc_mp',
+    'eff_val_quantity', 'eff_val_nitrogen', 'eff_val_phosphorus',
+    'eff_val_sediment']
+
+# categorical input columns (passed to the kernel as int8 codes)
+KERNEL_CAT_INPUTS = ['user_lu', 'bmp_name']
+
+# output columns (in the order the step-by-step functions append them)
+KERNEL_OUTPUTS = [
+    'p', 's', 'q', 'b_run_v', 'b_run_n', 'b_run_p', 'erosion',
+    'del_ratio', 'b_run_s', 'p_cn_value', 'p_run_v', 'e_lbs', 'p_sed_n',
+    'p_sed_p', 'p_run_n', 'p_run_p', 'p_run_s', 'pc_v', 'pc_n', 'pc_p',
+    'pc_s']
+
+# bmp input columns (kernel inputs that depend on the bmp of a field)
+KERNEL_BMP_INPUTS = [
+    'bmp_ac', 'bmp_cc', 'eff_val_quantity', 'eff_val_nitrogen',
+    'eff_val_phosphorus', 'eff_val_sediment']
+
+# precipitation input columns (kernel inputs that can change by year)
+KERNEL_YEAR_INPUTS = ['aa_rain', 'r_cor', 'rd_cor', 'rain_days']
+
+# groundwater input and output columns (optional, the groundwater steps
+# only run when the groundwater inputs are given)
+KERNEL_GW_INPUTS = ['gw_infil_frac', 'gw_conc_n', 'gw_conc_p']
+KERNEL_GW_OUTPUTS = ['b_in_v', 'b_gw_n', 'b_gw_p']
+
+# land use codes (0 is any other or missing land use)
+LU_CODES = {'cropland': 1, 'pastureland': 2}
+
+# cover crop bmp list
+CC_BMP_LIST = ['cov_crop_1', 'cov_crop_2', 'cov_crop_3']
+
+
+# %% ---- input/output functions ----
+# get kernel inputs
+def get_kernel_inputs(df, bmp_cols = None):
+    '''
+    description:
+    pull the columns needed by the kernel out of a (geo)dataframe as
+    contiguous arrays, without copying the geometry
+
+    parameters:
+        df (pandas dataframe or geopandas geodataframe): PLET module
+        dataframe that must have all KERNEL_NUM_INPUTS and
+        KERNEL_CAT_INPUTS columns (i.e., after all lookup joins)
+        bmp_cols (dict): arrays for each KERNEL_BMP_INPUTS column, one
+        value per field, used instead of the bmp columns of df
+        (optional, default is None, see combine_bmps function)
+
+    returns:
+        cols (dict): float64 arrays for each KERNEL_NUM_INPUTS column,
+        plus lu_code (int8 array, see LU_CODES) and bmp_cc (int8 array,
+        1 if cover crop bmp and 0 otherwise), and KERNEL_GW_INPUTS
+        columns if df has all of them
+    '''
+    # numeric inputs
+    cols = {}
+    for col in KERNEL_NUM_INPUTS:
+        if bmp_cols is not None and col in bmp_cols:
+            cols[col] = np.ascontiguousarray(bmp_cols[col], dtype = 'float64')
+        else:
+            cols[col] = np.ascontiguousarray(df[col].to_numpy(dtype = 'float64'))
+
+    # land use code
+    cols['lu_code'] = df['user_lu'].map(LU_CODES).fillna(0).to_numpy(dtype = 'int8')
+
+    # cover crop flag
+    if bmp_cols is not None:
+        cols['bmp_cc'] = np.ascontiguousarray(bmp_cols['bmp_cc'], dtype = 'int8')
+    else:
+        cols['bmp_cc'] = df['bmp_name'].isin(CC_BMP_LIST).to_numpy(dtype = 'int8')
+
+    # groundwater inputs (optional)
+    if all(col in df.columns for col in KERNEL_GW_INPUTS):
+        for col in KERNEL_GW_INPUTS:
+            cols[col] = np.ascontiguousarray(df[col].to_numpy(dtype = 'float64'))
+
+    # return
+    return cols
+
+
+# kernel results to dataframe
+def kernel_frame(out, index = None):
+    '''
+    description:
+    convert kernel results to a dataframe that can be joined to the
+    input (geo)dataframe once
+
+    parameters:
+        out (dict): kernel results, see run_kernel function
+        index (pandas index): index of the result block (optional,
+        default is a range index)
+
+    returns:
+        out_df (pandas dataframe): result block with KERNEL_OUTPUTS columns
+        (plus KERNEL_GW_OUTPUTS columns if the groundwater steps were run)
+    '''
+    # return
+    out_cols = KERNEL_OUTPUTS + [col for col in KERNEL_GW_OUTPUTS if col in out]
+    return pd.DataFrame({col: out[col] for col in out_cols}, index = index)
+
+
+# %% ---- multiple bmps ----
+# combine the bmps of each field
+def combine_bmps(starts, area_ac, bmp_cols):
+    '''
+    description:
+    combine the bmps of each field into one set of kernel bmp inputs per
+    field, where the bmps are stored flat (one value per bmp) and starts
+    gives the position of the first bmp of each field (i.e., a csr
+    layout), all with array operations over the bmps (no loop over
+    fields)
+
+    notes:
+    bmps are treated as in series, so the combined efficiency of each
+    pollutant is 1 - prod(1 - eff * bmp_ac / area_ac) over the bmps of
+    the field, bmps without an efficiency value for a pollutant are
+    skipped (nan if no bmp of the field has one)
+    combined efficiencies are already area weighted, so bmp_ac is set to
+    area_ac (i.e., bmp_frac is 1)
+    a field gets water quantity benefits if any of its bmps has them,
+    and the cover crop curve number change if any of its bmps is a cover
+    crop
+    fields with one bmp keep its inputs as is (same results as before)
+
+    parameters:
+        starts (int array): position of the first bmp of each field in
+        the bmp arrays, plus the total number of bmps at the end (i.e.,
+        length is the number of fields + 1)
+        area_ac (float array): area of each field (acres)
+        bmp_cols (dict): arrays for each KERNEL_BMP_INPUTS column, one
+        value per bmp
+
+    returns:
+        field_bmp_cols (dict): arrays for each KERNEL_BMP_INPUTS column,
+        one value per field (see get_kernel_inputs function)
+    '''
+    n_bmps = np.diff(starts)
+    first = starts[:-1]
+    one = n_bmps == 1
+    many = n_bmps > 1
+
+    # fields with one bmp keep its inputs (fields with none get nan)
+    field_bmp_cols = {}
+    for col in KERNEL_BMP_INPUTS:
+        if col == 'bmp_cc':
+            col_vals = np.zeros(len(n_bmps), dtype = 'int8')
+        else:
+            col_vals = np.full(len(n_bmps), np.nan)
+        col_vals[one] = bmp_cols[col][first[one]]
+        field_bmp_cols[col] = col_vals
+    if not many.any():
+        return field_bmp_cols
+
+    # bmps of fields with more than one bmp (and where each field starts)
+    many_bmps = np.repeat(many, n_bmps)
+    many_starts = np.concatenate(([0], np.cumsum(n_bmps[many])[:-1]))
+    bmp_frac = bmp_cols['bmp_ac'][many_bmps] / np.repeat(area_ac[many], n_bmps[many])
+
+    # combined efficiency of each pollutant
+    for col in ['eff_val_nitrogen', 'eff_val_phosphorus', 'eff_val_sediment']:
+        eff = bmp_cols[col][many_bmps]
+        has_eff = ~np.isnan(eff)
+        pass_frac = np.multiply.reduceat(np.where(has_eff, 1 - eff * bmp_frac, 1.0), many_starts)
+        n_eff = np.add.reduceat(has_eff.astype('int64'), many_starts)
+        field_bmp_cols[col][many] = np.where(n_eff > 0, 1 - pass_frac, np.nan)
+
+    # water quantity benefits and cover crop (if any bmp has them)
+    wq = (bmp_cols['eff_val_quantity'][many_bmps] == 1).astype('float64')
+    field_bmp_cols['eff_val_quantity'][many] = np.maximum.reduceat(wq, many_starts)
+    field_bmp_cols['bmp_cc'][many] = np.maximum.reduceat(bmp_cols['bmp_cc'][many_bmps], many_starts)
+
+    # combined efficiencies are area weighted
+    field_bmp_cols['bmp_ac'][many] = area_ac[many]
+
+    # return
+    return field_bmp_cols
+
+
+# %% ---- kernel steps ----
+# each step takes the values calculated so far (kernel inputs plus the
+# outputs of earlier steps) and returns its outputs, see KERNEL_STEPS
+
+# unit conversion (acre-feet to lbs per mg/L)
+LOAD_CONV = (4047 * 0.3048/1000 * 2.2)
+
+# hard code soil concentrations (percent)
+SOIL_CONC_N = 0.08
+SOIL_CONC_P = 0.0308
+
+
+# calc_p
+def step_p(v, diag = None):
+    return {'p': (v['aa_rain'] * v['r_cor'])/(v['rain_days'] * v['rd_cor'])}
+
+
+# calc_s
+def step_s(v, diag = None):
+    return {'s': (1000 / v['cn_value']) - 10}
+
+
+# calc_q
+def step_q(v, diag = None):
+    return {'q': (v['p']**2)/(v['p'] + v['s'])}
+
+
+# calc_base_run_v
+def step_base_run_v(v, diag = None):
+    return {'b_run_v': v['q']/12 * v['area_ac'] * (v['rain_days'] * v['rd_cor'])}
+
+
+# calc_base_run_nl
+def step_base_run_nl(v, diag = None):
+    m_frac = v['n_months']/12
+    return {
+        'b_run_n': v['b_run_v'] * ((1 - m_frac) * v['conc_n'] + m_frac * v['conc_mn']) * LOAD_CONV,
+        'b_run_p': v['b_run_v'] * ((1 - m_frac) * v['conc_p'] + m_frac * v['conc_mp']) * LOAD_CONV}
+
+
+# calc_e
+def step_e(v, diag = None):
+    return {'erosion': v['r_avg'] * v['k_avg'] * v['ls_avg'] * v['c_avg'] * v['p_avg'] * v['area_ac']}
+
+
+# calc_base_run_sl
+def step_base_run_sl(v, diag = None):
+    area_mi = v['area_ac']/640
+    del_ratio = np.where(
+        v['area_ac'] <= 200,
+        0.42 * np.power(area_mi, -0.125),
+        (0.417662 * np.power(area_mi, -0.134958)) - 0.127097)
+    return {'del_ratio': del_ratio, 'b_run_s': v['erosion'] * del_ratio}
+
+
+# bmp percent applied
+def step_bmp_frac(v, diag = None):
+    return {'bmp_frac': v['bmp_ac']/v['area_ac']}
+
+
+# calc_prac_run_v
+def step_prac_run_v(v, diag = None):
+    cn_value = v['cn_value']
+    wq = v['eff_val_quantity'] == 1
+    sed_cn_value = cn_value - cn_value * (v['eff_val_sediment'] * v['bmp_frac'])
+    p_cn_value = np.where(wq, np.where(v['bmp_cc'] == 1, cn_value - 3, sed_cn_value), cn_value)
+    p_s = (1000 / p_cn_value) - 10
+    p_q = (v['p'] * v['p']) / (v['p'] + p_s)
+    p_run_v = np.where(wq, p_q / 12 * v['area_ac'] * (v['rain_days'] * v['rd_cor']), v['b_run_v'])
+
+    # record conditions
+    diagnostics.record(diag, 'p_run_v', 'no_wq_benefit', wq.size - int(wq.sum()),
+        "no wq benefits provided for {n} field(s). p_run_v set to baseline.")
+    return {'p_cn_value': p_cn_value, 'p_run_v': p_run_v}
+
+
+# calc_prac_sed_nl
+def step_prac_sed_nl(v, diag = None):
+    e_lbs = v['erosion'] * 2000
+    no_n = np.isnan(v['eff_val_nitrogen'])
+    no_p = np.isnan(v['eff_val_phosphorus'])
+    p_sed_n = np.where(no_n, np.nan, e_lbs * v['del_ratio'] * (1 - v['eff_val_nitrogen'] * v['bmp_frac']) * SOIL_CONC_N)
+    p_sed_p = np.where(no_p, np.nan, e_lbs * v['del_ratio'] * (1 - v['eff_val_phosphorus'] * v['bmp_frac']) * SOIL_CONC_P)
+
+    # record conditions
+    diagnostics.record(diag, 'p_sed_n', 'no_efficiency', int(no_n.sum()),
+        "no bmp n efficiency value available for {n} field(s). p_sed_n is nan.")
+    diagnostics.record(diag, 'p_sed_p', 'no_efficiency', int(no_p.sum()),
+        "no bmp p efficiency value available for {n} field(s). p_sed_p is nan.")
+    return {'e_lbs': e_lbs, 'p_sed_n': p_sed_n, 'p_sed_p': p_sed_p}
+
+
+# calc_prac_run_nl
+def step_prac_run_nl(v, diag = None):
+    crop = v['lu_code'] == LU_CODES['cropland']
+    past = v['lu_code'] == LU_CODES['pastureland']
+    no_n = np.isnan(v['eff_val_nitrogen'])
+    no_p = np.isnan(v['eff_val_phosphorus'])
+    eff_val_n_adj = v['eff_val_nitrogen'] * v['bmp_frac']
+    eff_val_p_adj = v['eff_val_phosphorus'] * v['bmp_frac']
+    p_run_n = np.select(
+        [(crop | past) & no_n, crop, past],
+        [v['b_run_n'], v['b_run_n'] * eff_val_n_adj, v['b_run_n'] * eff_val_n_adj + v['p_sed_n']],
+        default = np.nan)
+    p_run_p = np.select(
+        [(crop | past) & no_p, crop, past],
+        [v['b_run_p'], v['b_run_p'] * eff_val_p_adj, v['b_run_p'] * eff_val_p_adj + v['p_sed_p']],
+        default = np.nan)
+
+    # record conditions
+    diagnostics.record(diag, 'p_run_n', 'no_efficiency', int(((crop | past) & no_n).sum()),
+        "no bmp n efficiency value available for {n} field(s). p_run_n set to baseline.")
+    diagnostics.record(diag, 'p_run_p', 'no_efficiency', int(((crop | past) & no_p).sum()),
+        "no bmp p efficiency value available for {n} field(s). p_run_p set to baseline.")
+    n_other = crop.size - int((crop | past).sum())
+    diagnostics.record(diag, 'p_run_n', 'other_land_use', n_other)
+    diagnostics.record(diag, 'p_run_p', 'other_land_use', n_other,
+        "choose cropland or pastureland for practice change runoff nutrient load calculations. nan's returned for {n} field(s).")
+    return {'p_run_n': p_run_n, 'p_run_p': p_run_p}
+
+
+# calc_prac_run_sl
+def step_prac_run_sl(v, diag = None):
+    no_s = np.isnan(v['eff_val_sediment'])
+    p_run_s = np.where(no_s, v['b_run_s'], v['erosion'] * v['del_ratio'] * (1 - v['eff_val_sediment'] * v['bmp_frac']))
+
+    # record conditions
+    diagnostics.record(diag, 'p_run_s', 'no_efficiency', int(no_s.sum()),
+        "no bmp sediment efficiency available for {n} field(s). p_run_s set to baseline.")
+    return {'p_run_s': p_run_s}
+
+
+# calc_perc_change
+def step_perc_change(v, diag = None):
+    out = {}
+    for b_col, p_col, pc_col in [('b_run_v', 'p_run_v', 'pc_v'), ('b_run_n', 'p_run_n', 'pc_n'),
+                                 ('b_run_p', 'p_run_p', 'pc_p'), ('b_run_s', 'p_run_s', 'pc_s')]:
+        b_val = v[b_col]
+        pos = b_val > 0
+        out[pc_col] = np.where(pos, np.round(((b_val - v[p_col]) / b_val) * 100, 1), np.nan)
+
+        # record conditions
+        diagnostics.record(diag, pc_col, 'no_baseline', pos.size - int(pos.sum()),
+            "baseline for " + pc_col + " is negative, zero, or is not defined for {n} field(s). nan returned.")
+    return out
+
+
+# calc_base_gw_v
+def step_base_gw_v(v, diag = None):
+    return {'b_in_v': (v['gw_infil_frac'] * v['p'])/12 * v['area_ac'] * (v['rain_days'] * v['rd_cor'])}
+
+
+# calc_base_gw_nl
+def step_base_gw_nl(v, diag = None):
+    # record conditions
+    for col, nutrient in [('b_gw_n', 'nitrogen'), ('b_gw_p', 'phosphorus')]:
+        diagnostics.record(diag, col, 'no_gw_conc', int(np.isnan(v['gw_conc_' + col[-1]]).sum()),
+            "no groundwater " + nutrient + " concentration available for {n} field(s). nan returned.")
+    return {
+        'b_gw_n': v['b_in_v'] * v['gw_conc_n'] * LOAD_CONV,
+        'b_gw_p': v['b_in_v'] * v['gw_conc_p'] * LOAD_CONV}
+
+
+# %% ---- kernel dependency graph ----
+# kernel steps in run order: (step, function, inputs, outputs), steps
+# with inputs that are not given are skipped (i.e., the groundwater
+# steps without KERNEL_GW_INPUTS)
+KERNEL_STEPS = [
+    ('p', step_p, ['aa_rain', 'r_cor', 'rain_days', 'rd_cor'], ['p']),
+    ('s', step_s, ['cn_value'], ['s']),
+    ('q', step_q, ['p', 's'], ['q']),
+    ('base_run_v', step_base_run_v, ['q', 'area_ac', 'rain_days', 'rd_cor'], ['b_run_v']),
+    ('base_run_nl', step_base_run_nl,
+     ['b_run_v', 'n_months', 'conc_n', 'conc_mn', 'conc_p', 'conc_mp'], ['b_run_n', 'b_run_p']),
+    ('e', step_e, ['r_avg', 'k_avg', 'ls_avg', 'c_avg', 'p_avg', 'area_ac'], ['erosion']),
+    ('base_run_sl', step_base_run_sl, ['area_ac', 'erosion'], ['del_ratio', 'b_run_s']),
+    ('bmp_frac', step_bmp_frac, ['bmp_ac', 'area_ac'], ['bmp_frac']),
+    ('prac_run_v', step_prac_run_v,
+     ['eff_val_quantity', 'bmp_cc', 'cn_value', 'eff_val_sediment', 'bmp_frac', 'p', 'area_ac',
+      'rain_days', 'rd_cor', 'b_run_v'], ['p_cn_value', 'p_run_v']),
+    ('prac_sed_nl', step_prac_sed_nl,
+     ['erosion', 'del_ratio', 'eff_val_nitrogen', 'eff_val_phosphorus', 'bmp_frac'],
+     ['e_lbs', 'p_sed_n', 'p_sed_p']),
+    ('prac_run_nl', step_prac_run_nl,
+     ['lu_code', 'eff_val_nitrogen', 'eff_val_phosphorus', 'b_run_n', 'b_run_p', 'bmp_frac',
+      'p_sed_n', 'p_sed_p'], ['p_run_n', 'p_run_p']),
+    ('prac_run_sl', step_prac_run_sl,
+     ['eff_val_sediment', 'b_run_s', 'erosion', 'del_ratio', 'bmp_frac'], ['p_run_s']),
+    ('perc_change', step_perc_change,
+     ['b_run_v', 'b_run_n', 'b_run_p', 'b_run_s', 'p_run_v', 'p_run_n', 'p_run_p', 'p_run_s'],
+     ['pc_v', 'pc_n', 'pc_p', 'pc_s']),
+    ('base_gw_v', step_base_gw_v, ['gw_infil_frac', 'p', 'area_ac', 'rain_days', 'rd_cor'], ['b_in_v']),
+    ('base_gw_nl', step_base_gw_nl, ['b_in_v', 'gw_conc_n', 'gw_conc_p'], ['b_gw_n', 'b_gw_p'])]
+
+
+# steps downstream of changed inputs
+def downstream_steps(changed):
+    '''
+    description:
+    get the kernel steps that need to be run again when some kernel
+    inputs change (i.e., the steps that use a changed input or the
+    output of a step that is run again)
+
+    parameters:
+        changed (list of str): changed kernel inputs, see
+        get_kernel_inputs function
+
+    returns:
+        steps (list of str): steps to run again (in run order)
+    '''
+    # walk the steps in run order
+    changed = set(changed)
+    steps = []
+    for step, _, inputs, outputs in KERNEL_STEPS:
+        if changed.intersection(inputs):
+            steps.append(step)
+            changed.update(outputs)
+
+    # return
+    return steps
+
+
+# changed kernel inputs
+def changed_inputs(cols, prev_cols):
+    '''
+    description:
+    get the kernel inputs that are different from an earlier run on the
+    same fields
+
+    parameters:
+        cols (dict): kernel inputs, see get_kernel_inputs function
+        prev_cols (dict): kernel inputs of the earlier run
+
+    returns:
+        changed (list of str): changed kernel inputs (all inputs if the
+        number of fields is different, inputs that are not in prev_cols
+        are changed)
+    '''
+    # different fields
+    if len(cols['area_ac']) != len(prev_cols['area_ac']):
+        return list(cols)
+
+    # return
+    return [col for col in cols if col not in prev_cols or not np.array_equal(cols[col], prev_cols[col], equal_nan = True)]
+
+
+# %% ---- kernel ----
+# run the full calculation chain
+def run_kernel(cols, diag = None, prev = None):
+    '''
+    description:
+    run calc_p through calc_perc_change in one pass on column arrays,
+    see plet_functions.py for a description of each step
+
+    notes:
+    if the results of an earlier run on the same fields are given (prev),
+    only the steps downstream of the changed inputs are run again and all
+    other results are reused (e.g., only the practice change steps run
+    when only bmp inputs change), results are the same as a full run
+    diagnostics are only recorded for the steps that are run
+    inputs can also be (fields x 1) and (fields x years) arrays (e.g.,
+    rainfall for each year), all steps broadcast them and steps that
+    only use (fields x 1) inputs are run once for all years
+
+    parameters:
+        cols (dict): kernel inputs, see get_kernel_inputs function
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+        prev (tuple): kernel inputs and results of an earlier run on the
+        same fields, i.e., (prev_cols, prev_out), where steps with
+        outputs missing from prev_out are run again (optional, default
+        is None)
+
+    returns:
+        out (dict): float64 arrays for each KERNEL_OUTPUTS column (plus
+        the other step outputs, e.g., bmp_frac)
+    '''
+    # steps to run (all, else only steps downstream of changed inputs)
+    if prev is None:
+        run_steps = [step for step, _, _, _ in KERNEL_STEPS]
+    else:
+        prev_cols, prev_out = prev
+        run_steps = downstream_steps(changed_inputs(cols, prev_cols))
+
+    # run steps (reuse the outputs of steps that are not run)
+    values = dict(cols)
+    out = {}
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        for step, step_func, inputs, outputs in KERNEL_STEPS:
+            if any(col not in values for col in inputs):
+                continue
+            if step in run_steps or any(col not in prev_out for col in outputs):
+                step_out = step_func(values, diag)
+            else:
+                step_out = {col: prev_out[col] for col in outputs}
+            values.update(step_out)
+            out.update(step_out)
+
+    # print
+    diagnostics.info("calculated plet results for " + str(len(cols['area_ac'])) + " field(s) (" + str(len(run_steps)) + " of " + str(len(KERNEL_STEPS)) + " steps)")
+
+    # return
+    return out
+
+
+# run many bmp scenarios at once
+def run_kernel_scenarios(cols, out, field_pos, bmp_cols, diag = None):
+    '''
+    description:
+    run the practice change steps for many bmp scenarios of the same
+    fields in one pass, with one row per field and scenario (the steps
+    that do not use the bmp inputs are not run, their results are
+    reused for each scenario of a field)
+
+    notes:
+    only the columns used by the practice change steps are repeated for
+    each scenario row, so memory use is proportional to the number of
+    scenario rows
+    results are the same as a full run of each field with each scenario
+
+    parameters:
+        cols (dict): kernel inputs of the fields, see get_kernel_inputs
+        function
+        out (dict): kernel results of the fields, see run_kernel function
+        field_pos (int array): position of the field of each scenario row
+        bmp_cols (dict): arrays for each KERNEL_BMP_INPUTS column, one
+        value per scenario row
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+
+    returns:
+        scenario_out (dict): float64 arrays for each output of the
+        practice change steps (e.g., p_run_n, pc_n), one value per
+        scenario row
+    '''
+    # steps that use the bmp inputs
+    run_steps = downstream_steps(KERNEL_BMP_INPUTS)
+    step_inputs = set()
+    for step, _, inputs, _ in KERNEL_STEPS:
+        if step in run_steps:
+            step_inputs.update(inputs)
+
+    # scenario inputs (bmp inputs of the scenario, else those of the field)
+    values = {}
+    for col in step_inputs.intersection(cols):
+        values[col] = bmp_cols[col] if col in KERNEL_BMP_INPUTS else cols[col][field_pos]
+
+    # reused results of the field
+    for step, _, _, outputs in KERNEL_STEPS:
+        if step not in run_steps:
+            for col in step_inputs.intersection(outputs).intersection(out):
+                values[col] = out[col][field_pos]
+
+    # run steps
+    scenario_out = {}
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        for step, step_func, inputs, outputs in KERNEL_STEPS:
+            if step in run_steps and all(col in values for col in inputs):
+                step_out = step_func(values, diag)
+                values.update(step_out)
+                scenario_out.update(step_out)
+
+    # print
+    diagnostics.info("calculated plet results for " + str(len(field_pos)) + " scenario(s) (" + str(len(run_steps)) + " of " + str(len(KERNEL_STEPS)) + " steps)")
+
+    # return
+    return scenario_out
+
+
+# %% ---- kernel derivatives ----
+# each derivative step takes the values and the derivatives calculated
+# so far and returns the derivatives of its outputs (chain rule), where
+# a derivative is a (wrt inputs x fields) array, or a scalar 0 if the
+# column does not depend on any wrt input (arrays broadcast as needed)
+
+# default inputs and outputs for derivatives
+GRAD_INPUTS = [
+    'aa_rain', 'r_cor', 'rd_cor', 'rain_days', 'cn_value', 'area_ac',
+    'bmp_ac', 'n_months', 'r_avg', 'k_avg', 'ls_avg', 'c_avg', 'p_avg',
+    'eff_val_nitrogen', 'eff_val_phosphorus', 'eff_val_sediment']
+GRAD_OUTPUTS = [
+    'b_run_v', 'b_run_n', 'b_run_p', 'b_run_s', 'p_run_v', 'p_run_n',
+    'p_run_p', 'p_run_s', 'pc_v', 'pc_n', 'pc_p', 'pc_s']
+
+
+# calc_p derivative
+def grad_p(v, d):
+    den = v['rain_days'] * v['rd_cor']
+    d_num = d['aa_rain'] * v['r_cor'] + v['aa_rain'] * d['r_cor']
+    d_den = d['rain_days'] * v['rd_cor'] + v['rain_days'] * d['rd_cor']
+    return {'p': (d_num - v['p'] * d_den) / den}
+
+
+# calc_s derivative
+def grad_s(v, d):
+    return {'s': -1000 / v['cn_value']**2 * d['cn_value']}
+
+
+# calc_q derivative (also used for the practice change runoff depth)
+def grad_runoff_depth(p, q, s, d_p, d_s):
+    return ((2 * p - q) * d_p - q * d_s) / (p + s)
+
+
+# calc_q derivative
+def grad_q(v, d):
+    return {'q': grad_runoff_depth(v['p'], v['q'], v['s'], d['p'], d['s'])}
+
+
+# runoff volume derivative (from runoff depth and its derivative)
+def grad_run_v(v, d, q, d_q):
+    w = v['rain_days'] * v['rd_cor']
+    d_w = d['rain_days'] * v['rd_cor'] + v['rain_days'] * d['rd_cor']
+    return (d_q * v['area_ac'] * w + q * d['area_ac'] * w + q * v['area_ac'] * d_w) / 12
+
+
+# calc_base_run_v derivative
+def grad_base_run_v(v, d):
+    return {'b_run_v': grad_run_v(v, d, v['q'], d['q'])}
+
+
+# calc_base_run_nl derivative
+def grad_base_run_nl(v, d):
+    m_frac = v['n_months']/12
+    d_m_frac = d['n_months']/12
+    out = {}
+    for load_col, conc_col, conc_m_col in [('b_run_n', 'conc_n', 'conc_mn'), ('b_run_p', 'conc_p', 'conc_mp')]:
+        conc = (1 - m_frac) * v[conc_col] + m_frac * v[conc_m_col]
+        d_conc = (1 - m_frac) * d[conc_col] + m_frac * d[conc_m_col] + d_m_frac * (v[conc_m_col] - v[conc_col])
+        out[load_col] = (d['b_run_v'] * conc + v['b_run_v'] * d_conc) * LOAD_CONV
+    return out
+
+
+# calc_e derivative (product rule over the usle factors and area)
+def grad_e(v, d):
+    factors = ['r_avg', 'k_avg', 'ls_avg', 'c_avg', 'p_avg', 'area_ac']
+    d_erosion = 0.0
+    for col in factors:
+        others = np.prod([v[other] for other in factors if other != col], axis = 0)
+        d_erosion = d_erosion + d[col] * others
+    return {'erosion': d_erosion}
+
+
+# calc_base_run_sl derivative
+def grad_base_run_sl(v, d):
+    d_del_ratio = np.where(
+        v['area_ac'] <= 200,
+        -0.125 * v['del_ratio'] / v['area_ac'],
+        -0.134958 * (v['del_ratio'] + 0.127097) / v['area_ac']) * d['area_ac']
+    return {
+        'del_ratio': d_del_ratio,
+        'b_run_s': d['erosion'] * v['del_ratio'] + v['erosion'] * d_del_ratio}
+
+
+# bmp percent applied derivative
+def grad_bmp_frac(v, d):
+    return {'bmp_frac': (d['bmp_ac'] - v['bmp_frac'] * d['area_ac']) / v['area_ac']}
+
+
+# calc_prac_run_v derivative
+def grad_prac_run_v(v, d):
+    cn_value = v['cn_value']
+    wq = v['eff_val_quantity'] == 1
+    eff_adj = v['eff_val_sediment'] * v['bmp_frac']
+    d_eff_adj = d['eff_val_sediment'] * v['bmp_frac'] + v['eff_val_sediment'] * d['bmp_frac']
+    d_sed_cn_value = d['cn_value'] * (1 - eff_adj) - cn_value * d_eff_adj
+    d_p_cn_value = np.where(wq & (v['bmp_cc'] != 1), d_sed_cn_value, d['cn_value'])
+    p_s = (1000 / v['p_cn_value']) - 10
+    d_p_s = -1000 / v['p_cn_value']**2 * d_p_cn_value
+    p_q = v['p']**2 / (v['p'] + p_s)
+    d_p_q = grad_runoff_depth(v['p'], p_q, p_s, d['p'], d_p_s)
+    return {
+        'p_cn_value': d_p_cn_value,
+        'p_run_v': np.where(wq, grad_run_v(v, d, p_q, d_p_q), d['b_run_v'])}
+
+
+# calc_prac_sed_nl derivative
+def grad_prac_sed_nl(v, d):
+    d_e_lbs = d['erosion'] * 2000
+    out = {'e_lbs': d_e_lbs}
+    for sed_col, eff_col, soil_conc in [('p_sed_n', 'eff_val_nitrogen', SOIL_CONC_N), ('p_sed_p', 'eff_val_phosphorus', SOIL_CONC_P)]:
+        remain = 1 - v[eff_col] * v['bmp_frac']
+        d_remain = -(d[eff_col] * v['bmp_frac'] + v[eff_col] * d['bmp_frac'])
+        out[sed_col] = np.where(
+            np.isnan(v[eff_col]), np.nan,
+            (d_e_lbs * v['del_ratio'] * remain + v['e_lbs'] * d['del_ratio'] * remain
+             + v['e_lbs'] * v['del_ratio'] * d_remain) * soil_conc)
+    return out
+
+
+# calc_prac_run_nl derivative
+def grad_prac_run_nl(v, d):
+    crop = v['lu_code'] == LU_CODES['cropland']
+    past = v['lu_code'] == LU_CODES['pastureland']
+    out = {}
+    for run_col, base_col, sed_col, eff_col in [('p_run_n', 'b_run_n', 'p_sed_n', 'eff_val_nitrogen'),
+                                                ('p_run_p', 'b_run_p', 'p_sed_p', 'eff_val_phosphorus')]:
+        eff_adj = v[eff_col] * v['bmp_frac']
+        d_eff_adj = d[eff_col] * v['bmp_frac'] + v[eff_col] * d['bmp_frac']
+        d_crop = d[base_col] * eff_adj + v[base_col] * d_eff_adj
+        out[run_col] = np.select(
+            [(crop | past) & np.isnan(v[eff_col]), crop, past],
+            [d[base_col], d_crop, d_crop + d[sed_col]],
+            default = np.nan)
+    return out
+
+
+# calc_prac_run_sl derivative
+def grad_prac_run_sl(v, d):
+    remain = 1 - v['eff_val_sediment'] * v['bmp_frac']
+    d_remain = -(d['eff_val_sediment'] * v['bmp_frac'] + v['eff_val_sediment'] * d['bmp_frac'])
+    d_p_run_s = (d['erosion'] * v['del_ratio'] * remain + v['erosion'] * d['del_ratio'] * remain
+                 + v['erosion'] * v['del_ratio'] * d_remain)
+    return {'p_run_s': np.where(np.isnan(v['eff_val_sediment']), d['b_run_s'], d_p_run_s)}
+
+
+# calc_perc_change derivative (of the percent change before rounding)
+def grad_perc_change(v, d):
+    out = {}
+    for b_col, p_col, pc_col in [('b_run_v', 'p_run_v', 'pc_v'), ('b_run_n', 'p_run_n', 'pc_n'),
+                                 ('b_run_p', 'p_run_p', 'pc_p'), ('b_run_s', 'p_run_s', 'pc_s')]:
+        b_val = v[b_col]
+        d_pc = 100 * (v[p_col] * d[b_col] - b_val * d[p_col]) / b_val**2
+        out[pc_col] = np.where(b_val > 0, d_pc, np.nan)
+    return out
+
+
+# calc_base_gw_v derivative
+def grad_base_gw_v(v, d):
+    infil = v['gw_infil_frac'] * v['p']
+    d_infil = d['gw_infil_frac'] * v['p'] + v['gw_infil_frac'] * d['p']
+    return {'b_in_v': grad_run_v(v, d, infil, d_infil)}
+
+
+# calc_base_gw_nl derivative
+def grad_base_gw_nl(v, d):
+    return {
+        'b_gw_n': (d['b_in_v'] * v['gw_conc_n'] + v['b_in_v'] * d['gw_conc_n']) * LOAD_CONV,
+        'b_gw_p': (d['b_in_v'] * v['gw_conc_p'] + v['b_in_v'] * d['gw_conc_p']) * LOAD_CONV}
+
+
+# derivative step of each kernel step
+KERNEL_STEP_GRADS = {
+    'p': grad_p,
+    's': grad_s,
+    'q': grad_q,
+    'base_run_v': grad_base_run_v,
+    'base_run_nl': grad_base_run_nl,
+    'e': grad_e,
+    'base_run_sl': grad_base_run_sl,
+    'bmp_frac': grad_bmp_frac,
+    'prac_run_v': grad_prac_run_v,
+    'prac_sed_nl': grad_prac_sed_nl,
+    'prac_run_nl': grad_prac_run_nl,
+    'prac_run_sl': grad_prac_run_sl,
+    'perc_change': grad_perc_change,
+    'base_gw_v': grad_base_gw_v,
+    'base_gw_nl': grad_base_gw_nl}
+
+
+# run the calculation chain with derivatives
+def run_kernel_grad(cols, wrt = None, diag = None):
+    '''
+    description:
+    run calc_p through calc_perc_change in one pass on column arrays
+    (same results as run_kernel) and get the analytic partial
+    derivatives of the outputs with respect to some inputs in the same
+    pass (forward mode chain rule through KERNEL_STEPS)
+
+    notes:
+    derivatives of the percent changes (pc_*) are of the percent change
+    before it is rounded to one decimal place
+    at a branch (e.g., area_ac of 200 for the delivery ratio, or no bmp
+    efficiency value) the derivative is the one of the branch that is
+    used
+    for fields with more than one bmp, bmp_ac and eff_val_* are the
+    combined bmp inputs, see combine_bmps function
+
+    parameters:
+        cols (dict): kernel inputs, see get_kernel_inputs function
+        wrt (list of str): inputs to get derivatives with respect to,
+        must be in KERNEL_NUM_INPUTS (optional, default is GRAD_INPUTS)
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+
+    returns:
+        out (dict): kernel results, see run_kernel function
+        grad (dict): (wrt inputs x fields) array of derivatives for each
+        output in out, i.e., grad[col][i] is d col / d wrt[i] (nan where
+        the result is nan)
+    '''
+    # check inputs
+    wrt = GRAD_INPUTS if wrt is None else wrt
+    unknown = [col for col in wrt if col not in KERNEL_NUM_INPUTS]
+    if unknown:
+        raise ValueError("cannot get derivatives with respect to " + ", ".join(unknown) + " (not a numeric kernel input)")
+
+    # derivatives of the inputs (one row per wrt input, broadcast over
+    # fields, 0 for all other inputs)
+    n_fields = len(cols['area_ac'])
+    d = {col: 0.0 for col in cols}
+    for i, col in enumerate(wrt):
+        d[col] = np.zeros((len(wrt), 1))
+        d[col][i] = 1.0
+
+    # run steps and derivative steps
+    values = dict(cols)
+    out = {}
+    grad = {}
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        for step, step_func, inputs, outputs in KERNEL_STEPS:
+            if any(col not in values for col in inputs):
+                continue
+            step_out = step_func(values, diag)
+            values.update(step_out)
+            out.update(step_out)
+            step_grad = KERNEL_STEP_GRADS[step](values, d)
+            d.update(step_grad)
+            # derivatives of nan results are nan
+            for col in outputs:
+                grad[col] = np.where(np.isnan(step_out[col]), np.nan, step_grad[col]) * np.ones((len(wrt), 1))
+
+    # print
+    diagnostics.info("calculated plet results and derivatives for " + str(n_fields) + " field(s) (" + str(len(wrt)) + " input(s))")
+
+    # return
+    return out, grad
@@ -14,14 +14,23 @@
 # sediment load is in units of tons
 # nutrient load (nitrogen and phosphorous) is in units of lbs
 # runoff volumnes (all water quantity stuff) are in units of acre-feet
+# functions work on whole columns with numpy (no loop over rows), so
+# results can differ from the original row-by-row functions in the last
+# bit (numpy power is not always the same as python pow), and percent
+# changes can differ by 0.1 when they are on a half-way point (np.round
+# rounds the scaled value, python round uses the exact binary value)
 
 # to do:
 # TODO talk to b about how to handle user input errors
 
 # %% ---- load libraries ----
 import numpy as np
+import pandas as pd
 from nose.tools import assert_raises
 
+# custom plet functions
+import plet_diagnostics as diagnostics
+
 
 # %% ---- testing funcitons ----
 # test if float
@@ -65,7 +74,7 @@ def calc_p(gdf):
     gdf['p'] = (gdf['aa_rain'] * gdf['r_cor'])/(gdf['rain_days'] * gdf['rd_cor'])
 
     # print
-    print("calculated and appended p to geodataframe")
+    diagnostics.info("calculated and appended p to geodataframe")
 
     # return
     return gdf
@@ -92,7 +101,7 @@ def calc_s(gdf):
     gdf['s'] = (1000 / gdf['cn_value']) - 10
 
     # print
-    print("calculated and appended s to geodataframe")
+    diagnostics.info("calculated and appended s to geodataframe")
 
     # return
     return gdf
@@ -118,7 +127,7 @@ def calc_q(gdf):
     gdf['q'] = (gdf['p']**2)/(gdf['p'] + gdf['s'])
 
     # print
-    print("calculated and appended q to geodataframe")
+    diagnostics.info("calculated and appended q to geodataframe")
 
     # return
     return gdf
@@ -131,7 +140,7 @@ def calc_q(gdf):
 # cropland is sum of surface runoff volume and irrigation volume
 
 # animal density and intensity
-def calc_animal_stats(gdf, animal_type = 'beef_cattle'):
+def calc_animal_stats(gdf, animal_type = 'beef_cattle', diag = None, unsupported = None):
     '''
     description:
     calculate animal density (lbs/ac of live animal weight) and
@@ -142,68 +151,79 @@ def calc_animal_stats(gdf, animal_type = 'beef_cattle'):
     animal density of 1500 lbs/ac of live animal weight or less, medium
     intensity is defined as between 1500 and 2500 lbs/ac of live animal
     weight, and high intensity is over 2500 lbs/ac of live animal weight
+    fields without animals are low intensity
+    if gdf has an animal_lbs column (live animal weight of each field,
+    which can be a mix of animal types, see gather_animals in main.py)
+    it is used for all fields, else all fields are assumed to have
+    animal_type animals (only beef cattle has a weight here)
 
     parameters:
         gdf (geopandas geodataframe): PLET module geodataframe that must
         have the following columns:
             n_animals (float): number of animals
             area_ac (float): area of field (acres)
-            animal_type (str): type of anaimal
+            animal_lbs (float): live animal weight of the field (lbs)
+            (optional)
+        animal_type (str): type of animal if gdf has no animal_lbs column
+        (optional, default is 'beef_cattle')
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+        unsupported (numpy array of bool): fields with an animal type
+        that has no weight (animal_lbs is nan), which are counted as
+        unsupported_animal_type instead of out_of_range, see
+        gather_animals in main.py (optional, default is None)
 
     returns:
         animal_den (float): animal density (lbs/ac of live animal
         weight), as a new column in gdf
         animal_aeu (float): animal equivalent units which is equal to
         animal_den / 1000, as a new column in gdg
-        animal_inten (str): animal intensity (low, medium, high), a new
-        column in the gdf
+        animal_inten (categorical): animal intensity (low, medium, high),
+        a new column in the gdf
     '''
-    # if animal type is beef cattle
-    if(animal_type == 'beef_cattle'):
-        # define standard beef cattle weight (lbs)
-        animal_wt = 1000
-
+    # if animal weight is given or animal type is beef cattle
+    if(('animal_lbs' in gdf.columns) or (animal_type == 'beef_cattle')):
         # calculate animal density
-        gdf['animal_den'] = (gdf['n_animals'] * animal_wt) / gdf['area_ac']
+        if('animal_lbs' in gdf.columns):
+            gdf['animal_den'] = gdf['animal_lbs'] / gdf['area_ac']
+        else:
+            # define standard beef cattle weight (lbs)
+            animal_wt = 1000
+            gdf['animal_den'] = (gdf['n_animals'] * animal_wt) / gdf['area_ac']
 
         # print
-        print("calculated and appended animal_den to geodataframe")
+        diagnostics.info("calculated and appended animal_den to geodataframe")
 
         # calculate animal equivalent units
         gdf['animal_aeu'] =  gdf['animal_den'] / 1000
 
         # print
-        print("calculated and appended animal_aeu to geodataframe")
+        diagnostics.info("calculated and appended animal_aeu to geodataframe")
 
         # calculate animal intensity
         gdf = gdf.reset_index(drop = True)
-        for index, row in gdf.iterrows():
-            if ((row['animal_aeu'] > 0) | (row['animal_aeu'] <= 1.5)):
-                # set to low
-                gdf.loc[index, 'animal_inten'] = 'low'
-
-                # print
-                print("calculated and appended animal_inten to geodataframe")
-            
-            elif ((row['animal_aeu'] > 1.5) | (row['animal_aeu'] < 2.5)):
-                # set to medium
-                gdf.loc[index, 'animal_inten'] = 'medium'
-
-                # print
-                print("calculated and appended animal_inten to geodataframe")
-
-            elif (row['animal_aeu'] >= 2.5):
-                # set to high
-                gdf.loc[index, 'animal_inten'] = 'high'
-
-                # print
-                print("calculated and appended animal_inten to geodataframe")
-
-            # else set to nan
-            else:
-                # set to nan
-                gdf.loc[index, 'animal_inten'] = np.nan
-                print("calculated and appended animal_inten but it is zero or outside of defined range. nan returned.")
+        aeu = gdf['animal_aeu'].to_numpy(dtype = 'float64')
+
+        # intensity conditions
+        low = (aeu >= 0) & (aeu <= 1.5)
+        medium = (aeu > 1.5) & (aeu < 2.5)
+        high = aeu >= 2.5
+
+        # set to low, medium, or high (else nan), as a categorical
+        inten_codes = np.select([low, medium, high], [0, 1, 2], -1).astype('int8')
+        gdf['animal_inten'] = pd.Categorical.from_codes(inten_codes, categories = ['low', 'medium', 'high'])
+
+        # print
+        diagnostics.info("calculated and appended animal_inten to geodataframe")
+
+        # print (fields with an unsupported animal type are counted once)
+        no_inten = inten_codes < 0
+        if unsupported is None:
+            unsupported = np.zeros(len(gdf), dtype = bool)
+        diagnostics.record(diag, 'animal_inten', 'unsupported_animal_type', int((no_inten & unsupported).sum()),
+            "no animal weight for the animal type of {n} field(s). nan's returned.")
+        diagnostics.record(diag, 'animal_inten', 'out_of_range', int((no_inten & ~unsupported).sum()),
+            "calculated and appended animal_inten but it is negative or not defined for {n} field(s). nan returned.")
 
     # else not beef cattle
     else:
@@ -214,10 +234,11 @@ def calc_animal_stats(gdf, animal_type = 'beef_cattle'):
         gdf['animal_aeu'] =  np.nan
 
         # calculate animal intensity
-        gdf['animal_inten'] = np.nan
+        gdf['animal_inten'] = pd.Categorical.from_codes(np.full(len(gdf), -1), categories = ['low', 'medium', 'high'])
 
         # print
-        print("only beef cattle is allowed at this time. nan's returned.")
+        diagnostics.record(diag, 'animal_inten', 'unsupported_animal_type', len(gdf),
+            "only beef cattle is allowed without an animal_lbs column. nan's returned.")
 
     # return
     return gdf
@@ -250,7 +271,7 @@ def calc_base_run_v(gdf):
     gdf['b_run_v'] = q_ft * gdf['area_ac'] * (gdf['rain_days'] * gdf['rd_cor'])
 
     # print
-    print("calculated and appended b_run_v to geodataframe")
+    diagnostics.info("calculated and appended b_run_v to geodataframe")
 
     # return
     return gdf
@@ -295,13 +316,13 @@ def calc_base_run_nl(gdf):
     gdf['b_run_n'] = gdf['b_run_v'] * ((1 - m_frac) * gdf['conc_n'] + m_frac * gdf['conc_mn']) * (4047 * 0.3048/1000 * 2.2)
 
     # print
-    print("calculated and appended b_run_n to geodataframe")
+    diagnostics.info("calculated and appended b_run_n to geodataframe")
     
     # baseline runoff phosphorus load
     gdf['b_run_p'] = gdf['b_run_v'] * ((1 - m_frac) * gdf['conc_p'] + m_frac * gdf['conc_mp']) * (4047 * 0.3048/1000 * 2.2)
 
     # print
-    print("calculated and appended b_run_p to geodataframe")
+    diagnostics.info("calculated and appended b_run_p to geodataframe")
 
     # return
     return gdf
@@ -330,7 +351,7 @@ def calc_e(gdf):
     gdf['erosion'] = gdf['r_avg'] * gdf['k_avg'] * gdf['ls_avg'] * gdf['c_avg'] * gdf['p_avg'] * gdf['area_ac']
 
     # print
-    print("calculated and appended erosion to geodataframe")
+    diagnostics.info("calculated and appended erosion to geodataframe")
 
     # return
     return gdf
@@ -363,28 +384,24 @@ def calc_base_run_sl(gdf):
 
     # sediment delivery ratio
     gdf = gdf.reset_index(drop = True)
-    for index, row in gdf.iterrows():
-        # if less than area_cutoff
-        if row['area_ac'] <= area_cutoff:
-            # convert acres to sq mi
-            area_mi = row['area_ac']/640
-
-            # calculate delivery ratio
-            gdf.loc[index, 'del_ratio'] = 0.42 * area_mi**(-0.125)
-            
-        # else if greater than area_cutoff
-        else:
-            # convert acres to sq mi
-            area_mi = row['area_ac']/640
+    area_ac = gdf['area_ac'].to_numpy(dtype = 'float64')
 
-            # calculate delivery ratio
-            gdf.loc[index, 'del_ratio'] = (0.417662 * area_mi**(-0.134958)) - 0.127097
+    # convert acres to sq mi
+    area_mi = area_ac/640
+
+    # if less than area_cutoff use the small area relationship,
+    # else if greater than area_cutoff use the large area relationship
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        gdf['del_ratio'] = np.where(
+            area_ac <= area_cutoff,
+            0.42 * np.power(area_mi, -0.125),
+            (0.417662 * np.power(area_mi, -0.134958)) - 0.127097)
 
     # sediment erosion
     gdf['b_run_s'] = gdf['erosion'] * gdf['del_ratio']
 
     # print
-    print("calculated and appended b_run_s to geodataframe")
+    diagnostics.info("calculated and appended b_run_s to geodataframe")
 
     # return
     return gdf
@@ -419,18 +436,53 @@ def calc_base_gw_v(gdf):
     gdf['b_in_v'] = infil_ft * gdf['area_ac'] * (gdf['rain_days'] * gdf['rd_cor'])
 
     # print
-    print("calculated and appended b_in_v to geodataframe")
+    diagnostics.info("calculated and appended b_in_v to geodataframe")
 
     # return
     return gdf
 
-# baseline groundwater nutrient load (b_gw_nl)
-# hold off on this for now until verify with esmc that it's needed
+# baseline groundwater nutrient load
+def calc_base_gw_nl(gdf, diag = None):
+    '''
+    description:
+    calculate baseline annual shallow groundwater nutrient load (lbs)
+    for nitrogen and phosphorus
+
+    parameters:
+        gdf (geopandas geodataframe): PLET module geodataframe that must
+        have the following columns:
+            b_in_v (float): baseline shallow groundwater infiltration
+            volume (acre-feet), see calc_base_gw_v function
+            gw_conc_n (float): concentration of nitrogen in shallow
+            groundwater (mg/L)
+            gw_conc_p (float): concentration of phosphorus in shallow
+            groundwater (mg/L)
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+
+    returns:
+        b_gw_n (float): baseline annual groundwater nitrogen load (lbs),
+        as a new column in gdf
+        b_gw_p (float): baseline annual groundwater phosphorus load
+        (lbs), as a new column in gdf
+    '''
+    # baseline groundwater nutrient loads
+    gdf['b_gw_n'] = gdf['b_in_v'] * gdf['gw_conc_n'] * (4047 * 0.3048/1000 * 2.2)
+    gdf['b_gw_p'] = gdf['b_in_v'] * gdf['gw_conc_p'] * (4047 * 0.3048/1000 * 2.2)
+
+    # print
+    diagnostics.info("calculated and appended b_gw_n and b_gw_p to geodataframe")
+    for col, nutrient in [('b_gw_n', 'nitrogen'), ('b_gw_p', 'phosphorus')]:
+        diagnostics.record(diag, col, 'no_gw_conc', int(gdf['gw_conc_' + col[-1]].isna().sum()),
+            "no groundwater " + nutrient + " concentration available for {n} field(s). nan returned.")
+
+    # return
+    return gdf
 
 
 # %% ---- practice change functions ----
 # practice change runoff volume
-def calc_prac_run_v(gdf):
+def calc_prac_run_v(gdf, diag = None):
     '''
     description:
     calculate practice change condition runoff volume (acre-feet)
@@ -444,6 +496,8 @@ def calc_prac_run_v(gdf):
             area_ac (float): area of field (acres)
             rain_days (float): average number of rainy days per year
             rd_cor (float): rain day correction factor
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
 
     returns:
         p_cn_value (float): practice change curve number value, as a new
@@ -453,90 +507,71 @@ def calc_prac_run_v(gdf):
     '''
     # calculate practice change runoff volume
     gdf = gdf.reset_index(drop = True)
-    for index, row in gdf.iterrows():
-        # cover crop bmp list
-        cc_bmp_list = ['cov_crop_1', 'cov_crop_2', 'cov_crop_3']
-
-        # if bmp provides water quantity benefits
-        if row['eff_val_quantity'] == 1:
-
-            # if cover crop bmp
-            if row['bmp_name'] in cc_bmp_list:
-
-                # recalculate cn
-                gdf.loc[index, 'p_cn_value'] = row['cn_value'] - 3
-                # p_cn_value = row['cn_value'] - 3
-                # source: see table 9-1 in usda nrcs handbook chapter 9
-                # (2004) on crop residue cover for poor and good soil
-                # conditions
-                # assumption: not all cover crop bmps have sediment bmp
-                # efficiency values so using usda nrcs handbook information
-                # instead of the efficiency values as described below for
-                # non-cover crop bmps
-
-                # recalculate s
-                # gdf.loc[index, 'p_s'] = (1000 / gdf.loc[index, 'p_cn_value']) - 10
-                p_s = (1000 / gdf.loc[index, 'p_cn_value']) - 10
-
-                # recalculate q
-                # gdf.loc[index, 'p_q'] = (row['p']**2) / (row['p'] + row['p_s'])
-                p_q = (row['p']**2) / (row['p'] + p_s)
-
-                # convert inches to feet
-                # q_ft = row['p_q'] / 12
-                p_q_ft = p_q / 12
-
-                # calculate
-                gdf.loc[index, 'p_run_v'] = p_q_ft * row['area_ac'] * (row['rain_days'] * row['rd_cor'])
-
-                # print
-                print("calculated and appended p_run_v to geodataframe")
-            
-            # else not cover crop bmp
-            else:
-                 # apply bmp percent applied
-                eff_val_sed_adj = row['eff_val_sediment'] * (row['bmp_ac']/row['area_ac'])
-
-                # recalculate cn
-                gdf.loc[index, 'p_cn_value'] = row['cn_value'] - row['cn_value'] * eff_val_sed_adj
-                # p_cn_value = row['cn_value'] - row['cn_value'] * row['eff_val_sediment']
-                # assumption: assuming that sediment load reductions are
-                # due to decreases in runoff volume so that they are 
-                # directly proportional and can bue used to scale the 
-                # new cn values for practice changes
-
-                # recalculate s
-                # gdf.loc[index, 'p_s'] = (1000 / gdf.loc[index, 'p_cn_value']) - 10
-                p_s = (1000 / gdf.loc[index, 'p_cn_value']) - 10
-
-                # recalculate q
-                # gdf.loc[index, 'p_q'] = (row['p']**2) / (row['p'] + row['p_s'])
-                p_q = (row['p']**2) / (row['p'] + p_s)
-
-                # convert inches to feet
-                # q_ft = row['p_q'] / 12
-                p_q_ft = p_q / 12
-
-                # calculate
-                gdf.loc[index, 'p_run_v'] = p_q_ft * row['area_ac'] * (row['rain_days'] * row['rd_cor'])
-
-                # print
-                print("calculated and appended p_run_v to geodataframe")
-        
-        # else bmp provides no water quantity benefits
-        else:
-            # practice change cn and runoff volume equals baseline
-            gdf.loc[index, 'p_cn_value'] = row['cn_value']
-            gdf.loc[index, 'p_run_v'] = row['b_run_v']
 
-        # print
-        print("calculated and appended p_run_v to geodataframe. no wq benefits provided.")
+    # cover crop bmp list
+    cc_bmp_list = ['cov_crop_1', 'cov_crop_2', 'cov_crop_3']
+
+    # get columns as arrays
+    cn_value = gdf['cn_value'].to_numpy(dtype = 'float64')
+    p = gdf['p'].to_numpy(dtype = 'float64')
+    area_ac = gdf['area_ac'].to_numpy(dtype = 'float64')
+
+    # if bmp provides water quantity benefits
+    wq = (gdf['eff_val_quantity'] == 1).to_numpy(dtype = bool, na_value = False)
+
+    # if cover crop bmp
+    cc = gdf['bmp_name'].isin(cc_bmp_list).to_numpy()
+
+    # recalculate cn for cover crop bmps
+    cc_cn_value = cn_value - 3
+    # source: see table 9-1 in usda nrcs handbook chapter 9
+    # (2004) on crop residue cover for poor and good soil
+    # conditions
+    # assumption: not all cover crop bmps have sediment bmp
+    # efficiency values so using usda nrcs handbook information
+    # instead of the efficiency values as described below for
+    # non-cover crop bmps
+
+    # apply bmp percent applied for non-cover crop bmps
+    eff_val_sed_adj = gdf['eff_val_sediment'].to_numpy(dtype = 'float64') * (gdf['bmp_ac'].to_numpy(dtype = 'float64')/area_ac)
+
+    # recalculate cn for non-cover crop bmps
+    sed_cn_value = cn_value - cn_value * eff_val_sed_adj
+    # assumption: assuming that sediment load reductions are
+    # due to decreases in runoff volume so that they are
+    # directly proportional and can bue used to scale the
+    # new cn values for practice changes
+
+    # practice change cn (equals baseline if no wq benefits provided)
+    p_cn_value = np.where(wq, np.where(cc, cc_cn_value, sed_cn_value), cn_value)
+
+    # recalculate s
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        p_s = (1000 / p_cn_value) - 10
+
+        # recalculate q
+        p_q = (p * p) / (p + p_s)
+
+    # convert inches to feet
+    p_q_ft = p_q / 12
+
+    # calculate (equals baseline if no wq benefits provided)
+    p_run_v = p_q_ft * area_ac * (gdf['rain_days'].to_numpy(dtype = 'float64') * gdf['rd_cor'].to_numpy(dtype = 'float64'))
+    gdf['p_cn_value'] = p_cn_value
+    gdf['p_run_v'] = np.where(wq, p_run_v, gdf['b_run_v'].to_numpy(dtype = 'float64'))
+
+    # print
+    diagnostics.info("calculated and appended p_run_v to geodataframe")
+
+    # print
+    diagnostics.record(diag, 'p_run_v', 'no_wq_benefit', int((~wq).sum()),
+        "calculated and appended p_run_v to geodataframe. no wq benefits provided for {n} field(s).")
 
     # return
     return gdf
 
 # practice change runoff sediment-bound nutrient load (reduction)
-def calc_prac_sed_nl(gdf):
+def calc_prac_sed_nl(gdf, diag = None):
     '''
     description:
     calculate practice change condition sediment-bound nutrient load
@@ -556,6 +591,8 @@ def calc_prac_sed_nl(gdf):
             eff_val_phophorus (float): bmp efficiency for phosphorus
             soil_conc_n (float): soil nitrogen concentration (percent)
             soil_conc_p (float): soil phosphorus concentration (percent)
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
 
     returns:
         e_lbs (float): sediment loss due to sheet and rill erosion (lbs/year
@@ -576,53 +613,43 @@ def calc_prac_sed_nl(gdf):
 
     # calculate sediment-bound nutrient loads
     gdf = gdf.reset_index(drop = True)
-    for index, row in gdf.iterrows():
-        # sediment-bound nitrogen load
-        # no efficiency value
-        if np.isnan(row['eff_val_nitrogen']):
-            # set to nan
-            gdf.loc[index, 'p_sed_n'] = np.nan
-
-            # print
-            print("no bmp n efficiency value available. nan returned.")
+    e_lbs = gdf['e_lbs'].to_numpy(dtype = 'float64')
+    del_ratio = gdf['del_ratio'].to_numpy(dtype = 'float64')
+    bmp_frac = gdf['bmp_ac'].to_numpy(dtype = 'float64')/gdf['area_ac'].to_numpy(dtype = 'float64')
 
+    # sediment-bound nitrogen load
+    eff_val_nitrogen = gdf['eff_val_nitrogen'].to_numpy(dtype = 'float64')
 
-        # else has efficiency value
-        else:
-            # apply bmp percent applied
-            eff_val_n_adj = row['eff_val_nitrogen'] * (row['bmp_ac']/row['area_ac'])
+    # apply bmp percent applied
+    eff_val_n_adj = eff_val_nitrogen * bmp_frac
 
-            # calculate
-            gdf.loc[index, 'p_sed_n'] = row['e_lbs'] * row['del_ratio'] * (1 - eff_val_n_adj) * soil_conc_n
+    # calculate (no efficiency value gives nan)
+    gdf['p_sed_n'] = np.where(np.isnan(eff_val_nitrogen), np.nan, e_lbs * del_ratio * (1 - eff_val_n_adj) * soil_conc_n)
 
-            # print
-            print("calculated and appended p_sed_n to geodataframe")
-            
-        # sediment-bound phosphorus load
-        # no efficiency value
-        if np.isnan(row['eff_val_phosphorus']):
-            # set to nan
-            gdf.loc[index, 'p_sed_p'] = np.nan
+    # print
+    diagnostics.info("calculated and appended p_sed_n to geodataframe")
+    diagnostics.record(diag, 'p_sed_n', 'no_efficiency', int(np.isnan(eff_val_nitrogen).sum()),
+        "no bmp n efficiency value available for {n} field(s). nan returned.")
 
-            # print
-            print("no bmp p efficiency value available. nan returned.")
+    # sediment-bound phosphorus load
+    eff_val_phosphorus = gdf['eff_val_phosphorus'].to_numpy(dtype = 'float64')
 
-        # if has efficiency value
-        else:
-            # apply bmp percent applied
-            eff_val_p_adj = row['eff_val_phosphorus'] * (row['bmp_ac']/row['area_ac'])
+    # apply bmp percent applied
+    eff_val_p_adj = eff_val_phosphorus * bmp_frac
 
-            # calculate
-            gdf.loc[index, 'p_sed_p'] = row['e_lbs'] * row['del_ratio'] * (1 - eff_val_p_adj) * soil_conc_p
+    # calculate (no efficiency value gives nan)
+    gdf['p_sed_p'] = np.where(np.isnan(eff_val_phosphorus), np.nan, e_lbs * del_ratio * (1 - eff_val_p_adj) * soil_conc_p)
 
-            # print
-            print("calculated and appended p_sed_p to geodataframe")
+    # print
+    diagnostics.info("calculated and appended p_sed_p to geodataframe")
+    diagnostics.record(diag, 'p_sed_p', 'no_efficiency', int(np.isnan(eff_val_phosphorus).sum()),
+        "no bmp p efficiency value available for {n} field(s). nan returned.")
 
     # return
     return gdf
 
 # practice change runoff nutrient load
-def calc_prac_run_nl(gdf):
+def calc_prac_run_nl(gdf, diag = None):
     '''
     description:
     calculate practice change condition runoff nutrient load (lbs),
@@ -643,6 +670,8 @@ def calc_prac_run_nl(gdf):
             load (lbs), see calc_prac_sed_nl function
             p_sed_p (float): practice change sediment-bound phosphorus
             load (lbs), see calc_prac_sed_nl function
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
 
     returns:
         p_run_n (float): practice change annual runoff nitrogen load
@@ -652,103 +681,61 @@ def calc_prac_run_nl(gdf):
     '''
     # calculate practice change nutrient loads
     gdf = gdf.reset_index(drop = True)
-    for index, row in gdf.iterrows():
-        # if cropland
-        if row['user_lu'] == 'cropland':
-            # practice change runoff nitrogen load
-            # if no efficiency value then return baseline condition
-            if np.isnan(row['eff_val_nitrogen']):
-                # set to nan
-                gdf.loc[index, 'p_run_n'] = row['b_run_n']
-
-                # print
-                print("no bmp n efficiency value available. nan returned.")
-
-            # if has efficiency value
-            else:
-                # apply bmp percent applied
-                eff_val_n_adj = row['eff_val_nitrogen'] * (row['bmp_ac']/row['area_ac'])
-                
-                # calculate
-                gdf.loc[index, 'p_run_n'] = row['b_run_n'] * eff_val_n_adj
-
-                # print
-                print("calculated and appended p_run_n to geodataframe")
-
-            # practice change runoff phosphorus load
-            # if no efficiency value then return baseline condition
-            if np.isnan(row['eff_val_phosphorus']):
-                # set to nan
-                gdf.loc[index, 'p_run_p'] = row['b_run_p']
-
-                # print
-                print("no bmp p efficiency value available. nan returned.")
-
-            # if has efficiency value
-            else:
-                # apply bmp percent applied
-                eff_val_p_adj = row['eff_val_phosphorus'] * (row['bmp_ac']/row['area_ac'])
-                
-                # calculate
-                gdf.loc[index, 'p_run_p'] = row['b_run_p'] * eff_val_p_adj
-
-                # print
-                print("calculated and appended p_run_p to geodataframe")
-
-        # if pastureland
-        elif row['user_lu'] == 'pastureland':
-            # practice change runoff nitrogen load
-            # if no efficiency value then return baseline condition
-            if np.isnan(row['eff_val_nitrogen']):
-                # set to baseline
-                gdf.loc[index, 'p_run_n'] =  row['b_run_n']
-
-                # print
-                print("no bmp n efficiency available. set to baseline.")
-
-            # else has efficiency value
-            else:
-                # apply bmp percent applied
-                eff_val_n_adj = row['eff_val_nitrogen'] * (row['bmp_ac']/row['area_ac'])
-                
-                # calculate
-                gdf.loc[index, 'p_run_n'] = row['b_run_n'] * eff_val_n_adj + row['p_sed_n']
-
-                # print
-                print("calculated and appended p_run_n to geodataframe")
-
-            # practice change runoff phosphorus load
-            # if no efficiency value then return baseline condition
-            if np.isnan(row['eff_val_phosphorus']):
-                # set to baseline
-                gdf.loc[index, 'p_run_p'] =  row['b_run_p']
-
-                # print
-                print("no bmp p efficiency value available. set to baseline.")
-
-            # else has efficiency value
-            else:
-                # apply bmp percent applied
-                eff_val_p_adj = row['eff_val_phosphorus'] * (row['bmp_ac']/row['area_ac'])
-                
-                # calculate
-                gdf.loc[index, 'p_run_p'] = row['b_run_p'] * eff_val_p_adj + row['p_sed_p']
-
-                # print
-                print("calculated and appended p_run_p to geodataframe")
-
-        # else not cropland or pastureland
-        else:
-            # result cannot be determined for other land use types
-            gdf.loc[index, 'p_run_n'] = np.nan
-            gdf.loc[index, 'p_run_p'] = np.nan
-            print("choose cropland or pastureland for practice change runoff nutrient load calculations. nan's returned.")
+    bmp_frac = gdf['bmp_ac'].to_numpy(dtype = 'float64')/gdf['area_ac'].to_numpy(dtype = 'float64')
+
+    # land use masks
+    crop = (gdf['user_lu'] == 'cropland').to_numpy(dtype = bool)
+    past = (gdf['user_lu'] == 'pastureland').to_numpy(dtype = bool)
+
+    # practice change runoff nitrogen load
+    b_run_n = gdf['b_run_n'].to_numpy(dtype = 'float64')
+    eff_val_nitrogen = gdf['eff_val_nitrogen'].to_numpy(dtype = 'float64')
+
+    # apply bmp percent applied
+    eff_val_n_adj = eff_val_nitrogen * bmp_frac
+
+    # cropland: reduced load, pastureland: reduced load plus
+    # sediment-bound load, if no efficiency value then return baseline
+    # condition, else not cropland or pastureland then nan
+    gdf['p_run_n'] = np.select(
+        [(crop | past) & np.isnan(eff_val_nitrogen), crop, past],
+        [b_run_n, b_run_n * eff_val_n_adj, b_run_n * eff_val_n_adj + gdf['p_sed_n'].to_numpy(dtype = 'float64')],
+        default = np.nan)
+
+    # print
+    diagnostics.info("calculated and appended p_run_n to geodataframe")
+    diagnostics.record(diag, 'p_run_n', 'no_efficiency', int(((crop | past) & np.isnan(eff_val_nitrogen)).sum()),
+        "no bmp n efficiency value available for {n} field(s). set to baseline.")
+
+    # practice change runoff phosphorus load
+    b_run_p = gdf['b_run_p'].to_numpy(dtype = 'float64')
+    eff_val_phosphorus = gdf['eff_val_phosphorus'].to_numpy(dtype = 'float64')
+
+    # apply bmp percent applied
+    eff_val_p_adj = eff_val_phosphorus * bmp_frac
+
+    # same conditions as for nitrogen
+    gdf['p_run_p'] = np.select(
+        [(crop | past) & np.isnan(eff_val_phosphorus), crop, past],
+        [b_run_p, b_run_p * eff_val_p_adj, b_run_p * eff_val_p_adj + gdf['p_sed_p'].to_numpy(dtype = 'float64')],
+        default = np.nan)
+
+    # print
+    diagnostics.info("calculated and appended p_run_p to geodataframe")
+    diagnostics.record(diag, 'p_run_p', 'no_efficiency', int(((crop | past) & np.isnan(eff_val_phosphorus)).sum()),
+        "no bmp p efficiency value available for {n} field(s). set to baseline.")
+
+    # else not cropland or pastureland
+    n_other = len(gdf) - int((crop | past).sum())
+    diagnostics.record(diag, 'p_run_n', 'other_land_use', n_other)
+    diagnostics.record(diag, 'p_run_p', 'other_land_use', n_other,
+        "choose cropland or pastureland for practice change runoff nutrient load calculations. nan's returned for {n} field(s).")
 
     # return
     return gdf
 
 # practice change runoff sediment load
-def calc_prac_run_sl(gdf):
+def calc_prac_run_sl(gdf, diag = None):
     '''
     description:
     calculate practice change condition runoff sediment load (tons)
@@ -762,32 +749,28 @@ def calc_prac_run_sl(gdf):
             erosion (float): annual sediment loss due to sheet and rill 
             erosion (tons), see calc_e function
             eff_val_sediment (float): bmp efficiency for sediment
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+
     returns:
         p_run_s (float): practice change annual runoff sediment load
         (tons), as a new column in gdf
     '''
     # calculate practice change nutrient loads
     gdf = gdf.reset_index(drop = True)
-    for index, row in gdf.iterrows():
-        # practice change runoff sediment load
-        # if no efficiency value then return baseline condition
-        if np.isnan(row['eff_val_sediment']):
-            # set to baseline
-            gdf.loc[index, 'p_run_s'] = row['b_run_s']
+    eff_val_sediment = gdf['eff_val_sediment'].to_numpy(dtype = 'float64')
 
-            # print
-            print("no bmp sediment efficiency available. set to baseline.")
+    # apply bmp percent applied
+    eff_val_s_adj = eff_val_sediment * (gdf['bmp_ac'].to_numpy(dtype = 'float64')/gdf['area_ac'].to_numpy(dtype = 'float64'))
 
-        # if has efficiency value
-        else:
-            # apply bmp percent applied
-            eff_val_s_adj = row['eff_val_sediment'] * (row['bmp_ac']/row['area_ac'])
-                
-            # calculate
-            gdf.loc[index, 'p_run_s'] = row['erosion'] * row['del_ratio'] * (1 -eff_val_s_adj)
+    # calculate (if no efficiency value then return baseline condition)
+    p_run_s = gdf['erosion'].to_numpy(dtype = 'float64') * gdf['del_ratio'].to_numpy(dtype = 'float64') * (1 -eff_val_s_adj)
+    gdf['p_run_s'] = np.where(np.isnan(eff_val_sediment), gdf['b_run_s'].to_numpy(dtype = 'float64'), p_run_s)
 
-            # print
-            print("calculated and appended p_run_s to geodataframe")
+    # print
+    diagnostics.info("calculated and appended p_run_s to geodataframe")
+    diagnostics.record(diag, 'p_run_s', 'no_efficiency', int(np.isnan(eff_val_sediment).sum()),
+        "no bmp sediment efficiency available for {n} field(s). set to baseline.")
 
     # return
     return gdf
@@ -799,7 +782,7 @@ def calc_prac_run_sl(gdf):
 
 # %% ---- calculate change function ----
 # percent change function
-def calc_perc_change(gdf):
+def calc_perc_change(gdf, diag = None):
     '''
     description:
     calculate the annual percent change from the baseline to practice
@@ -819,6 +802,9 @@ def calc_perc_change(gdf):
             p_run_p (float): practice change annual runoff phosphorus load (lbs)
             p_run_s (float): practice change annual sediment loss in
             runoff due to sheet and rill erosion (tons)
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+
     returns:
         pc_v (float): percent change in runoff volume (%),
         as a new column in gdf
@@ -831,71 +817,28 @@ def calc_perc_change(gdf):
     '''
     # calcuate percent changes for all variables
     gdf = gdf.reset_index(drop = True)
-    for index, row in gdf.iterrows():
-        # calculate percent change in runoff
-        # if baseline is greater than zero
-        if (row['b_run_v'] > 0):
-            # calculate
-            gdf.loc[index, 'pc_v'] = round(((row['b_run_v'] - row['p_run_v']) / row['b_run_v']) * 100, 1)
-
-            # print
-            print("calculated and appended pc_v to geodataframe")
-
-        # else baseline is equal to or less than zero
-        else:
-            # set to nan
-            gdf.loc[index, 'pc_v'] = np.nan
-
-            # print
-            print("baseline runoff volume is negative, zero, or is not defined. percent change cannot be calculated. nan returned.")
-
-        # calculate percent change in nitrogen load
-        # if baseline is greater than zero
-        if (row['b_run_n'] > 0):
-            # calculate
-            gdf.loc[index, 'pc_n'] = round(((row['b_run_n'] - row['p_run_n']) / row['b_run_n']) * 100, 1)
 
-            # print
-            print("calculated and appended pc_n to geodataframe")
+    # baseline, practice change, output column, and description
+    pc_list = [
+        ('b_run_v', 'p_run_v', 'pc_v', 'runoff volume'),
+        ('b_run_n', 'p_run_n', 'pc_n', 'nitrogen load'),
+        ('b_run_p', 'p_run_p', 'pc_p', 'phosphorus load'),
+        ('b_run_s', 'p_run_s', 'pc_s', 'sediment load')]
 
-        # else baseline is equal to or less than zero
-        else:
-            # set to nan
-            gdf.loc[index, 'pc_n'] = np.nan
-
-            # print
-            print("baseline nitrogen load is negative, zero, or is not defined. percent change cannot be calculated. nan returned.")
-
-        # calculate percent change in phosphorus load
-        # if baseline is greater than zero
-        if (row['b_run_p'] > 0):
-            # calculate
-            gdf.loc[index, 'pc_p'] = round(((row['b_run_p'] - row['p_run_p']) / row['b_run_p']) * 100, 1)
-
-            # print
-            print("calculated and appended pc_p to geodataframe")
-
-        # else baseline is equal to or less than zero
-        else:
-            gdf.loc[index, 'pc_p'] = np.nan
-            print("baseline phosphorus load is negative, zero, or is not defined. percent change cannot be calculated. nan returned.")
-
-        # calculate percent change in sediment load
-        # if baseline is greater than zero
-        if (row['b_run_s'] > 0):
-            # calculate
-            gdf.loc[index, 'pc_s'] = round(((row['b_run_s'] - row['p_run_s']) / row['b_run_s']) * 100, 1)
+    for b_col, p_col, pc_col, desc in pc_list:
+        b_val = gdf[b_col].to_numpy(dtype = 'float64')
+        p_val = gdf[p_col].to_numpy(dtype = 'float64')
 
-            # print
-            print("calculated and appended pc_s to geodataframe")
+        # if baseline is greater than zero calculate, else set to nan
+        pos = b_val > 0
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            pc_val = np.round(((b_val - p_val) / b_val) * 100, 1)
+        gdf[pc_col] = np.where(pos, pc_val, np.nan)
 
-        # else baseline is equal to or less than zero
-        else:
-            # set to nan
-            gdf.loc[index, 'pc_s'] = np.nan
-
-            # print
-            print("baseline sediment load is negative, zero, or is not defined. percent change cannot be calculated. nan returned.")
+        # print
+        diagnostics.info("calculated and appended " + pc_col + " to geodataframe")
+        diagnostics.record(diag, pc_col, 'no_baseline', len(gdf) - int(pos.sum()),
+            "baseline " + desc + " is negative, zero, or is not defined for {n} field(s). percent change cannot be calculated. nan returned.")
 
     # return
     return gdf
\ No newline at end of file
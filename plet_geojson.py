@@ -0,0 +1,321 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-11-04
+# email: sheila.saia@tetratech.com
+
+# script name: plet_geojson.py
+
+# script description: this script contains the plet module geojson
+# writer, which writes a geodataframe straight to geojson bytes (one
+# encode per feature, no intermediate dictionary of the whole result)
+
+# notes:
+# output has the same features, properties, and crs as
+# geodataframe.to_json() (feature id is the row index)
+# feature sequences (one feature per line) can be written as ndjson or
+# as geojson text sequences (rfc 8142), neither has a crs member
+# nan, inf, and missing values are written as null so the output is
+# always valid json
+# uses orjson (if installed) to encode properties, else the standard
+# json library
+
+# to do:
+
+
+# %% ---- load libraries ----
+import json
+
+import numpy as np
+import pandas as pd
+import shapely
+
+# fast json encoder (optional)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# %% ---- writer settings ----
+# number of features written per chunk
+BATCH_SIZE = 1000
+
+
+# %% ---- encoding functions ----
+# encode json
+def dumps(obj):
+    '''
+    description:
+    encode an object as compact json bytes (with orjson if installed)
+
+    parameters:
+        obj (dict, list, str, int, float, bool, or None): object to encode
+
+    returns:
+        obj_json (bytes): json bytes
+    '''
+    # orjson
+    if orjson is not None:
+        return orjson.dumps(obj)
+
+    # return
+    return json.dumps(obj, separators=(",", ":"), allow_nan=False).encode()
+
+
+# column values as json-ready list
+def column_values(col):
+    '''
+    description:
+    convert a (geo)dataframe column to a list of python values that can
+    be encoded as json (nan, inf, and missing values become None, dates
+    become iso strings)
+
+    parameters:
+        col (pandas series): column
+
+    returns:
+        values (list): python values
+    '''
+    # categorical columns (missing values have code -1, i.e., the last
+    # value)
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        cat_values = col.cat.categories.astype(object).tolist() + [None]
+        return [cat_values[code] for code in col.cat.codes.tolist()]
+
+    # nullable integer columns
+    if isinstance(col.dtype, pd.api.extensions.ExtensionDtype) and col.dtype.kind in "iu":
+        return col.to_numpy(dtype=object, na_value=None).tolist()
+
+    # numeric columns
+    vals = col.to_numpy()
+    if vals.dtype.kind in "biu":
+        return vals.tolist()
+    if vals.dtype.kind == "f":
+        values = vals.tolist()
+        for i in np.flatnonzero(~np.isfinite(vals)).tolist():
+            values[i] = None
+        return values
+
+    # date columns
+    if vals.dtype.kind == "M":
+        return [None if pd.isna(val) else val.isoformat() for val in col]
+
+    # all other columns (strings, mixed)
+    values = col.astype(object).tolist()
+    for i in np.flatnonzero(col.isna().to_numpy()).tolist():
+        values[i] = None
+
+    # return
+    return values
+
+
+# crs member
+def crs_json(crs):
+    '''
+    description:
+    get the geojson crs member for a crs (same as
+    geodataframe.to_json(), i.e., none for wgs84 or unset crs)
+
+    parameters:
+        crs (pyproj crs): crs, e.g., gdf.crs
+
+    returns:
+        crs (dict): geojson crs member (None if not needed)
+    '''
+    # no crs or wgs84
+    if crs is None or crs.equals("epsg:4326"):
+        return None
+
+    # urn (if crs has an allowed authority)
+    auth_crsdef = crs.to_authority()
+    if auth_crsdef is None or auth_crsdef[0] not in ["EDCS", "EPSG", "OGC", "SI", "UCUM"]:
+        return None
+    authority, code = auth_crsdef
+
+    # return
+    return {"type": "name", "properties": {"name": "urn:ogc:def:crs:" + authority + "::" + code}}
+
+
+# %% ---- writer functions ----
+# encode feature bodies
+def feature_bodies(gdf, properties=None):
+    '''
+    description:
+    encode the rows of a geodataframe as geojson feature bodies, i.e.,
+    features without the id and the outer braces (so they can be cached
+    and given an id later, see feature_collection function)
+
+    parameters:
+        gdf (geopandas geodataframe): geodataframe to encode
+        properties (list of dict): input properties of each row, e.g.,
+        from the geojson features the rows were made from (optional,
+        default is None), if given each body has the properties of its
+        own row with their own values (so not the columns or types of
+        other rows) followed by the columns of gdf that are not an input
+        property of any row, i.e., the same body as for a geodataframe
+        of only that row
+
+    returns:
+        bodies (list of bytes): encoded feature bodies
+    '''
+    # property columns (only columns that are not input properties)
+    prop_names = [col for col in gdf.columns if col != gdf.geometry.name]
+    if properties is not None:
+        input_names = set().union(*(row_props or {} for row_props in properties))
+        prop_names = [col for col in prop_names if col not in input_names]
+
+    # geometries (encoded all at once by shapely)
+    geoms = [b"null" if geom is None else geom.encode() for geom in shapely.to_geojson(gdf.geometry.to_numpy())]
+
+    # properties
+    prop_cols = [column_values(gdf[col]) for col in prop_names]
+    prop_rows = zip(*prop_cols) if prop_cols else ([] for _ in range(len(gdf)))
+    if properties is None:
+        props = [dumps(dict(zip(prop_names, row))) for row in prop_rows]
+    else:
+        props = [dumps({**(row_props or {}), **dict(zip(prop_names, row))}) for row_props, row in zip(properties, prop_rows)]
+
+    # return
+    return [b'"type":"Feature","properties":' + prop + b',"geometry":' + geom for prop, geom in zip(props, geoms)]
+
+
+# encode features
+def iter_features(gdf, batch_size=BATCH_SIZE):
+    '''
+    description:
+    encode the rows of a geodataframe as geojson features, in batches
+
+    parameters:
+        gdf (geopandas geodataframe): geodataframe to encode
+        batch_size (int): number of features per batch (optional,
+        default is BATCH_SIZE)
+
+    yields:
+        features (list of bytes): encoded features of the batch
+    '''
+    # encode in batches (so only one batch of python values is kept)
+    for start in range(0, len(gdf), batch_size):
+        batch = gdf.iloc[start:start + batch_size]
+
+        # feature ids (row index, same as to_json)
+        ids = [dumps(str(idx)) for idx in batch.index]
+
+        # features
+        yield [b'{"id":' + feat_id + b"," + body + b"}" for feat_id, body in zip(ids, feature_bodies(batch))]
+
+
+# write feature collection
+def iter_geojson(gdf, batch_size=BATCH_SIZE):
+    '''
+    description:
+    write a geodataframe as a geojson feature collection, one chunk per
+    batch of features (e.g., for a streamed response)
+
+    parameters:
+        gdf (geopandas geodataframe): geodataframe to write
+        batch_size (int): number of features per chunk (optional,
+        default is BATCH_SIZE)
+
+    yields:
+        chunk (bytes): next part of the feature collection
+    '''
+    # return
+    return iter_geojson_batches([gdf], batch_size=batch_size)
+
+
+# write feature collection from batches
+def iter_geojson_batches(gdf_batches, batch_size=BATCH_SIZE):
+    '''
+    description:
+    write batches of geodataframe rows as one geojson feature collection
+    (e.g., to write results to a file as each batch is calculated)
+
+    parameters:
+        gdf_batches (iterable of geopandas geodataframes): batches to
+        write (all with the same columns and crs)
+        batch_size (int): number of features per chunk (optional,
+        default is BATCH_SIZE)
+
+    yields:
+        chunk (bytes): next part of the feature collection
+    '''
+    # start of the feature collection
+    yield b'{"type":"FeatureCollection","features":['
+
+    # features
+    sep = b""
+    crs = None
+    for gdf in gdf_batches:
+        crs = crs_json(gdf.crs)
+        for features in iter_features(gdf, batch_size=batch_size):
+            yield sep + b",".join(features)
+            sep = b","
+
+    # end of the feature collection (with crs)
+    yield b"]" + (b"" if crs is None else b',"crs":' + dumps(crs)) + b"}"
+
+
+# write feature sequence
+def iter_geojson_seq(gdf_batches, rs=False):
+    '''
+    description:
+    write batches of geodataframe rows as a feature sequence with one
+    feature per line (ndjson), one chunk per batch so each batch can be
+    sent as soon as it is ready (e.g., for a streamed response)
+
+    parameters:
+        gdf_batches (iterable of geopandas geodataframes): batches to write
+        rs (bool): start each feature with a record separator, i.e.,
+        write a geojson text sequence (optional, default is False)
+
+    yields:
+        chunk (bytes): features of the next batch, one per line
+    '''
+    # feature prefix
+    prefix = b"\x1e" if rs else b""
+
+    # features
+    for gdf in gdf_batches:
+        for features in iter_features(gdf):
+            yield b"".join(prefix + feature + b"\n" for feature in features)
+
+
+# write feature collection from feature bodies
+def feature_collection(bodies, crs=None):
+    '''
+    description:
+    write encoded feature bodies as a geojson feature collection, with
+    the position of each feature as its id (same as to_geojson for a
+    geodataframe with a range index)
+
+    parameters:
+        bodies (list of bytes): encoded feature bodies, see
+        feature_bodies function
+        crs (pyproj crs): crs of the features (optional, default is None)
+
+    returns:
+        gdf_json (bytes): geojson feature collection
+    '''
+    # features
+    features = b",".join(b'{"id":"' + str(i).encode() + b'",' + body + b"}" for i, body in enumerate(bodies))
+
+    # return
+    crs_member = crs_json(crs)
+    return b'{"type":"FeatureCollection","features":[' + features + b"]" + (b"" if crs_member is None else b',"crs":' + dumps(crs_member)) + b"}"
+
+
+# write geojson
+def to_geojson(gdf):
+    '''
+    description:
+    write a geodataframe as geojson bytes
+
+    parameters:
+        gdf (geopandas geodataframe): geodataframe to write
+
+    returns:
+        gdf_json (bytes): geojson feature collection
+    '''
+    # return
+    return b"".join(iter_geojson(gdf))
@@ -0,0 +1,459 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-11-11
+# email: sheila.saia@tetratech.com
+
+# script name: plet_jobs.py
+
+# script description: this script contains the plet module job queue,
+# which runs plet module calculations in the background so large
+# requests can be submitted without waiting for the results
+
+# notes:
+# jobs run on a process pool made by the process that received them (a
+# local stand-in for a shared queue), with PLET_JOB_WORKERS processes
+# (default 1), so a running job does not compete with request handling
+# for the gil and is not stopped by a gunicorn worker timeout
+# job status and results are files in PLET_JOB_PATH (default is a
+# plet_jobs folder in the temp directory), so any gunicorn worker can
+# answer status and result requests
+# the process pool is made on the first submitted job (i.e., after
+# gunicorn forks the workers) and starts its processes with spawn (not
+# fork, which is unsafe in a process with threads)
+# each status file has the host and pid of the process that owns the job
+# (the process pool owner while queued, the job process while running)
+# and a heartbeat time (updated every PLET_JOB_HEARTBEAT seconds while
+# running), so a job whose process stopped (e.g., a crash or restart) is
+# marked failed when its status is read instead of staying queued or
+# running forever
+# finished jobs are deleted after PLET_JOB_TTL seconds (default 1 day)
+
+# to do:
+
+
+# %% ---- load libraries ----
+import json
+import logging
+import multiprocessing
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# custom plet functions
+import main as plet
+import plet_diagnostics
+import plet_geojson
+import plet_logging
+
+
+# %% ---- job settings ----
+# job folder
+JOB_PATH = os.environ.get("PLET_JOB_PATH", os.path.join(tempfile.gettempdir(), "plet_jobs"))
+
+# number of jobs that run at once (per process)
+JOB_WORKERS = int(os.environ.get("PLET_JOB_WORKERS", 1))
+
+# seconds to keep finished jobs
+JOB_TTL = int(os.environ.get("PLET_JOB_TTL", 86400))
+
+# seconds between heartbeats of a running job
+JOB_HEARTBEAT = int(os.environ.get("PLET_JOB_HEARTBEAT", 30))
+
+# seconds without a heartbeat before a running job is marked failed
+JOB_STALE = int(os.environ.get("PLET_JOB_STALE", 10 * JOB_HEARTBEAT))
+
+# host name (pids are only checked for jobs on this host)
+HOST = socket.gethostname()
+
+# number of fields per batch (progress is updated after each batch)
+BATCH_SIZE = 1000
+
+# job id format
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# process pool (made on the first submitted job)
+_executor = None
+_executor_lock = threading.Lock()
+
+# status file lock (the heartbeat thread and the job both write it)
+_status_lock = threading.Lock()
+
+
+# %% ---- job file functions ----
+# job file path
+def job_file(job_id, ext, job_path=None):
+    '''
+    description:
+    get the path of a job file
+
+    parameters:
+        job_id (str): job id
+        ext (str): file extension ("json" for the status, "geojson" for
+        the result)
+        job_path (str): job folder (optional, default is JOB_PATH)
+
+    returns:
+        file_path (str): job file path
+    '''
+    # return
+    return os.path.join(job_path or JOB_PATH, job_id + "." + ext)
+
+
+# write job status
+def write_status(job, job_path=None):
+    '''
+    description:
+    write the job status file (written to a temporary file first and
+    then renamed, so readers never see a partial file)
+
+    parameters:
+        job (dict): job status, see submit_job function
+        job_path (str): job folder (optional, default is JOB_PATH)
+    '''
+    # write (the temporary file name is unique to this process and thread)
+    status_path = job_file(job["job_id"], "json", job_path)
+    tmp_path = status_path + "." + str(os.getpid()) + "_" + str(threading.get_ident()) + ".tmp"
+    with _status_lock:
+        with open(tmp_path, "w") as status_file:
+            json.dump(job, status_file)
+        os.replace(tmp_path, status_path)
+
+
+# check a process
+def pid_alive(pid):
+    '''
+    description:
+    check if a process is running on this host
+
+    parameters:
+        pid (int): process id
+
+    returns:
+        alive (bool): True if the process is running
+    '''
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# fail a job whose process stopped
+def check_job(job, job_path=None):
+    '''
+    description:
+    mark a queued or running job as failed (and write its status file) if
+    the process that owns it is no longer running on this host or, for a
+    running job, if its heartbeat is older than JOB_STALE seconds
+
+    parameters:
+        job (dict): job status, see submit_job function
+        job_path (str): job folder (optional, default is JOB_PATH)
+
+    returns:
+        job (dict): job status (updated if the job failed)
+    '''
+    # finished jobs
+    if job["status"] not in ["queued", "running"]:
+        return job
+
+    # check process and heartbeat
+    # (status files from before pids were written have none to check)
+    if job.get("host") == HOST and not pid_alive(job["pid"]):
+        error = "job process " + str(job["pid"]) + " stopped before the job finished"
+    elif job["status"] == "running" and time.time() - job.get("heartbeat_time", time.time()) > JOB_STALE:
+        error = "job process " + str(job["pid"]) + " on " + job["host"] + " stopped sending heartbeats"
+    else:
+        return job
+
+    # failed
+    job["status"] = "failed"
+    job["error"] = error
+    job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    job["finished_time"] = time.time()
+    write_status(job, job_path)
+    plet_logging.log_event("job_failed", level=logging.ERROR, job_id=job["job_id"], error=error)
+
+    # return
+    return job
+
+
+# read job status
+def get_job(job_id, job_path=None):
+    '''
+    description:
+    read the status of a job
+
+    parameters:
+        job_id (str): job id
+        job_path (str): job folder (optional, default is JOB_PATH)
+
+    returns:
+        job (dict): job status (None if there is no job with this id),
+        see submit_job function (a job whose process stopped is marked
+        failed, see check_job function)
+    '''
+    # check job id (it is used in a file path)
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        return None
+
+    # read
+    try:
+        with open(job_file(job_id, "json", job_path)) as status_file:
+            job = json.load(status_file)
+    except FileNotFoundError:
+        return None
+
+    # return
+    return check_job(job, job_path)
+
+
+# delete old jobs
+def delete_old_jobs(job_path=None, ttl=JOB_TTL):
+    '''
+    description:
+    delete the files of jobs that finished more than ttl seconds ago (jobs
+    whose process stopped are marked failed first, see check_job function)
+
+    parameters:
+        job_path (str): job folder (optional, default is JOB_PATH)
+        ttl (int): seconds to keep finished jobs (optional, default is
+        JOB_TTL)
+    '''
+    # check each job
+    job_path = job_path or JOB_PATH
+    for file_name in os.listdir(job_path):
+        job_id, ext = os.path.splitext(file_name)
+        if ext != ".json":
+            continue
+        job = get_job(job_id, job_path)
+        if job is None or job["finished_at"] is None or time.time() - job["finished_time"] < ttl:
+            continue
+
+        # delete
+        for job_ext in ["geojson", "json"]:
+            try:
+                os.remove(job_file(job_id, job_ext, job_path))
+            except FileNotFoundError:
+                pass
+
+
+# %% ---- job functions ----
+# update job progress
+def track_progress(batches, job, job_path=None):
+    '''
+    description:
+    pass on batches of results and update the job progress (n_done)
+    after each batch is used
+
+    parameters:
+        batches (iterable of geopandas geodataframes): batches of results
+        job (dict): job status, see submit_job function
+        job_path (str): job folder (optional, default is JOB_PATH)
+
+    yields:
+        batch (geopandas geodataframe): next batch of results
+    '''
+    for batch in batches:
+        yield batch
+        job["n_done"] += len(batch)
+        job["heartbeat_time"] = time.time()
+        write_status(job, job_path)
+
+
+# send heartbeats
+def send_heartbeats(job, stop, job_path=None):
+    '''
+    description:
+    update the job heartbeat time every JOB_HEARTBEAT seconds until stop
+    is set (run on a thread next to the job, so long batches still send
+    heartbeats)
+
+    parameters:
+        job (dict): job status, see submit_job function
+        stop (threading.Event): set when the job is finished
+        job_path (str): job folder (optional, default is JOB_PATH)
+    '''
+    while not stop.wait(JOB_HEARTBEAT):
+        job["heartbeat_time"] = time.time()
+        write_status(job, job_path)
+
+
+# run a job
+def run_job(job, features, batch_size=BATCH_SIZE, job_path=None):
+    '''
+    description:
+    run the plet module on the fields of a job in batches, writing the
+    results to the job result file and the progress to the job status
+    file after each batch
+
+    parameters:
+        job (dict): job status, see submit_job function
+        features (list of dict): geojson features (one per field)
+        batch_size (int): number of fields per batch (optional, default
+        is BATCH_SIZE)
+        job_path (str): job folder (optional, default is JOB_PATH)
+    '''
+    # log with the job id as the request id
+    request_id_token = plet_logging.request_id_var.set(job["job_id"])
+    start_time = time.perf_counter()
+    stop_heartbeats = threading.Event()
+    heartbeats = threading.Thread(
+        target=send_heartbeats, args=(job, stop_heartbeats, job_path),
+        name="plet_job_heartbeat", daemon=True)
+
+    try:
+        # running (owned by this process)
+        job["status"] = "running"
+        job["started_at"] = datetime.now().isoformat(timespec="seconds")
+        job["host"] = HOST
+        job["pid"] = os.getpid()
+        job["heartbeat_time"] = time.time()
+        write_status(job, job_path)
+        heartbeats.start()
+        plet_logging.log_event("job_started", n_fields=job["n_fields"])
+
+        # run plet module in batches (and update progress after each)
+        diag = plet_diagnostics.new_diagnostics()
+        batches = track_progress(plet.iter_plet_features(features, batch_size=batch_size, diag=diag), job, job_path)
+
+        # write results
+        result_path = job_file(job["job_id"], "geojson", job_path)
+        with open(result_path + ".tmp", "wb") as result_file:
+            for chunk in plet_geojson.iter_geojson_batches(batches):
+                result_file.write(chunk)
+        os.replace(result_path + ".tmp", result_path)
+
+        # done
+        job["status"] = "done"
+        job["diagnostics"] = diag
+        plet_logging.log_event(
+            "job_done", n_fields=job["n_fields"], diagnostics=diag,
+            seconds=round(time.perf_counter() - start_time, 4))
+
+    # failed
+    except Exception as error:
+        job["status"] = "failed"
+        job["error"] = str(error)
+
+        # delete partial results
+        result_tmp_path = job_file(job["job_id"], "geojson", job_path) + ".tmp"
+        if os.path.exists(result_tmp_path):
+            os.remove(result_tmp_path)
+
+        # log
+        plet_logging.log_event("job_failed", level=logging.ERROR, exc_info=True, seconds=round(time.perf_counter() - start_time, 4))
+
+    # finished
+    finally:
+        stop_heartbeats.set()
+        if heartbeats.is_alive():
+            heartbeats.join()
+        job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        job["finished_time"] = time.time()
+        write_status(job, job_path)
+        plet_logging.request_id_var.reset(request_id_token)
+
+
+# fail a job whose process pool broke
+def check_future(future, job, job_path=None):
+    '''
+    description:
+    mark a job as failed if its process pool broke (e.g., the job process
+    was killed) before the job finished (run when the job future is done)
+
+    parameters:
+        future (concurrent.futures.Future): job future
+        job (dict): job status, see submit_job function
+        job_path (str): job folder (optional, default is JOB_PATH)
+    '''
+    # job finished (run_job writes its own status)
+    if future.cancelled() or not isinstance(future.exception(), BrokenProcessPool):
+        return
+
+    # failed (unless the job process finished first)
+    job = get_job(job["job_id"], job_path)
+    if job is not None and job["status"] in ["queued", "running"]:
+        job["status"] = "failed"
+        job["error"] = "job process stopped before the job finished"
+        job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        job["finished_time"] = time.time()
+        write_status(job, job_path)
+        plet_logging.log_event("job_failed", level=logging.ERROR, job_id=job["job_id"], error=job["error"])
+
+
+# submit a job
+def submit_job(features, batch_size=BATCH_SIZE, job_path=None):
+    '''
+    description:
+    add a plet module job to the queue and return right away
+
+    parameters:
+        features (list of dict): geojson features (one per field)
+        batch_size (int): number of fields per batch (optional, default
+        is BATCH_SIZE)
+        job_path (str): job folder (optional, default is JOB_PATH)
+
+    returns:
+        job (dict): job status with the following keys:
+            job_id (str): job id
+            status (str): "queued", "running", "done", or "failed"
+            n_fields (int): number of fields
+            n_done (int): number of fields calculated so far
+            submitted_at, started_at, finished_at (str): times (iso
+            format, None until reached)
+            finished_time (float): finish time (seconds since epoch)
+            error (str): error message (None unless failed)
+            diagnostics (dict): diagnostics collector when done, see
+            plet_diagnostics.py
+            host (str): host of the process that owns the job
+            pid (int): process that owns the job (the process that
+            submitted it while queued, the job process while running)
+            heartbeat_time (float): last heartbeat (seconds since epoch)
+    '''
+    # make process pool (once per process, or again if a job process was
+    # killed, which breaks the pool)
+    global _executor
+    with _executor_lock:
+        if _executor is None or getattr(_executor, "_broken", False):
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        executor = _executor
+
+    # clean up job folder
+    os.makedirs(job_path or JOB_PATH, exist_ok=True)
+    delete_old_jobs(job_path)
+
+    # queued
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "queued",
+        "n_fields": len(features),
+        "n_done": 0,
+        "submitted_at": datetime.now().isoformat(timespec="seconds"),
+        "started_at": None,
+        "finished_at": None,
+        "finished_time": None,
+        "error": None,
+        "diagnostics": None,
+        "host": HOST,
+        "pid": os.getpid(),
+        "heartbeat_time": time.time(),
+    }
+    write_status(job, job_path)
+
+    # add to queue (the job process updates its own copy)
+    future = executor.submit(run_job, dict(job), features, batch_size, job_path)
+    future.add_done_callback(lambda done: check_future(done, job, job_path))
+
+    # return
+    return job
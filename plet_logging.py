@@ -0,0 +1,128 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-10-21
+# email: sheila.saia@tetratech.com
+
+# script name: plet_logging.py
+
+# script description: this script contains the plet module request log,
+# which writes one structured (json) line per request stage and is safe
+# to use from many threads at once
+
+# notes:
+# every log line has the request id of the request that wrote it, which
+# is kept in a context variable (one value per thread/request)
+# log lines go to stderr unless the PLET_LOG_FILE environment variable
+# is set to a file path
+
+# to do:
+
+
+# %% ---- load libraries ----
+import contextvars
+import json
+import logging
+import os
+import uuid
+
+
+# %% ---- logger settings ----
+# logger name
+LOGGER_NAME = "plet"
+
+# request id of the current request ("-" outside of a request)
+request_id_var = contextvars.ContextVar("plet_request_id", default="-")
+
+
+# %% ---- log classes ----
+# json log line formatter
+class JsonFormatter(logging.Formatter):
+    '''
+    description:
+    format a log record as one json line with the time, level, request
+    id, stage, and any other fields passed to log_event
+    '''
+    def format(self, record):
+        # base fields
+        log_line = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "request_id": request_id_var.get(),
+            "stage": record.getMessage(),
+        }
+
+        # event fields
+        log_line.update(getattr(record, "fields", {}))
+
+        # exception
+        if record.exc_info:
+            log_line["error"] = self.formatException(record.exc_info)
+
+        # return
+        return json.dumps(log_line, default=str)
+
+
+# %% ---- log functions ----
+# set up logger
+def setup_logging(log_path=None, level=logging.INFO):
+    '''
+    description:
+    set up the plet module request log (only the first call has an
+    effect, so it is safe to call at import time)
+
+    parameters:
+        log_path (str): path to the log file (optional, default is the
+        PLET_LOG_FILE environment variable, or stderr if that is not set)
+        level (int): logging level (optional, default is logging.INFO)
+
+    returns:
+        logger (logging logger): plet module request logger
+    '''
+    # get logger
+    logger = logging.getLogger(LOGGER_NAME)
+    if logger.handlers:
+        return logger
+
+    # log file or stderr
+    if log_path is None:
+        log_path = os.environ.get("PLET_LOG_FILE")
+    handler = logging.FileHandler(log_path) if log_path else logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+
+    # set up
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    # return
+    return logger
+
+
+# new request id
+def new_request_id():
+    '''
+    description:
+    make a new (random) request id
+
+    returns:
+        request_id (str): request id (12 hex characters)
+    '''
+    # return
+    return uuid.uuid4().hex[:12]
+
+
+# log one request stage
+def log_event(stage, level=logging.INFO, exc_info=False, **fields):
+    '''
+    description:
+    write one structured log line for the current request
+
+    parameters:
+        stage (str): request stage (e.g., "received", "calculated")
+        level (int): logging level (optional, default is logging.INFO)
+        exc_info (bool): include the current exception (optional,
+        default is False)
+        **fields: other values to include in the log line (e.g., counts)
+    '''
+    logging.getLogger(LOGGER_NAME).log(level, stage, exc_info=exc_info, extra={"fields": fields})
@@ -0,0 +1,782 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-09-23
+# email: sheila.saia@tetratech.com
+
+# script name: plet_lookups.py
+
+# script description: this script contains the plet module lookup
+# registry, which loads all lookup tables once per process (e.g., at
+# flask app/worker startup) and shares them between requests
+
+# notes:
+# the csv files in data/lookups are the source of truth
+# tables in the registry are shared by all requests so they must be
+# treated as read-only (join/merge them, do not add or edit columns)
+# each process checks the csv files every LOOKUP_CHECK_SECONDS (see
+# get_lookups) and reloads the registry if they changed, so all gunicorn
+# workers pick up the annual data update without a restart (a reload in
+# one worker would not reach the others)
+# build_lookup_bundle.py compiles the csv files into a binary lookup
+# bundle that is memory-mapped (no parsing), the bundle is only used if
+# it matches the csv files
+# with the bundle, the numeric arrays (key index rows and numeric table
+# columns, about 2.3 MB) are views of the memory-mapped files, so they
+# are shared between worker processes through the page cache, the table
+# indexes, key dictionaries, and text columns (about 0.3 MB) are
+# private to each process
+# coefficient tables (see COEF_TABLES) are precomputed joins of lookup
+# tables, so the static coefficients of a field (usle factors and cn
+# value) can be looked up with one gather
+# the registry has a category dictionary for each field key column (see
+# CATEGORY_KEYS), so field data can carry these columns as pandas
+# categoricals (small integer codes) that are matched to the lookup
+# tables by category instead of by string
+
+# to do:
+
+
+# %% ---- load libraries ----
+import hashlib
+import json
+import os
+import threading
+import time
+import types
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+import plet_diagnostics as diagnostics
+
+
+# %% ---- lookup table definitions ----
+# default lookup table directory
+LOOKUP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lookups")
+
+# default lookup bundle directory (see build_lookup_bundle.py)
+BUNDLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lookups_bundle")
+
+# lookup bundle format (change when the bundle layout changes)
+BUNDLE_FORMAT = 2
+
+# lookup name: (csv file name, index columns, columns to drop)
+LOOKUP_TABLES = {
+    "animal_nutr": ("animal_nutrient_ratio.csv", ["animal", "animal_detail"], []),
+    "animal_wts": ("animal_wts.csv", ["animal"], []),
+    "bmp_eff": ("bmp_eff_vals.csv", ["land_use", "bmp_name"], ["bmp_full_name"]),
+    "bmp_eff_testing": ("bmp_eff_vals_testing.csv", ["land_use", "bmp_name"], ["bmp_full_name"]),
+    "cn_val": ("cn.csv", ["land_use", "hsg"], ["notes"]),
+    "gw_infil": ("gw_infil_frac.csv", ["land_use", "hsg"], ["notes"]),
+    "gw_nutr": ("gw_nutrients.csv", ["land_use", "nutrient"], []),
+    "lu": ("lu.csv", ["land_use"], []),
+    "runoff_nutr": ("runoff_nutrients.csv", ["land_use", "animal_inten"], []),
+    "usle": ("usle.csv", ["fips", "user_lu"], ["name", "state_name", "land_use"]),
+    "usle_testing": ("usle_testing.csv", ["fips", "user_lu"], ["name", "state_name", "land_use"]),
+}
+
+# coefficient table name: (usle lookup name, cn lookup name), indexed by
+# fips, user land use, and hsg
+COEF_TABLES = {
+    "coef": ("usle", "cn_val"),
+    "coef_testing": ("usle_testing", "cn_val"),
+}
+
+# field key column: lookup key columns whose values make up its category
+# dictionary
+CATEGORY_KEYS = {
+    "user_lu": ["land_use", "user_lu"],
+    "hsg": ["hsg"],
+    "bmp_name": ["bmp_name"],
+}
+
+# seconds between checks for updated csv files (0 checks on every call
+# of get_lookups)
+LOOKUP_CHECK_SECONDS = float(os.environ.get("PLET_LOOKUP_CHECK_SECONDS", 30))
+
+# registry state (replaced as a whole on reload, which is a single
+# assignment, so requests never see a partly loaded registry)
+_registry = None
+
+# time of the last csv file check (and lock so one thread checks)
+_checked_at = 0.0
+_check_lock = threading.Lock()
+
+
+# %% ---- loading functions ----
+# read one lookup table
+def read_lookup(lookup_path, file_name):
+    '''
+    description:
+    read a lookup table csv (some lookup csv files have a byte order mark
+    at the start of the header, which is dropped here)
+
+    parameters:
+        lookup_path (str): path to the lookup table directory
+        file_name (str): name of the csv file
+
+    returns:
+        lookup_df (pandas dataframe): lookup table
+    '''
+    # return
+    return pd.read_csv(os.path.join(lookup_path, file_name), encoding="utf-8-sig")
+
+
+# index one lookup table
+def index_lookup(name, lookup_df, lu_df):
+    '''
+    description:
+    index a lookup table by its key columns so it can be joined to field
+    data directly, usle tables are first linked to the user land use
+    type (see lu.csv) and rows without a fips code are dropped
+
+    parameters:
+        name (str): lookup name, see LOOKUP_TABLES
+        lookup_df (pandas dataframe): lookup table, see read_lookup function
+        lu_df (pandas dataframe): land use lookup table (lu.csv)
+
+    returns:
+        lookup_idx (pandas dataframe): lookup table indexed by its key columns
+    '''
+    # get table definition
+    file_name, index_cols, drop_cols = LOOKUP_TABLES[name]
+
+    # link usle land use to user land use
+    if "user_lu" in index_cols:
+        lookup_df = (
+            lookup_df.merge(lu_df, how="inner", on="land_use")
+            .dropna(subset="fips")
+            .astype({"fips": "int64"})
+        )
+
+    # return
+    return lookup_df.drop(drop_cols, axis=1).set_index(index_cols).sort_index()
+
+
+# read all lookup tables
+def read_lookup_tables(lookup_path=LOOKUP_PATH):
+    '''
+    description:
+    read and index all lookup table csv files
+
+    parameters:
+        lookup_path (str): path to the lookup table directory (optional,
+        default is data/lookups in this repository)
+
+    returns:
+        tables (dict): indexed lookup tables keyed by lookup name (see
+        LOOKUP_TABLES and COEF_TABLES)
+    '''
+    # read land use lookup first (needed to index usle tables)
+    lu_df = read_lookup(lookup_path, LOOKUP_TABLES["lu"][0])
+
+    # read and index all tables
+    tables = {}
+    for name, (file_name, index_cols, drop_cols) in LOOKUP_TABLES.items():
+        tables[name] = index_lookup(name, read_lookup(lookup_path, file_name), lu_df)
+
+    # precompute coefficient tables
+    for name, (usle_name, cn_name) in COEF_TABLES.items():
+        tables[name] = coef_table(tables[usle_name], tables[cn_name])
+
+    # return
+    return tables
+
+
+# precompute one coefficient table
+def coef_table(usle_idx, cn_idx):
+    '''
+    description:
+    join an indexed usle table and the indexed cn table for all key
+    combinations (every hsg of the land use of each fips and land use)
+
+    parameters:
+        usle_idx (pandas dataframe): usle table indexed by fips and user
+        land use, see index_lookup function
+        cn_idx (pandas dataframe): cn table indexed by land use and hsg
+
+    returns:
+        coef_idx (pandas dataframe): usle factor and cn value columns
+        indexed by fips, user land use, and hsg
+    '''
+    # join on land use
+    cn_df = cn_idx.reset_index().rename(columns={"land_use": "user_lu"})
+
+    # return
+    return usle_idx.reset_index().merge(cn_df, on="user_lu").set_index(["fips", "user_lu", "hsg"]).sort_index()
+
+
+# load all lookup tables
+def load_lookups(lookup_path=LOOKUP_PATH, bundle_path=BUNDLE_PATH):
+    '''
+    description:
+    load all lookup tables and make them the process-wide lookup
+    registry, the lookup bundle is used if it was built from the current
+    csv files (see build_bundle function), otherwise the csv files are read
+
+    parameters:
+        lookup_path (str): path to the lookup table directory (optional,
+        default is data/lookups in this repository)
+        bundle_path (str): path to the lookup bundle directory (optional,
+        default is data/lookups_bundle in this repository, None to always
+        read the csv files)
+
+    returns:
+        lookups (read-only dict): indexed lookup tables keyed by lookup
+        name (see LOOKUP_TABLES and COEF_TABLES), plus "key_index" (key indexes keyed by
+        lookup name, see build_key_index), "categories" (category
+        dictionaries, see build_categories), "version" (see lookup_version),
+        "source" (bundle or csv directory that was read), "lookup_path",
+        "bundle_path" and "loaded_at"
+    '''
+    # version of the csv files
+    version = lookup_version(lookup_path)
+
+    # use the lookup bundle if it matches the csv files
+    manifest = read_manifest(bundle_path) if bundle_path is not None else None
+    if manifest is not None and manifest["version"] == version:
+        tables, key_indexes = read_bundle(bundle_path, manifest)
+        source = bundle_path
+
+    # else read the csv files
+    else:
+        tables = read_lookup_tables(lookup_path)
+        key_indexes = {name: build_key_index(tables[name]) for name in tables}
+        source = lookup_path
+
+    # registry
+    categories = build_categories(tables)
+    tables["key_index"] = types.MappingProxyType(key_indexes)
+    tables["categories"] = categories
+    tables["version"] = version
+    tables["source"] = source
+    tables["lookup_path"] = lookup_path
+    tables["bundle_path"] = bundle_path
+    tables["loaded_at"] = datetime.now().isoformat(timespec="seconds")
+
+    # swap registry
+    global _registry, _checked_at
+    _registry = types.MappingProxyType(tables)
+    _checked_at = time.monotonic()
+
+    # print
+    diagnostics.info("loaded " + str(len(LOOKUP_TABLES)) + " lookup tables (version " + version + ") from " + source)
+
+    # return
+    return _registry
+
+
+# reload all lookup tables
+def reload_lookups(lookup_path=None, bundle_path=None):
+    '''
+    description:
+    reload all lookup tables (e.g., after the annual data update),
+    requests that are already running keep the tables they started with
+
+    parameters:
+        lookup_path (str): path to the lookup table directory (optional,
+        default is the path used for the current registry)
+        bundle_path (str): path to the lookup bundle directory (optional,
+        default is the path used for the current registry)
+
+    returns:
+        lookups (read-only dict): new lookup registry, see load_lookups
+    '''
+    # use current paths if none given
+    if lookup_path is None:
+        lookup_path = _registry["lookup_path"] if _registry is not None else LOOKUP_PATH
+    if bundle_path is None:
+        bundle_path = _registry["bundle_path"] if _registry is not None else BUNDLE_PATH
+
+    # return
+    return load_lookups(lookup_path, bundle_path)
+
+
+# check for updated lookup tables
+def check_lookups(force=False):
+    '''
+    description:
+    reload the lookup registry if the csv files changed since it was
+    loaded (i.e., the lookup version changed), at most once every
+    LOOKUP_CHECK_SECONDS
+
+    parameters:
+        force (bool): check now, even if the last check was less than
+        LOOKUP_CHECK_SECONDS ago (optional, default is False)
+
+    returns:
+        reloaded (bool): True if the registry was reloaded
+    '''
+    global _checked_at
+
+    # skip if checked recently (or another thread is checking)
+    if _registry is None or (not force and time.monotonic() - _checked_at < LOOKUP_CHECK_SECONDS):
+        return False
+    if not _check_lock.acquire(blocking=False):
+        return False
+
+    # compare versions
+    try:
+        _checked_at = time.monotonic()
+        try:
+            version = lookup_version(_registry["lookup_path"])
+        except OSError:
+            # keep the current tables while csv files are being replaced
+            return False
+        if version == _registry["version"]:
+            return False
+        reload_lookups()
+        return True
+    finally:
+        _check_lock.release()
+
+
+# get lookup registry
+def get_lookups():
+    '''
+    description:
+    get the process-wide lookup registry, loading it on first use and
+    reloading it if the csv files changed (see check_lookups)
+
+    returns:
+        lookups (read-only dict): lookup registry, see load_lookups
+    '''
+    # load on first use, else check for updated csv files
+    if _registry is None:
+        load_lookups()
+    else:
+        check_lookups()
+
+    # return
+    return _registry
+
+
+# %% ---- key index functions ----
+# build key index for one lookup table
+def build_key_index(lookup_idx):
+    '''
+    description:
+    precompute a composite key index for a lookup table: each key column
+    gets a dictionary of its unique values (so field keys can be encoded
+    as integer codes) and a dense array maps every combination of codes
+    to a row of the table (or -1 if the combination is not in the table)
+
+    parameters:
+        lookup_idx (pandas dataframe): lookup table indexed by its key
+        columns, see index_lookup function
+
+    returns:
+        key_index (read-only dict): "levels" (list of pandas index, unique
+        values for each key column), "rows" (int32 array with one
+        dimension per key column), and "values" (dict of numpy arrays, one
+        per value column)
+    '''
+    # unique values and codes for each key column
+    levels = []
+    codes = []
+    for i in range(lookup_idx.index.nlevels):
+        key_vals = lookup_idx.index.get_level_values(i)
+        level = pd.Index(key_vals.unique())
+        levels.append(level)
+        codes.append(level.get_indexer(key_vals))
+
+    # dense array of row positions
+    rows = np.full(tuple(len(level) for level in levels), -1, dtype="int32")
+    rows[tuple(codes)] = np.arange(len(lookup_idx), dtype="int32")
+
+    # value columns
+    values = {col: lookup_idx[col].to_numpy() for col in lookup_idx.columns}
+
+    # return
+    return types.MappingProxyType({"levels": levels, "rows": rows, "values": values})
+
+
+# encode field keys as codes of a key index level
+def key_codes(level, vals):
+    '''
+    description:
+    get the position of each field key in a key index level (-1 if it is
+    not in the level), categorical keys are matched by category, so only
+    the categories are hashed and the codes are one gather
+
+    parameters:
+        level (pandas index): unique values of a lookup key column, see
+        build_key_index function
+        vals (pandas series): field keys
+
+    returns:
+        codes (int array): position of each field key in level
+    '''
+    # string or numeric keys
+    if not isinstance(vals.dtype, pd.CategoricalDtype):
+        return level.get_indexer(vals)
+
+    # categorical keys (missing values have code -1, which picks the
+    # position of nan in the level, i.e., the last value)
+    cat_codes = np.append(level.get_indexer(vals.cat.categories), level.get_indexer([np.nan]))
+
+    # return
+    return cat_codes[vals.cat.codes.to_numpy()]
+
+
+# gather lookup values for fields
+def gather_lookup(lookups, name, df, on, diag=None):
+    '''
+    description:
+    look up the values of a lookup table for each field with one
+    vectorized gather (same result as a left join of df with the lookup
+    table on the given columns)
+
+    parameters:
+        lookups (read-only dict): lookup registry, see load_lookups function
+        name (str): lookup name, see LOOKUP_TABLES
+        df (pandas dataframe): field data
+        on (list of str): columns of df that match the index columns of
+        the lookup table (in the same order)
+        diag (dict): diagnostics collector, see plet_diagnostics.py
+        (optional, default is None)
+
+    returns:
+        lookup_vals (pandas dataframe): lookup table value columns for
+        each field with the same index as df, fields without a match get
+        nan (integer columns are then returned as nullable integers, so
+        the values of matched fields do not depend on the other fields)
+    '''
+    # get key index
+    key_index = lookups["key_index"][name]
+
+    # encode field keys as codes (-1 if not in the lookup table)
+    codes = [key_codes(level, df[col]) for level, col in zip(key_index["levels"], on)]
+    hit = np.logical_and.reduce([code >= 0 for code in codes])
+
+    # get row of the lookup table for each field (-1 if no match)
+    rows = key_index["rows"][tuple(np.where(hit, code, 0) for code in codes)]
+    rows = np.where(hit, rows, -1)
+    hit = rows >= 0
+    diagnostics.record(
+        diag, name, "no_match", len(hit) - int(hit.sum()),
+        "no " + name + " lookup match for {n} field(s). nan returned.",
+    )
+
+    # gather values
+    lookup_vals = {}
+    for col, vals in key_index["values"].items():
+        col_vals = vals[np.where(hit, rows, 0)]
+
+        # fields without a match get nan (missing for integer columns)
+        if not hit.all():
+            if col_vals.dtype.kind in "iu":
+                col_vals = pd.arrays.IntegerArray(col_vals.astype("int64"), ~hit)
+            else:
+                col_vals = col_vals.astype("float64" if col_vals.dtype.kind in "bf" else object)
+                col_vals[~hit] = np.nan
+        lookup_vals[col] = col_vals
+
+    # return
+    return pd.DataFrame(lookup_vals, index=df.index)
+
+
+# rebuild indexed lookup table from key index
+def key_index_table(key_index, index_names):
+    '''
+    description:
+    rebuild an indexed lookup table from its key index (used when the
+    lookup tables are loaded from the lookup bundle)
+
+    parameters:
+        key_index (read-only dict): key index, see build_key_index function
+        index_names (list of str): names of the index columns
+
+    returns:
+        lookup_idx (pandas dataframe): lookup table indexed by its key columns
+    '''
+    # key codes of each table row (in table row order)
+    rows = np.asarray(key_index["rows"])
+    codes = np.nonzero(rows >= 0)
+    order = np.argsort(rows[codes])
+    keys = [level[code[order]] for level, code in zip(key_index["levels"], codes)]
+
+    # index
+    if len(keys) == 1:
+        index = pd.Index(keys[0], name=index_names[0])
+    else:
+        index = pd.MultiIndex.from_arrays(keys, names=index_names)
+
+    # return (numeric columns are views of the key index value arrays,
+    # not copies)
+    return pd.DataFrame(dict(key_index["values"]), index=index, copy=False)
+
+
+# %% ---- category functions ----
+# build category dictionaries
+def build_categories(tables):
+    '''
+    description:
+    build the category dictionary of each field key column (see
+    CATEGORY_KEYS) from the key values of all lookup tables
+
+    parameters:
+        tables (dict): indexed lookup tables keyed by lookup name
+
+    returns:
+        categories (read-only dict): sorted unique key values (pandas
+        index, no nan) keyed by field column
+    '''
+    categories = {}
+    for col, key_cols in CATEGORY_KEYS.items():
+        # key values of all lookup tables with one of the key columns
+        cat_vals = [
+            table.index.get_level_values(key_col)
+            for table in tables.values()
+            for key_col in key_cols
+            if key_col in table.index.names
+        ]
+        categories[col] = pd.Index(np.concatenate(cat_vals)).dropna().unique().sort_values()
+
+    # return
+    return types.MappingProxyType(categories)
+
+
+# encode field key columns as categoricals
+def encode_categories(lookups, df, cols=()):
+    '''
+    description:
+    encode the field key columns of df (see CATEGORY_KEYS) as pandas
+    categoricals with the category dictionaries of the lookup registry,
+    values that are not in a dictionary (e.g., a misspelled bmp name) are
+    added after its categories so no value is lost, columns that are not
+    all strings (e.g., lists of bmp names) are not encoded
+
+    parameters:
+        lookups (read-only dict): lookup registry, see load_lookups function
+        df (pandas dataframe): field data
+        cols (list of str): other string columns to encode, with
+        categories from the values in df (optional, default is none)
+
+    returns:
+        df_encoded (pandas dataframe): field data with the encoded columns
+    '''
+    encoded = {}
+    for col in list(lookups["categories"]) + list(cols):
+        # skip missing, encoded, and non-string columns
+        if col not in df.columns or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.infer_dtype(df[col], skipna=True) != "string":
+            continue
+
+        # unique values (one hash pass, missing values have code -1)
+        codes, uniques = pd.factorize(df[col])
+        uniques = pd.Index(uniques)
+
+        # categories (dictionary first, then values not in it)
+        if col in lookups["categories"]:
+            cat_dict = lookups["categories"][col]
+            cat_vals = cat_dict.append(uniques[cat_dict.get_indexer(uniques) < 0])
+        else:
+            cat_vals = uniques.sort_values()
+
+        # codes of the categories
+        cat_codes = np.append(cat_vals.get_indexer(uniques), -1)
+        encoded[col] = pd.Categorical.from_codes(cat_codes[codes], categories=cat_vals)
+
+    # return
+    return df.assign(**encoded) if encoded else df
+
+
+# %% ---- lookup bundle functions ----
+# lookup table version
+def lookup_version(lookup_path=LOOKUP_PATH):
+    '''
+    description:
+    get the version of the lookup tables, which is a hash of the contents
+    of all lookup csv files (and the bundle format), so it changes
+    whenever any lookup value changes
+
+    parameters:
+        lookup_path (str): path to the lookup table directory (optional,
+        default is data/lookups in this repository)
+
+    returns:
+        version (str): lookup table version (16 hex characters)
+    '''
+    # hash csv files
+    version_hash = hashlib.sha256(str(BUNDLE_FORMAT).encode())
+    for name, (file_name, index_cols, drop_cols) in sorted(LOOKUP_TABLES.items()):
+        version_hash.update(file_name.encode())
+        with open(os.path.join(lookup_path, file_name), "rb") as csv_file:
+            version_hash.update(csv_file.read())
+
+    # return
+    return version_hash.hexdigest()[:16]
+
+
+# save one bundle array
+def _save_array(bundle_path, file_name, vals):
+    '''
+    description:
+    save an array to the lookup bundle as a .npy file, text arrays are
+    saved as fixed-width unicode (so they can be memory-mapped) and the
+    positions of missing values are returned for the manifest
+
+    returns:
+        entry (dict): manifest entry with "file" and "na" (positions of
+        missing text values)
+    '''
+    # text arrays
+    na = []
+    if vals.dtype.kind not in "biuf":
+        is_na = pd.isna(vals)
+        na = np.flatnonzero(is_na).tolist()
+        vals = np.where(is_na, "", vals).astype(str)
+
+    # save
+    np.save(os.path.join(bundle_path, file_name), np.ascontiguousarray(vals), allow_pickle=False)
+
+    # return
+    return {"file": file_name, "na": na}
+
+
+# load one bundle array
+def _load_array(bundle_path, entry):
+    '''
+    description:
+    memory-map an array from the lookup bundle, text arrays are converted
+    back to objects with their missing values restored (so they are
+    private copies, numeric arrays stay memory-mapped)
+
+    returns:
+        vals (numpy array): array from the bundle
+    '''
+    # memory-map
+    vals = np.load(os.path.join(bundle_path, entry["file"]), mmap_mode="r", allow_pickle=False)
+
+    # text arrays
+    if vals.dtype.kind == "U":
+        vals = vals.astype(object)
+        vals[entry["na"]] = np.nan
+
+    # return
+    return vals
+
+
+# build lookup bundle
+def build_bundle(lookup_path=LOOKUP_PATH, bundle_path=BUNDLE_PATH):
+    '''
+    description:
+    compile all lookup table csv files into a typed binary lookup bundle:
+    one .npy file per key index array (see build_key_index) and a
+    manifest.json with the lookup version, the bundle is rebuilt from the
+    csv files (which stay the source of truth) whenever they change
+
+    parameters:
+        lookup_path (str): path to the lookup table directory (optional,
+        default is data/lookups in this repository)
+        bundle_path (str): path to the lookup bundle directory (optional,
+        default is data/lookups_bundle in this repository)
+
+    returns:
+        manifest (dict): lookup bundle manifest
+    '''
+    # read csv files
+    tables = read_lookup_tables(lookup_path)
+
+    # save key index arrays
+    os.makedirs(bundle_path, exist_ok=True)
+    manifest = {
+        "version": lookup_version(lookup_path),
+        "format": BUNDLE_FORMAT,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "tables": {},
+    }
+    for name in tables:
+        key_index = build_key_index(tables[name])
+        manifest["tables"][name] = {
+            "index_names": list(tables[name].index.names),
+            "levels": [
+                _save_array(bundle_path, name + "__level" + str(i) + ".npy", level.to_numpy())
+                for i, level in enumerate(key_index["levels"])
+            ],
+            "rows": _save_array(bundle_path, name + "__rows.npy", key_index["rows"]),
+            "values": {
+                col: _save_array(bundle_path, name + "__" + col + ".npy", vals)
+                for col, vals in key_index["values"].items()
+            },
+        }
+
+    # save manifest last (so a partly written bundle is never used)
+    manifest_tmp = os.path.join(bundle_path, "manifest.json.tmp")
+    with open(manifest_tmp, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_tmp, os.path.join(bundle_path, "manifest.json"))
+
+    # print
+    diagnostics.info("built lookup bundle (version " + manifest["version"] + ") in " + bundle_path)
+
+    # return
+    return manifest
+
+
+# read lookup bundle manifest
+def read_manifest(bundle_path=BUNDLE_PATH):
+    '''
+    description:
+    read the lookup bundle manifest
+
+    parameters:
+        bundle_path (str): path to the lookup bundle directory (optional,
+        default is data/lookups_bundle in this repository)
+
+    returns:
+        manifest (dict): lookup bundle manifest, or None if there is no
+        lookup bundle (or it has a different format)
+    '''
+    # no bundle
+    manifest_path = os.path.join(bundle_path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+
+    # read
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    # return
+    return manifest if manifest.get("format") == BUNDLE_FORMAT else None
+
+
+# read lookup bundle
+def read_bundle(bundle_path, manifest):
+    '''
+    description:
+    memory-map all key index arrays in the lookup bundle and rebuild the
+    indexed lookup tables from them, numeric arrays (including the
+    numeric table columns, which are views) are shared between processes
+    through the page cache, the table indexes, key dictionaries, and
+    text columns are private copies (small)
+
+    parameters:
+        bundle_path (str): path to the lookup bundle directory
+        manifest (dict): lookup bundle manifest, see read_manifest function
+
+    returns:
+        tables (dict): indexed lookup tables keyed by lookup name
+        key_indexes (dict): key indexes keyed by lookup name
+    '''
+    tables = {}
+    key_indexes = {}
+    for name, entry in manifest["tables"].items():
+        # key index
+        levels = [pd.Index(_load_array(bundle_path, level)) for level in entry["levels"]]
+        key_indexes[name] = types.MappingProxyType({
+            "levels": levels,
+            "rows": _load_array(bundle_path, entry["rows"]),
+            "values": {col: _load_array(bundle_path, vals) for col, vals in entry["values"].items()},
+        })
+
+        # indexed lookup table
+        tables[name] = key_index_table(key_indexes[name], entry["index_names"])
+
+    # return
+    return tables, key_indexes
@@ -0,0 +1,259 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-12-16
+# email: sheila.saia@tetratech.com
+
+# script name: plet_optimize.py
+
+# script description: this script contains the plet module bmp acreage
+# optimizer, which places a limited number of bmp acres (or a limited
+# bmp budget) on the fields of a farm to get the largest nitrogen,
+# phosphorus, and/or sediment load reduction
+
+# notes:
+# the practice change loads (p_run_n, p_run_p, p_run_s) are linear in
+# bmp_ac/area_ac for a given field and bmp, so the load reduction per
+# acre of each field and candidate bmp is found with two practice
+# change runs of all candidates (no bmp acres and all acres, see
+# run_plet_scenarios in main.py)
+# the load reduction of a field is its practice change load with no bmp
+# acres minus its practice change load with the allocated acres
+# each field gets at most one bmp (the bmps the fields already have are
+# not used), on up to all of its acres
+# the allocation is the greedy solution of the multiple choice knapsack
+# problem: the candidates of each field are reduced to their upper
+# convex hull (cost vs reduction), the hull steps of all fields are
+# taken in order of reduction per cost until the budget is used, and
+# the field at the budget limit gets the best single bmp it can afford
+# with the rest of the budget (on part of its acres), so the total
+# reduction is within one field of the linear programming optimum
+# runoff volume (p_run_v) is not linear in bmp_ac and is not optimized
+# for cropland the practice change nutrient loads are b_run_* times the
+# applied bmp efficiency (see calc_prac_run_nl in plet_functions.py), so
+# they go up with bmp acres and cropland gets no acres for n or p alone
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+import main as plet
+import plet_lookups
+
+
+# %% ---- optimizer settings ----
+# practice change load of each pollutant
+OPT_LOADS = {"n": "p_run_n", "p": "p_run_p", "s": "p_run_s"}
+
+# default objective (weight of each pollutant load reduction)
+DEFAULT_WEIGHTS = {"s": 1.0}
+
+
+# %% ---- optimizer functions ----
+# load reduction per acre of each candidate
+def candidate_rates(field_gdf_final, bmp_names=None, lookups=None):
+    '''
+    description:
+    get the load reduction per bmp acre of each field and candidate bmp
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf in
+        main.py
+        bmp_names (list of str): candidate bmps for every field
+        (optional, default is None, i.e., all bmps in the bmp efficiency
+        lookup table for the land use of each field)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+
+    returns:
+        cand_df (pandas dataframe): one row per field and candidate bmp
+        with field_pos (position of the field), bmp_name, and the load
+        reduction per acre of each pollutant (red_n, red_p, red_s)
+    '''
+    # practice change loads with no bmp acres and with all acres
+    area_ac = field_gdf_final["area_ac"].to_numpy(dtype="float64")
+    no_bmp = plet.run_plet_scenarios(field_gdf_final, bmp_names=bmp_names, bmp_ac=0, lookups=lookups)
+    all_bmp = plet.run_plet_scenarios(field_gdf_final, bmp_names=bmp_names, bmp_ac=area_ac, lookups=lookups)
+
+    # field position of each candidate (scenario rows are in field order)
+    field_pos = pd.Index(field_gdf_final.index).get_indexer(no_bmp["field"])
+    cand_area = area_ac[field_pos]
+
+    # reduction per acre (loads are linear in bmp_ac)
+    cand_cols = {"field_pos": field_pos, "bmp_name": no_bmp["bmp_name"].to_numpy(dtype=object)}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for pollutant, col in OPT_LOADS.items():
+            cand_cols["red_" + pollutant] = (no_bmp[col].to_numpy() - all_bmp[col].to_numpy()) / cand_area
+
+    # return
+    return pd.DataFrame(cand_cols)
+
+
+# upper convex hull steps of each field
+def hull_steps(field_pos, cost, value):
+    '''
+    description:
+    get the steps along the upper convex hull (cost vs value, starting
+    at no cost) of the candidates of each field, all fields at once
+
+    parameters:
+        field_pos (int array): field position of each candidate
+        cost (float array): cost of each candidate (all field acres)
+        value (float array): value of each candidate (all field acres)
+
+    returns:
+        steps (dict): int and float arrays with one value per step,
+        field_pos, cand (candidate of the step), prev (candidate before
+        the step, -1 for none), d_cost, d_value, and slope (d_value per
+        d_cost), steps of each field are in order of decreasing slope
+    '''
+    # current hull point of each field
+    n_fields = int(field_pos.max()) + 1 if len(field_pos) else 0
+    cur_cand = np.full(n_fields, -1)
+    cur_cost = np.zeros(n_fields)
+    cur_value = np.zeros(n_fields)
+
+    # add one hull step per field at a time (at most one per candidate)
+    steps = {col: [] for col in ["field_pos", "cand", "prev", "d_cost", "d_value", "slope"]}
+    active = (cost > 0) & (value > 0)
+    while active.any():
+        d_cost = cost - cur_cost[field_pos]
+        d_value = value - cur_value[field_pos]
+        active &= (d_cost > 0) & (d_value > 0)
+        if not active.any():
+            break
+
+        # steepest candidate of each field (farthest one if tied)
+        cand = np.flatnonzero(active)
+        slope = d_value[cand] / d_cost[cand]
+        cand = cand[np.lexsort((-cost[cand], -slope, field_pos[cand]))]
+        cand = cand[np.r_[True, field_pos[cand][1:] != field_pos[cand][:-1]]]
+
+        # add steps
+        step_fields = field_pos[cand]
+        steps["field_pos"].append(step_fields)
+        steps["cand"].append(cand)
+        steps["prev"].append(cur_cand[step_fields])
+        steps["d_cost"].append(d_cost[cand])
+        steps["d_value"].append(d_value[cand])
+        steps["slope"].append(d_value[cand] / d_cost[cand])
+
+        # move to the new hull points
+        cur_cand[step_fields] = cand
+        cur_cost[step_fields] = cost[cand]
+        cur_value[step_fields] = value[cand]
+        active[cand] = False
+
+    # return
+    return {col: np.concatenate(vals) if vals else np.array([], dtype="int64" if col in ["field_pos", "cand", "prev"] else "float64") for col, vals in steps.items()}
+
+
+# optimize bmp acres
+def run_bmp_optimizer(field_gdf_final, budget, bmp_names=None, bmp_cost=None, weights=None, lookups=None):
+    '''
+    description:
+    place bmp acres on the fields of a farm that were already run (see
+    run_plet_gdf in main.py) to get the largest weighted load reduction
+    for a limited number of bmp acres or a limited bmp budget
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        budget (float): total bmp acres, or total bmp cost if bmp_cost
+        is given
+        bmp_names (list of str): candidate bmps for every field
+        (optional, default is None, i.e., all bmps in the bmp efficiency
+        lookup table for the land use of each field)
+        bmp_cost (dict): cost per acre of each candidate bmp, e.g.,
+        {"cov_crop_1": 40, "grass_buffer_30ft": 250} (optional, default
+        is None, i.e., the budget is in acres)
+        weights (dict): weight of the load reduction of each pollutant
+        ("n" and "p" in lbs, "s" in tons), e.g., {"n": 1, "p": 10}
+        (optional, default is DEFAULT_WEIGHTS)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+
+    returns:
+        alloc_df (pandas dataframe): one row per field (same index as
+        field_gdf_final) with bmp_name (None for fields without bmp
+        acres), bmp_ac, bmp_cost (cost of the bmp acres, same as bmp_ac
+        if bmp_cost is not given), and the load reduction of each
+        pollutant (red_n, red_p, red_s)
+    '''
+    # defaults
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+
+    # check weights
+    unknown = [pollutant for pollutant in weights if pollutant not in OPT_LOADS]
+    if unknown:
+        raise ValueError("cannot optimize " + ", ".join(unknown) + " (weights must be for " + ", ".join(OPT_LOADS) + ")")
+
+    # load reduction per acre of each candidate
+    cand_df = candidate_rates(field_gdf_final, bmp_names=bmp_names, lookups=lookups)
+    field_pos = cand_df["field_pos"].to_numpy()
+    cand_bmps = cand_df["bmp_name"].to_numpy(dtype=object)
+    rates = {pollutant: np.nan_to_num(cand_df["red_" + pollutant].to_numpy()) for pollutant in OPT_LOADS}
+
+    # cost per acre of each candidate
+    if bmp_cost is None:
+        cost_ac = np.ones(len(cand_df))
+    else:
+        missing = sorted(set(cand_bmps) - set(bmp_cost))
+        if missing:
+            raise ValueError("no cost per acre for bmp(s) " + ", ".join(missing))
+        cost_ac = np.array([bmp_cost[bmp_name] for bmp_name in cand_bmps], dtype="float64")
+        if (cost_ac <= 0).any():
+            raise ValueError("bmp costs per acre must be more than 0")
+
+    # cost and value of each candidate on all field acres
+    area_ac = field_gdf_final["area_ac"].to_numpy(dtype="float64")
+    cand_area = np.nan_to_num(area_ac[field_pos])
+    value_ac = sum(weight * rates[pollutant] for pollutant, weight in weights.items())
+    cost = cost_ac * cand_area
+    value = value_ac * cand_area
+
+    # hull steps of all fields in order of value per cost
+    steps = hull_steps(field_pos, cost, value)
+    order = np.argsort(-steps["slope"], kind="stable")
+    cum_cost = np.cumsum(steps["d_cost"][order])
+    n_taken = int(np.searchsorted(cum_cost, budget, side="right"))
+
+    # candidate and acres of each field (steps of a field are taken in
+    # order, so its last taken step is its candidate)
+    field_cand = np.full(len(field_gdf_final), -1)
+    taken = order[:n_taken]
+    field_cand[steps["field_pos"][taken]] = steps["cand"][taken]
+    field_ac = np.where(field_cand >= 0, area_ac, 0.0)
+
+    # field at the budget limit (best single bmp for the rest of the
+    # budget plus the cost of its current candidate)
+    if n_taken < len(order):
+        limit_pos = steps["field_pos"][order[n_taken]]
+        limit_cand = np.flatnonzero(field_pos == limit_pos)
+        spent = cum_cost[n_taken - 1] if n_taken > 0 else 0.0
+        cur = field_cand[limit_pos]
+        limit_budget = budget - spent + (cost[cur] if cur >= 0 else 0.0)
+        limit_ac = np.minimum(cand_area[limit_cand], limit_budget / cost_ac[limit_cand])
+        best = np.argmax(value_ac[limit_cand] * limit_ac)
+        if value_ac[limit_cand][best] * limit_ac[best] > (value[cur] if cur >= 0 else 0.0):
+            field_cand[limit_pos] = limit_cand[best]
+            field_ac[limit_pos] = limit_ac[best]
+
+    # return
+    has_bmp = field_cand >= 0
+    cand = field_cand[has_bmp]
+    alloc_df = pd.DataFrame({"bmp_name": None, "bmp_ac": field_ac, "bmp_cost": 0.0}, index=field_gdf_final.index)
+    alloc_df["bmp_name"] = alloc_df["bmp_name"].astype(object)
+    alloc_df.loc[has_bmp, "bmp_name"] = cand_bmps[cand]
+    alloc_df.loc[has_bmp, "bmp_cost"] = cost_ac[cand] * field_ac[has_bmp]
+    for pollutant in OPT_LOADS:
+        alloc_df["red_" + pollutant] = 0.0
+        alloc_df.loc[has_bmp, "red_" + pollutant] = rates[pollutant][cand] * field_ac[has_bmp]
+    return alloc_df
@@ -0,0 +1,344 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-12-09
+# email: sheila.saia@tetratech.com
+
+# script name: plet_sensitivity.py
+
+# script description: this script contains the plet module global
+# sensitivity analysis, which finds the inputs (e.g., rainfall, cn
+# values, usle factors, bmp efficiencies) that drive the variation of
+# the results of each field, with sobol indices or morris elementary
+# effects
+
+# notes:
+# each input varies uniformly over a range relative to its value for
+# the field, i.e., value * (1 +/- spread), clipped to PARAM_BOUNDS in
+# plet_uncertainty.py
+# all sample rows of all fields in a chunk are run as one kernel pass,
+# see run_kernel in plet_engine.py, chunks can be run on a process pool
+# sobol indices use the saltelli sample design (n_base * (k + 2) kernel
+# runs per field for k inputs) with the saltelli (first order, s1) and
+# jansen (total, st) estimators
+# morris elementary effects use n_traj one-at-a-time trajectories
+# (n_traj * (k + 1) kernel runs per field), mu_star is the mean absolute
+# elementary effect and sigma is the standard deviation of the
+# elementary effects (effects are per unit of the input range)
+# sample rows where an output is nan (e.g., pc_n without a baseline) are
+# skipped, indices are nan for fields where the output is always nan or
+# does not vary
+
+# to do:
+
+
+# %% ---- load libraries ----
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+import main as plet
+import plet_engine as engine
+import plet_lookups
+import plet_uncertainty
+
+
+# %% ---- sensitivity settings ----
+# default inputs and their spread (fraction of the value of the field)
+DEFAULT_RANGES = {
+    "aa_rain": 0.2,
+    "r_cor": 0.2,
+    "rd_cor": 0.2,
+    "cn_value": 0.1,
+    "r_avg": 0.2,
+    "k_avg": 0.2,
+    "ls_avg": 0.3,
+    "c_avg": 0.3,
+    "p_avg": 0.2,
+    "eff_val_nitrogen": 0.25,
+    "eff_val_phosphorus": 0.25,
+    "eff_val_sediment": 0.25,
+}
+
+# default outputs
+SA_OUTPUTS = ["pc_n", "pc_p", "pc_s"]
+
+# number of field sample rows per kernel pass (about 100 MB)
+CHUNK_ROWS = 250000
+
+
+# %% ---- evaluation functions ----
+# run sample rows for a chunk of fields
+def evaluate_chunk(cols, unit_samples, ranges, outputs):
+    '''
+    description:
+    run the kernel for every sample row and field of a chunk in one pass
+    (top-level function so it can be run on a process pool)
+
+    parameters:
+        cols (dict): kernel inputs of the fields in the chunk, see
+        get_kernel_inputs in plet_engine.py
+        unit_samples (float array): (samples x inputs) array of values
+        from 0 to 1 (position of each input in its range)
+        ranges (dict): inputs and their spread, see DEFAULT_RANGES
+        outputs (list of str): kernel outputs to keep
+
+    returns:
+        chunk_out (dict): (fields x samples) array for each output
+    '''
+    # field inputs repeated for each sample row
+    n_fields = len(cols["area_ac"])
+    n_samples = len(unit_samples)
+    sample_cols = {col: np.repeat(vals, n_samples) for col, vals in cols.items() if col not in ranges}
+
+    # sampled inputs (value * (1 +/- spread), clipped)
+    for i, (col, spread) in enumerate(ranges.items()):
+        sample_vals = cols[col][:, None] * (1 + spread * (2 * unit_samples[None, :, i] - 1))
+        bounds = plet_uncertainty.PARAM_BOUNDS.get(col, (-np.inf, np.inf))
+        sample_cols[col] = np.clip(sample_vals.ravel(), *bounds)
+
+    # run all sample rows at once
+    sample_out = engine.run_kernel(sample_cols)
+
+    # return
+    return {col: sample_out[col].reshape(n_fields, n_samples) for col in outputs}
+
+
+# run sample rows for all fields
+def evaluate(cols, unit_samples, ranges, outputs, n_workers=1):
+    '''
+    description:
+    run the kernel for every sample row and field, in chunks of about
+    CHUNK_ROWS field sample rows (on a process pool if n_workers > 1)
+
+    parameters:
+        cols (dict): kernel inputs of the fields, see get_kernel_inputs
+        in plet_engine.py
+        unit_samples (float array): (samples x inputs) array of values
+        from 0 to 1
+        ranges (dict): inputs and their spread, see DEFAULT_RANGES
+        outputs (list of str): kernel outputs to keep
+        n_workers (int): number of processes (optional, default is 1,
+        i.e., no process pool)
+
+    returns:
+        sample_out (dict): (fields x samples) array for each output
+    '''
+    # chunks of fields
+    n_fields = len(cols["area_ac"])
+    chunk_fields = max(CHUNK_ROWS // len(unit_samples), 1)
+    chunks = [
+        {col: vals[start:start + chunk_fields] for col, vals in cols.items()}
+        for start in range(0, n_fields, chunk_fields)]
+
+    # run chunks
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            chunk_outs = list(executor.map(
+                evaluate_chunk, chunks, *zip(*[(unit_samples, ranges, outputs)] * len(chunks))))
+    else:
+        chunk_outs = [evaluate_chunk(chunk, unit_samples, ranges, outputs) for chunk in chunks]
+
+    # return
+    return {col: np.concatenate([chunk_out[col] for chunk_out in chunk_outs]) for col in outputs}
+
+
+# field kernel inputs
+def field_inputs(field_gdf_final, ranges, lookups=None):
+    '''
+    description:
+    get the kernel inputs of fields that were already run (see
+    run_plet_gdf in main.py) and check the inputs to vary
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        ranges (dict): inputs and their spread, see DEFAULT_RANGES
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+
+    returns:
+        cols (dict): kernel inputs, see get_kernel_inputs in
+        plet_engine.py
+    '''
+    # check inputs (only numeric kernel inputs can be varied)
+    unknown = [col for col in ranges if col not in engine.KERNEL_NUM_INPUTS]
+    if unknown:
+        raise ValueError("cannot vary " + ", ".join(unknown) + " (not a numeric kernel input, see plet_engine.py)")
+
+    # return
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+    return engine.get_kernel_inputs(field_gdf_final, plet.gather_bmps(lookups, field_gdf_final)[1])
+
+
+# index tables
+def index_tables(field_index, params, outputs, indices):
+    '''
+    description:
+    arrange (fields x inputs) index arrays as one table per output
+
+    parameters:
+        field_index (pandas index): index of the fields
+        params (list of str): inputs
+        outputs (list of str): outputs
+        indices (dict): {output: {index name: (fields x inputs) array}}
+
+    returns:
+        tables (dict): {output: pandas dataframe} with a (field, input)
+        row index and a column for each index
+    '''
+    # rows: each field and input
+    row_index = pd.MultiIndex.from_product([field_index, params], names=["field", "input"])
+
+    # return
+    return {
+        col: pd.DataFrame({name: vals.ravel() for name, vals in indices[col].items()}, index=row_index)
+        for col in outputs}
+
+
+# %% ---- sobol indices ----
+# sobol sensitivity indices
+def run_sobol(field_gdf_final, n_base=1024, ranges=None, outputs=None, seed=None, n_workers=1, lookups=None):
+    '''
+    description:
+    get first order (s1) and total (st) sobol sensitivity indices of
+    each input for each output and field, where s1 is the share of the
+    output variance from the input alone and st also includes its
+    interactions with the other inputs
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        n_base (int): number of base sample rows, each field is run
+        n_base * (k + 2) times for k inputs (optional, default is 1024)
+        ranges (dict): inputs and their spread (optional, default is
+        DEFAULT_RANGES)
+        outputs (list of str): kernel outputs (optional, default is
+        SA_OUTPUTS)
+        seed (int): random seed (optional, default is None)
+        n_workers (int): number of processes (optional, default is 1)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+
+    returns:
+        tables (dict): {output: pandas dataframe} with a (field, input)
+        row index and s1 and st columns (nan if the output does not vary)
+    '''
+    # defaults
+    ranges = DEFAULT_RANGES if ranges is None else ranges
+    outputs = SA_OUTPUTS if outputs is None else outputs
+    cols = field_inputs(field_gdf_final, ranges, lookups)
+    params = list(ranges)
+    k = len(params)
+
+    # saltelli sample design: a, b, and a with column i from b (ab_i)
+    rng = np.random.default_rng(seed)
+    a_samples = rng.random((n_base, k))
+    b_samples = rng.random((n_base, k))
+    ab_samples = np.repeat(a_samples[None, :, :], k, axis=0)
+    ab_samples[np.arange(k), :, np.arange(k)] = b_samples.T
+    unit_samples = np.concatenate([a_samples, b_samples, ab_samples.reshape(k * n_base, k)])
+
+    # run all sample rows
+    sample_out = evaluate(cols, unit_samples, ranges, outputs, n_workers)
+
+    # indices of each output
+    indices = {}
+    for col in outputs:
+        f_a = sample_out[col][:, :n_base]
+        f_b = sample_out[col][:, n_base:2 * n_base]
+        f_ab = sample_out[col][:, 2 * n_base:].reshape(-1, k, n_base)
+
+        # output mean and variance (nan if the output does not vary, the
+        # variance of a constant output can be a tiny rounding error)
+        with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+            warnings.simplefilter("ignore", RuntimeWarning)
+            f_ab_all = np.concatenate([f_a, f_b], axis=1)
+            f_mean = np.nanmean(f_ab_all, axis=1)[:, None]
+            f_var = np.nanvar(f_ab_all, axis=1)
+            varies = np.nanmax(f_ab_all, axis=1) > np.nanmin(f_ab_all, axis=1)
+            f_var = np.where(varies, f_var, np.nan)[:, None]
+
+            # first order (saltelli 2010, with f_b centered, which lowers
+            # the sampling error when the mean is large compared to the
+            # variance) and total (jansen 1999) indices
+            s1 = np.nanmean((f_b - f_mean)[:, None, :] * (f_ab - f_a[:, None, :]), axis=2) / f_var
+            st = 0.5 * np.nanmean((f_a[:, None, :] - f_ab)**2, axis=2) / f_var
+        indices[col] = {"s1": s1, "st": st}
+
+    # return
+    return index_tables(field_gdf_final.index, params, outputs, indices)
+
+
+# %% ---- morris elementary effects ----
+# morris elementary effects
+def run_morris(field_gdf_final, n_traj=100, n_levels=4, ranges=None, outputs=None, seed=None, n_workers=1, lookups=None):
+    '''
+    description:
+    get morris elementary effects of each input for each output and
+    field (a screening method that needs far fewer runs than sobol
+    indices), where mu_star ranks the inputs by influence and a large
+    sigma means the effect is nonlinear or depends on other inputs
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        n_traj (int): number of trajectories, each field is run
+        n_traj * (k + 1) times for k inputs (optional, default is 100)
+        n_levels (int): number of grid levels of each input (optional,
+        default is 4)
+        ranges (dict): inputs and their spread (optional, default is
+        DEFAULT_RANGES)
+        outputs (list of str): kernel outputs (optional, default is
+        SA_OUTPUTS)
+        seed (int): random seed (optional, default is None)
+        n_workers (int): number of processes (optional, default is 1)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+
+    returns:
+        tables (dict): {output: pandas dataframe} with a (field, input)
+        row index and mu_star, mu, and sigma columns
+    '''
+    # defaults
+    ranges = DEFAULT_RANGES if ranges is None else ranges
+    outputs = SA_OUTPUTS if outputs is None else outputs
+    cols = field_inputs(field_gdf_final, ranges, lookups)
+    params = list(ranges)
+    k = len(params)
+
+    # trajectories: random start on the grid, then one input at a time
+    # (in random order) moves up by delta
+    rng = np.random.default_rng(seed)
+    delta = n_levels / (2 * (n_levels - 1))
+    start_levels = rng.integers(0, n_levels // 2, (n_traj, k)) / (n_levels - 1)
+    order = np.argsort(rng.random((n_traj, k)), axis=1)
+    steps = np.zeros((n_traj, k + 1, k))
+    steps[np.arange(n_traj)[:, None], np.arange(1, k + 1)[None, :], order] = delta
+    traj_samples = start_levels[:, None, :] + np.cumsum(steps, axis=1)
+
+    # run all sample rows
+    sample_out = evaluate(cols, traj_samples.reshape(n_traj * (k + 1), k), ranges, outputs, n_workers)
+
+    # elementary effects of each output (in input order)
+    indices = {}
+    for col in outputs:
+        f_traj = sample_out[col].reshape(-1, n_traj, k + 1)
+        effects = np.empty((f_traj.shape[0], n_traj, k))
+        effects[:, np.arange(n_traj)[:, None], order] = np.diff(f_traj, axis=2) / delta
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+
+            # fields where the output does not vary get nan
+            effects[~(np.nanmax(sample_out[col], axis=1) > np.nanmin(sample_out[col], axis=1))] = np.nan
+            indices[col] = {
+                "mu_star": np.nanmean(np.abs(effects), axis=1),
+                "mu": np.nanmean(effects, axis=1),
+                "sigma": np.nanstd(effects, axis=1, ddof=1)}
+
+    # return
+    return index_tables(field_gdf_final.index, params, outputs, indices)
@@ -0,0 +1,271 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2024-12-02
+# email: sheila.saia@tetratech.com
+
+# script name: plet_uncertainty.py
+
+# script description: this script contains the plet module monte carlo
+# uncertainty engine, which samples lookup parameters (usle factors, cn
+# values, and bmp efficiencies) from distributions around their point
+# estimates and gives percentiles of the loads and load reductions of
+# each field
+
+# notes:
+# all draws of all fields in a chunk are run as one kernel pass on
+# (fields x draws) arrays, see run_kernel in plet_engine.py
+# fields are run in chunks of about CHUNK_ROWS field draws, so memory use
+# does not depend on the number of fields or draws
+# the baseline and practice change results of a draw use the same
+# sampled parameters, so load reductions are not widened by unrelated
+# baseline and practice change draws
+# distributions are relative to the point estimate of each field, i.e.,
+# (distribution, spread) where spread is:
+#   "normal" - standard deviation as a fraction of the point estimate
+#   "lognormal" - coefficient of variation (the mean is the point
+#   estimate)
+#   "uniform" - half width as a fraction of the point estimate
+#   "triangular" - half width as a fraction of the point estimate (mode
+#   is the point estimate)
+# sampled values are clipped to PARAM_BOUNDS
+# results for a seed are the same as long as chunk_rows is the same
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+import main as plet
+import plet_engine as engine
+import plet_lookups
+
+
+# %% ---- uncertainty settings ----
+# default parameter distributions: parameter: (distribution, spread)
+DEFAULT_DISTRIBUTIONS = {
+    "r_avg": ("lognormal", 0.2),
+    "k_avg": ("lognormal", 0.2),
+    "ls_avg": ("lognormal", 0.3),
+    "c_avg": ("lognormal", 0.3),
+    "p_avg": ("lognormal", 0.2),
+    "cn_value": ("normal", 0.05),
+    "eff_val_nitrogen": ("triangular", 0.25),
+    "eff_val_phosphorus": ("triangular", 0.25),
+    "eff_val_sediment": ("triangular", 0.25),
+}
+
+# allowed range of each parameter (sampled values are clipped)
+PARAM_BOUNDS = {
+    "aa_rain": (0, np.inf),
+    "r_cor": (0, np.inf),
+    "rd_cor": (0, np.inf),
+    "r_avg": (0, np.inf),
+    "k_avg": (0, np.inf),
+    "ls_avg": (0, np.inf),
+    "c_avg": (0, np.inf),
+    "p_avg": (0, np.inf),
+    "cn_value": (1, 100),
+    "eff_val_nitrogen": (0, 1),
+    "eff_val_phosphorus": (0, 1),
+    "eff_val_sediment": (0, 1),
+}
+
+# default result columns and percentiles
+MC_OUTPUTS = [
+    "b_run_v", "b_run_n", "b_run_p", "b_run_s",
+    "p_run_v", "p_run_n", "p_run_p", "p_run_s",
+    "pc_v", "pc_n", "pc_p", "pc_s",
+]
+MC_PERCENTILES = [5, 50, 95]
+
+# number of field draws per kernel pass (about 100 MB)
+CHUNK_ROWS = 250000
+
+
+# %% ---- sampling functions ----
+# sample a parameter
+def sample_param(point, distribution, spread, n_draws, rng):
+    '''
+    description:
+    sample n_draws values of a parameter around the point estimate of
+    each field
+
+    parameters:
+        point (float array): point estimate of each field
+        distribution (str): "normal", "lognormal", "uniform", or
+        "triangular"
+        spread (float): spread of the distribution relative to the point
+        estimate, see notes in the header
+        n_draws (int): number of draws per field
+        rng (numpy generator): random number generator
+
+    returns:
+        draws (float array): sampled values, n_draws in a row for each
+        field, i.e., (fields x draws) flattened
+    '''
+    # point estimate of each draw
+    size = (len(point), n_draws)
+    point = point[:, None]
+
+    # sample relative to the point estimate
+    if distribution == "normal":
+        draws = point * (1 + spread * rng.standard_normal(size))
+    elif distribution == "lognormal":
+        sigma = np.sqrt(np.log(1 + spread**2))
+        draws = point * np.exp(sigma * rng.standard_normal(size) - sigma**2 / 2)
+    elif distribution == "uniform":
+        draws = point * (1 + spread * rng.uniform(-1, 1, size))
+    elif distribution == "triangular":
+        draws = point * (1 + spread * rng.triangular(-1, 0, 1, size))
+    else:
+        raise ValueError("distribution must be normal, lognormal, uniform, or triangular, not " + str(distribution))
+
+    # return
+    return draws.ravel()
+
+
+# percentiles of each row
+def row_percentiles(draws, percentiles):
+    '''
+    description:
+    get percentiles of each row of a (fields x draws) array, skipping
+    nan draws, with the same linear interpolation as np.nanpercentile
+    (which loops over rows when there are nan values)
+
+    parameters:
+        draws (float array): (fields x draws) array
+        percentiles (list of float): percentiles (0 to 100)
+
+    returns:
+        pcts (float array): (fields x percentiles) array, nan for fields
+        without any draws that are not nan
+    '''
+    # sort each row (nan values go to the end)
+    draws = np.sort(draws, axis=1)
+    n_valid = (~np.isnan(draws)).sum(axis=1)
+
+    # position of each percentile in the valid draws of each row
+    pos = (np.asarray(percentiles, dtype="float64")[None, :] / 100) * (np.maximum(n_valid, 1) - 1)[:, None]
+    lo = np.floor(pos).astype("int64")
+    hi = np.minimum(lo + 1, np.maximum(n_valid, 1)[:, None] - 1)
+
+    # interpolate between the draws on either side
+    lo_vals = np.take_along_axis(draws, lo, axis=1)
+    hi_vals = np.take_along_axis(draws, hi, axis=1)
+    pcts = lo_vals + (hi_vals - lo_vals) * (pos - lo)
+    pcts[n_valid == 0] = np.nan
+
+    # return
+    return pcts
+
+
+# %% ---- monte carlo functions ----
+# run monte carlo draws for a chunk of fields
+def run_chunk(cols, n_draws, distributions, outputs, percentiles, rng):
+    '''
+    description:
+    run n_draws sampled parameter sets for each field of a chunk in one
+    kernel pass and get the percentiles of each output
+
+    parameters:
+        cols (dict): kernel inputs of the fields in the chunk, see
+        get_kernel_inputs in plet_engine.py
+        n_draws (int): number of draws per field
+        distributions (dict): parameter distributions, see
+        DEFAULT_DISTRIBUTIONS
+        outputs (list of str): kernel outputs to summarize
+        percentiles (list of float): percentiles (0 to 100)
+        rng (numpy generator): random number generator
+
+    returns:
+        chunk_pcts (dict): (fields x percentiles) array for each output
+    '''
+    # field inputs repeated for each draw
+    n_fields = len(cols["area_ac"])
+    draw_cols = {col: np.repeat(vals, n_draws) for col, vals in cols.items() if col not in distributions}
+
+    # sampled parameters
+    for col, (distribution, spread) in distributions.items():
+        draws = sample_param(cols[col], distribution, spread, n_draws, rng)
+        draw_cols[col] = np.clip(draws, *PARAM_BOUNDS.get(col, (-np.inf, np.inf)))
+
+    # run all draws at once
+    draw_out = engine.run_kernel(draw_cols)
+
+    # percentiles of each field (nan draws are skipped)
+    chunk_pcts = {}
+    for col in outputs:
+        chunk_pcts[col] = row_percentiles(draw_out[col].reshape(n_fields, n_draws), percentiles)
+
+    # return
+    return chunk_pcts
+
+
+# run monte carlo
+def run_monte_carlo(field_gdf_final, n_draws=1000, distributions=None, outputs=None, percentiles=None, seed=None, chunk_rows=CHUNK_ROWS, lookups=None):
+    '''
+    description:
+    get uncertainty ranges of the plet module results of fields that
+    were already run (see run_plet_gdf in main.py) by sampling the lookup
+    parameters n_draws times for each field and running all draws of a
+    chunk of fields at once
+
+    parameters:
+        field_gdf_final (geopandas geodataframe): field data with all
+        lookup and plet module columns appended, see run_plet_gdf
+        n_draws (int): number of draws per field (optional, default is
+        1000)
+        distributions (dict): parameter distributions, parameters that
+        are not given keep their point estimate (optional, default is
+        DEFAULT_DISTRIBUTIONS)
+        outputs (list of str): kernel outputs to summarize (optional,
+        default is MC_OUTPUTS)
+        percentiles (list of float): percentiles, 0 to 100 (optional,
+        default is MC_PERCENTILES)
+        seed (int): random seed (optional, default is None)
+        chunk_rows (int): number of field draws per kernel pass
+        (optional, default is CHUNK_ROWS)
+        lookups (read-only dict): lookup registry (optional, default is
+        the process-wide registry, see plet_lookups.py)
+
+    returns:
+        mc_df (pandas dataframe): one row per field (same index as
+        field_gdf_final) with a column for each output and percentile,
+        e.g., pc_n_p5, pc_n_p50, pc_n_p95
+    '''
+    # defaults
+    distributions = DEFAULT_DISTRIBUTIONS if distributions is None else distributions
+    outputs = MC_OUTPUTS if outputs is None else outputs
+    percentiles = MC_PERCENTILES if percentiles is None else percentiles
+    if lookups is None:
+        lookups = plet_lookups.get_lookups()
+    rng = np.random.default_rng(seed)
+
+    # check parameters (only numeric kernel inputs can be sampled)
+    unknown = [col for col in distributions if col not in engine.KERNEL_NUM_INPUTS]
+    if unknown:
+        raise ValueError("cannot sample " + ", ".join(unknown) + " (not a numeric kernel input, see plet_engine.py)")
+
+    # field kernel inputs
+    cols = engine.get_kernel_inputs(field_gdf_final, plet.gather_bmps(lookups, field_gdf_final)[1])
+
+    # run chunks of fields
+    n_fields = len(field_gdf_final)
+    chunk_fields = max(chunk_rows // n_draws, 1)
+    mc_pcts = {col: np.full((n_fields, len(percentiles)), np.nan) for col in outputs}
+    for start in range(0, n_fields, chunk_fields):
+        chunk_cols = {col: vals[start:start + chunk_fields] for col, vals in cols.items()}
+        chunk_pcts = run_chunk(chunk_cols, n_draws, distributions, outputs, percentiles, rng)
+        for col in outputs:
+            mc_pcts[col][start:start + chunk_fields] = chunk_pcts[col]
+
+    # return
+    mc_cols = {}
+    for col in outputs:
+        for i, pct in enumerate(percentiles):
+            mc_cols[col + "_p" + format(pct, "g")] = mc_pcts[col][:, i]
+    return pd.DataFrame(mc_cols, index=field_gdf_final.index)
@@ -0,0 +1,115 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: conftest.py
+
+# script description: this script contains the shared pytest settings
+# and synthetic field data for the plet module tests
+
+# notes:
+# run all tests from the repository folder with: python -m pytest tests
+# synthetic fields use the testing lookup tables (fips 17113, see
+# BMP_EFF_LOOKUP and USLE_LOOKUP in main.py), with some fields that are
+# not in the lookup tables so the nan paths are tested too
+
+# to do:
+
+
+# %% ---- load libraries ----
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+# repository folder (plet module scripts are not a package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# custom plet functions
+import plet_lookups
+
+
+# %% ---- synthetic data settings ----
+# land uses, hsgs, and bmps of the synthetic fields (some are not in the
+# testing lookup tables)
+FIELD_LUS = ["cropland", "pastureland", "forest"]
+FIELD_HSGS = ["a", "b", "c", "d", "b/d"]
+FIELD_BMPS = ["forest_buffer_100ft", "forest_buffer_35ft", "cons_till_2", "cov_crop_2", "grass_buffer_35ft", "bioreactor"]
+
+
+# %% ---- synthetic data functions ----
+# synthetic field properties
+def make_properties(n, seed=0):
+    '''
+    description:
+    make the properties of n synthetic fields (plain python values, as
+    in a geojson request)
+
+    parameters:
+        n (int): number of fields
+        seed (int): random seed (optional, default is 0)
+
+    returns:
+        properties (list of dict): properties of each field
+    '''
+    rng = np.random.default_rng(seed)
+    properties = []
+    for i in range(n):
+        area_ac = float(rng.uniform(1, 800))
+        properties.append({
+            "field_id": "field_" + str(i),
+            "user_lu": str(rng.choice(FIELD_LUS, p=[0.6, 0.35, 0.05])),
+            "n_months": int(rng.integers(0, 12)),
+            "n_animals": int(rng.integers(0, 400)),
+            "bmp_name": str(rng.choice(FIELD_BMPS)),
+            "bmp_ac": area_ac * float(rng.uniform(0, 1)),
+            "aa_rain": float(rng.uniform(20, 60)),
+            "r_cor": float(rng.uniform(0.5, 1)),
+            "rd_cor": float(rng.uniform(0.3, 0.7)),
+            "rain_days": float(rng.uniform(60, 130)),
+            "hsg": str(rng.choice(FIELD_HSGS)),
+            "state": "Illinois",
+            "county": "McLean",
+            "fips": 17113 if rng.random() < 0.9 else 17001,
+            "area_ac": area_ac,
+        })
+
+    # return
+    return properties
+
+
+# synthetic geojson features
+def make_features(n, seed=0):
+    '''
+    description:
+    make n synthetic geojson features (points in EPSG:5070)
+    '''
+    return [
+        {"type": "Feature", "properties": props, "geometry": {"type": "Point", "coordinates": [float(i), float(i)]}}
+        for i, props in enumerate(make_properties(n, seed))
+    ]
+
+
+# synthetic field geodataframe
+def make_fields(n, seed=0):
+    '''
+    description:
+    make a geodataframe of n synthetic fields (one row per field)
+    '''
+    return gpd.GeoDataFrame(
+        make_properties(n, seed),
+        geometry=[Point(i, i) for i in range(n)],
+        crs="EPSG:5070",
+    )
+
+
+# %% ---- fixtures ----
+# lookup registry (loaded once for all tests)
+@pytest.fixture(scope="session")
+def lookups():
+    return plet_lookups.get_lookups()
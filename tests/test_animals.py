@@ -0,0 +1,73 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_animals.py
+
+# script description: this script tests the animal weight and intensity
+# calculations (gather_animals in main.py and calc_animal_stats in
+# plet_functions.py)
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+import main as plet
+import plet_diagnostics
+import plet_functions
+from conftest import make_fields
+
+
+# %% ---- tests ----
+def test_animal_intensity_classes():
+    # beef cattle (1000 lbs each) on 100 acres, 1.5 and 2.5 aeu are the
+    # class limits
+    gdf = pd.DataFrame({"n_animals": [0, 100, 150, 200, 250, 400], "area_ac": 100.0})
+    gdf = plet_functions.calc_animal_stats(gdf)
+    assert list(gdf["animal_inten"]) == ["low", "low", "low", "medium", "high", "high"]
+
+
+def test_animal_intensity_out_of_range():
+    # nan and negative aeu
+    diag = plet_diagnostics.new_diagnostics()
+    gdf = pd.DataFrame({"n_animals": [np.nan, -10, 10], "area_ac": 100.0})
+    gdf = plet_functions.calc_animal_stats(gdf, diag=diag)
+    assert gdf["animal_inten"].isna().tolist() == [True, True, False]
+    assert diag["animal_inten"] == {"out_of_range": 2}
+
+
+def test_mixed_animal_types_are_added_up(lookups):
+    field_df = pd.DataFrame({
+        "animal_type": [["beef_cattle", "hog"], "dairy_cattle", None, ["sheep", "chicken", "horse"]],
+        "n_animals": [[10, 50], 5, 3, [20, 100, 2]]})
+    animal_vals, no_wt = plet.gather_animals(lookups, field_df)
+
+    # hand calculated weights (see data/lookups/animal_wts.csv)
+    expected = [10 * 1000 + 50 * 200, 5 * 1400, 3 * 1000, 20 * 100 + 100 * 4 + 2 * 1000]
+    assert animal_vals["animal_lbs"].tolist() == expected
+    assert not no_wt.any()
+
+
+def test_unknown_animal_type_is_counted_once(lookups):
+    field_gdf = make_fields(4, seed=12)
+    field_gdf["animal_type"] = [["beef_cattle", "llama"], "hog", "beef_cattle", None]
+    field_gdf["n_animals"] = [[10, 5], 50, 10, 10]
+
+    # weight is nan for the field with an unknown animal type
+    animal_vals, no_wt = plet.gather_animals(lookups, field_gdf)
+    assert np.isnan(animal_vals["animal_lbs"].iloc[0])
+    assert no_wt.tolist() == [True, False, False, False]
+
+    # intensity is nan and the field is only counted as unsupported
+    diag = plet_diagnostics.new_diagnostics()
+    field_gdf_final = plet.run_plet_gdf(field_gdf, lookups=lookups, diag=diag)
+    assert field_gdf_final["animal_inten"].isna().tolist() == [True, False, False, False]
+    assert diag["animal_inten"] == {"unsupported_animal_type": 1}
@@ -0,0 +1,100 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_app.py
+
+# script description: this script tests the plet module flask app
+# (app.py) responses
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import json
+
+import geopandas as gpd
+import pytest
+
+# custom plet functions
+import app as plet_app
+import main as plet
+import plet_cache
+from conftest import make_features
+
+
+# %% ---- fixtures ----
+# flask test client (with or without the memory cache, no disk cache)
+@pytest.fixture(params=[False, True], ids=["no_cache", "cache"])
+def client(request, monkeypatch):
+    monkeypatch.setattr(plet_cache, "CACHE_ENABLED", request.param)
+    monkeypatch.setattr(plet_cache, "CACHE_DISK_BYTES", 0)
+    plet_cache.clear()
+    yield plet_app.app.test_client()
+    plet_cache.clear()
+
+
+# %% ---- tests ----
+def test_result_matches_to_json(client, lookups):
+    # fields with a lookup miss, a missing input, and more than one bmp
+    features = make_features(30, seed=9)
+    features[1]["properties"]["hsg"] = None
+    features[2]["properties"].update({"bmp_name": ["cons_till_2", "cov_crop_2"], "bmp_ac": [1.0, 2.0]})
+    request_json = {"type": "FeatureCollection", "features": features}
+
+    # geopandas to_json of the same run (the original response)
+    field_gdf_final = plet.run_plet_gdf(gpd.GeoDataFrame.from_features(features), lookups=lookups)
+    expected = json.loads(field_gdf_final.to_json())
+
+    # response (twice, so the second one is from the cache if it is on)
+    for _ in range(2):
+        response = client.post("/result", json=request_json)
+        assert response.status_code == 200
+        assert response.mimetype == "application/json"
+        assert json.loads(response.data) == expected
+
+
+@pytest.mark.parametrize("body", [None, {}, {"features": []}, {"features": [{"properties": {"field_id": "a"}}]}])
+def test_job_without_field_inputs_is_rejected(body, monkeypatch):
+    # nothing is queued
+    monkeypatch.setattr(plet_app.plet_jobs, "submit_job", lambda *args, **kwargs: pytest.fail("job was queued"))
+    client = plet_app.app.test_client()
+    response = client.post("/jobs", data=json.dumps(body), content_type="application/json")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_failed_collection_error_is_logged_not_returned(monkeypatch):
+    # every run fails with an internal error
+    def fail_run(*args, **kwargs):
+        raise RuntimeError("internal details")
+    monkeypatch.setattr(plet, "run_plet_gdf", fail_run)
+
+    # log events (the plet logger does not propagate)
+    events = []
+    monkeypatch.setattr(plet.plet_logging, "log_event", lambda stage, **fields: events.append((stage, fields)))
+
+    # each collection gets a generic error
+    collections = [{"id": "a", "features": make_features(3, seed=1)}, {"id": "b", "features": make_features(3, seed=2)}]
+    response = plet_app.app.test_client().post("/result/batch", json={"collections": collections})
+    assert response.status_code == 200
+    for res in response.get_json()["collections"]:
+        assert res["status"] == "error"
+        assert "internal details" not in res["error"]
+        assert "RuntimeError" not in res["error"]
+
+    # shared pass and each collection are logged with the exception
+    stages = [stage for stage, fields in events if fields.get("exc_info")]
+    assert stages == ["shared_pass_failed", "collection_failed", "collection_failed"]
+
+
+@pytest.mark.parametrize("body", [None, {"features": [{"properties": {"field_id": "a"}}]}])
+def test_scenarios_without_field_inputs_is_rejected(body):
+    response = plet_app.app.test_client().post("/result/scenarios", data=json.dumps(body), content_type="application/json")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    assert response.headers["X-Request-ID"]
@@ -0,0 +1,109 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_bmps.py
+
+# script description: this script tests how the bmps of fields with more
+# than one bmp are combined (gather_bmps in main.py and combine_bmps in
+# plet_engine.py)
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+
+# custom plet functions
+import main as plet
+import plet_engine as engine
+from conftest import make_fields
+
+
+# %% ---- helper functions ----
+# bmp inputs of each bmp (nan is a missing efficiency value)
+def make_bmp_cols(bmp_ac, eff_n, eff_p, eff_s, eff_q, bmp_cc):
+    return {
+        "bmp_ac": np.array(bmp_ac, dtype="float64"),
+        "bmp_cc": np.array(bmp_cc, dtype="int8"),
+        "eff_val_nitrogen": np.array(eff_n, dtype="float64"),
+        "eff_val_phosphorus": np.array(eff_p, dtype="float64"),
+        "eff_val_sediment": np.array(eff_s, dtype="float64"),
+        "eff_val_quantity": np.array(eff_q, dtype="float64"),
+    }
+
+
+# %% ---- tests ----
+def test_bmps_are_combined_in_series():
+    # field 0 has three bmps, field 1 has one
+    area_ac = np.array([100.0, 50.0])
+    starts = np.array([0, 3, 4])
+    bmp_cols = make_bmp_cols(
+        bmp_ac=[10.0, 20.0, 40.0, 5.0],
+        eff_n=[0.5, 0.3, 0.2, 0.4],
+        eff_p=[0.6, np.nan, 0.1, 0.4],
+        eff_s=[np.nan, np.nan, np.nan, 0.4],
+        eff_q=[0, 0, 0, 1],
+        bmp_cc=[0, 0, 0, 1])
+    field_bmp_cols = engine.combine_bmps(starts, area_ac, bmp_cols)
+
+    # 1 - prod(1 - eff * bmp_ac / area_ac), bmps without an efficiency
+    # value are skipped (nan if no bmp has one)
+    assert field_bmp_cols["eff_val_nitrogen"][0] == 1 - (1 - 0.5 * 0.1) * (1 - 0.3 * 0.2) * (1 - 0.2 * 0.4)
+    assert field_bmp_cols["eff_val_phosphorus"][0] == 1 - (1 - 0.6 * 0.1) * (1 - 0.1 * 0.4)
+    assert np.isnan(field_bmp_cols["eff_val_sediment"][0])
+    assert field_bmp_cols["bmp_ac"][0] == 100.0
+
+    # field with one bmp keeps its inputs
+    for col in engine.KERNEL_BMP_INPUTS:
+        assert field_bmp_cols[col][1] == bmp_cols[col][3], col
+
+
+def test_any_bmp_gives_quantity_and_cover_crop():
+    # two fields with two bmps (only one bmp of the first has them)
+    area_ac = np.array([100.0, 100.0])
+    starts = np.array([0, 2, 4])
+    bmp_cols = make_bmp_cols(
+        bmp_ac=[10.0, 10.0, 10.0, 10.0],
+        eff_n=[0.1, 0.1, 0.1, 0.1],
+        eff_p=[0.1, 0.1, 0.1, 0.1],
+        eff_s=[0.1, 0.1, 0.1, 0.1],
+        eff_q=[0, 1, 0, 0],
+        bmp_cc=[1, 0, 0, 0])
+    field_bmp_cols = engine.combine_bmps(starts, area_ac, bmp_cols)
+    assert list(field_bmp_cols["eff_val_quantity"]) == [1.0, 0.0]
+    assert list(field_bmp_cols["bmp_cc"]) == [1, 0]
+
+
+def test_one_bmp_list_matches_scalar_bmp(lookups):
+    field_gdf = make_fields(50, seed=11)
+    list_gdf = field_gdf.copy()
+    list_gdf["bmp_name"] = [[bmp_name] for bmp_name in field_gdf["bmp_name"]]
+    list_gdf["bmp_ac"] = [[bmp_ac] for bmp_ac in field_gdf["bmp_ac"]]
+
+    # all fields with one bmp lists, and with another field that has two
+    # bmps (so the bmps are combined)
+    two_gdf = list_gdf.copy()
+    bmp_name = list(two_gdf["bmp_name"])
+    bmp_name[49] = ["cons_till_2", "cov_crop_2"]
+    bmp_ac = list(two_gdf["bmp_ac"])
+    bmp_ac[49] = [1.0, 2.0]
+    two_gdf["bmp_name"] = bmp_name
+    two_gdf["bmp_ac"] = bmp_ac
+    for bmp_gdf in [list_gdf, two_gdf]:
+        scalar_cols = plet.gather_bmps(lookups, field_gdf)[1]
+        list_cols = plet.gather_bmps(lookups, bmp_gdf)[1]
+        for col in engine.KERNEL_BMP_INPUTS:
+            assert np.array_equal(list_cols[col][:49], scalar_cols[col][:49], equal_nan=True), col
+
+    # same results (bit for bit)
+    scalar_gdf_final = plet.run_plet_gdf(field_gdf, lookups=lookups)
+    list_gdf_final = plet.run_plet_gdf(list_gdf, lookups=lookups)
+    for col in engine.KERNEL_OUTPUTS:
+        assert np.array_equal(
+            list_gdf_final[col].to_numpy(dtype="float64"), scalar_gdf_final[col].to_numpy(dtype="float64"),
+            equal_nan=True), col
@@ -0,0 +1,82 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_cache.py
+
+# script description: this script tests that the plet module result
+# cache (plet_cache.py) gives the same results as an uncached run
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import geopandas as gpd
+import pytest
+
+# custom plet functions
+import main as plet
+import plet_cache
+import plet_geojson
+from conftest import make_features
+
+
+# %% ---- fixtures ----
+# empty memory tier and no disk tier
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(plet_cache, "CACHE_DISK_BYTES", 0)
+    plet_cache.clear()
+    yield
+    plet_cache.clear()
+
+
+# %% ---- tests ----
+# uncached result of features
+def uncached_json(features, lookups):
+    field_gdf_final = plet.run_plet_gdf(gpd.GeoDataFrame.from_features(features), lookups=lookups)
+    return plet_geojson.to_geojson(field_gdf_final)
+
+
+def test_cache_hit_equals_uncached_run(lookups):
+    # feature 0 with a field that has an extra property, float inputs,
+    # and no lookup match (so its batch has nan and float columns)
+    features = make_features(2, seed=1)
+    features[1]["properties"].update({"extra_col": "x", "n_months": 2.5, "hsg": None, "bmp_name": ["cons_till_2", "cov_crop_2"], "bmp_ac": [1.0, 2.0]})
+    solo_json = uncached_json(features[:1], lookups)
+
+    # cache feature 0 in a batch, then get it on its own
+    batch_json, n_cached = plet_cache.run_plet_cached(features, lookups=lookups)
+    assert n_cached == 0
+    cached_json, n_cached = plet_cache.run_plet_cached(features[:1], lookups=lookups)
+    assert n_cached == 1
+    assert cached_json == solo_json
+
+
+def test_cache_hits_equal_uncached_runs(lookups):
+    # every field of a batch is the same from the cache as on its own
+    features = make_features(40, seed=2)
+    plet_cache.run_plet_cached(features, lookups=lookups)
+    for feature in features:
+        cached_json, n_cached = plet_cache.run_plet_cached([feature], lookups=lookups)
+        assert n_cached == 1
+        assert cached_json == uncached_json([feature], lookups)
+
+
+
+def test_cache_key_depends_on_epsg(lookups):
+    # the same feature with another crs is not a cache hit
+    features = make_features(1, seed=3)
+    plet_cache.run_plet_cached(features, gdf_epsg="EPSG:5070", lookups=lookups)
+    _, n_cached = plet_cache.run_plet_cached(features, gdf_epsg="EPSG:4326", lookups=lookups)
+    assert n_cached == 0
+    _, n_cached = plet_cache.run_plet_cached(features, gdf_epsg="EPSG:5070", lookups=lookups)
+    assert n_cached == 1
+
+
+def test_code_version_includes_lookups():
+    assert "plet_lookups.py" in plet_cache.CODE_FILES
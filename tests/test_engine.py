@@ -0,0 +1,62 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_engine.py
+
+# script description: this script tests the columnar plet module engine
+# (plet_engine.py) against the step-by-step functions in
+# plet_functions.py
+
+# notes:
+# results are compared with a relative tolerance of 1e-14 (the kernel
+# uses numpy power, which can differ from the step-by-step functions in
+# the last bit)
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pytest
+
+# custom plet functions
+import main as plet
+import plet_diagnostics
+import plet_engine as engine
+import plet_functions
+from conftest import make_fields
+
+
+# %% ---- test settings ----
+# step-by-step functions in run order (with diagnostics or not)
+BASE_FUNCTIONS = ["calc_p", "calc_s", "calc_q", "calc_base_run_v", "calc_base_run_nl", "calc_e", "calc_base_run_sl"]
+PRAC_FUNCTIONS = ["calc_prac_run_v", "calc_prac_sed_nl", "calc_prac_run_nl", "calc_prac_run_sl", "calc_perc_change"]
+GW_BASE_FUNCTIONS = ["calc_base_gw_v"]
+GW_PRAC_FUNCTIONS = ["calc_base_gw_nl"]
+
+
+# %% ---- tests ----
+@pytest.mark.parametrize("groundwater", [False, True])
+def test_kernel_matches_calc_functions(lookups, groundwater):
+    # kernel (with lookups from run_plet_gdf)
+    kernel_diag = plet_diagnostics.new_diagnostics()
+    field_gdf_final = plet.run_plet_gdf(make_fields(300, seed=5), lookups=lookups, diag=kernel_diag, groundwater=groundwater)
+    out_cols = engine.KERNEL_OUTPUTS + (engine.KERNEL_GW_OUTPUTS if groundwater else [])
+
+    # step-by-step functions on the same inputs
+    calc_diag = plet_diagnostics.new_diagnostics()
+    calc_gdf = field_gdf_final.drop(columns=out_cols)
+    for func in BASE_FUNCTIONS + (GW_BASE_FUNCTIONS if groundwater else []):
+        calc_gdf = getattr(plet_functions, func)(calc_gdf)
+    for func in PRAC_FUNCTIONS + (GW_PRAC_FUNCTIONS if groundwater else []):
+        calc_gdf = getattr(plet_functions, func)(calc_gdf, diag=calc_diag)
+
+    # same results (to the last bits) and conditions
+    for col in out_cols:
+        np.testing.assert_allclose(
+            field_gdf_final[col].to_numpy(dtype="float64"), calc_gdf[col].to_numpy(dtype="float64"),
+            rtol=1e-14, err_msg=col)
+    assert {col: kernel_diag[col] for col in calc_diag} == calc_diag
@@ -0,0 +1,47 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_gradients.py
+
+# script description: this script tests the derivatives of the plet
+# module kernel results (run_kernel_grad in plet_engine.py) against
+# central differences
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+
+# custom plet functions
+import main as plet
+import plet_engine as engine
+from conftest import make_fields
+
+
+# %% ---- tests ----
+def test_gradients_match_central_differences(lookups):
+    field_gdf_final = plet.run_plet_gdf(make_fields(200, seed=8), lookups=lookups)
+    cols = engine.get_kernel_inputs(field_gdf_final, plet.gather_bmps(lookups, field_gdf_final)[1])
+    out, grad = engine.run_kernel_grad(cols)
+
+    # percent changes are rounded to 0.1, so they are not checked
+    grad_cols = [col for col in engine.GRAD_OUTPUTS if not col.startswith("pc_")]
+    for i, col in enumerate(engine.GRAD_INPUTS):
+        # central differences (step relative to each input)
+        step = 1e-6 * np.maximum(np.abs(np.nan_to_num(cols[col])), 1.0)
+        up_cols = dict(cols)
+        up_cols[col] = cols[col] + step
+        down_cols = dict(cols)
+        down_cols[col] = cols[col] - step
+        up_out = engine.run_kernel(up_cols)
+        down_out = engine.run_kernel(down_cols)
+        for out_col in grad_cols:
+            diff = (up_out[out_col] - down_out[out_col]) / (2 * step)
+            scale = np.abs(out[out_col]) / np.maximum(np.abs(np.nan_to_num(cols[col])), 1.0)
+            np.testing.assert_allclose(grad[out_col][i], diff, rtol=1e-4, atol=1e-6 * np.nanmax(scale), err_msg=out_col + " / " + col)
@@ -0,0 +1,87 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_incremental.py
+
+# script description: this script tests that incremental plet module runs
+# (run_plet_bmp_change in main.py and run_kernel with earlier results in
+# plet_engine.py) match full runs
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pytest
+
+# custom plet functions
+import main as plet
+import plet_engine as engine
+from conftest import make_fields
+
+
+# %% ---- helper functions ----
+# check that result columns are the same (nan where the other is nan)
+def assert_same(a, b, cols):
+    for col in cols:
+        a_vals = np.asarray(a[col], dtype="float64")
+        b_vals = np.asarray(b[col], dtype="float64")
+        assert np.array_equal(a_vals, b_vals, equal_nan=True), col
+
+
+# kernel inputs of fields that were already run
+def kernel_inputs(field_gdf_final, lookups):
+    return engine.get_kernel_inputs(field_gdf_final, plet.gather_bmps(lookups, field_gdf_final)[1])
+
+
+# %% ---- tests ----
+def test_bmp_change_matches_full_run(lookups):
+    # new bmps (including a field with more than one bmp)
+    field_gdf = make_fields(200, seed=6)
+    field_gdf_final = plet.run_plet_gdf(field_gdf, lookups=lookups)
+    rng = np.random.default_rng(6)
+    bmp_name = list(rng.choice(["cov_crop_2", "grass_buffer_35ft", "bioreactor"], len(field_gdf)))
+    bmp_name[0] = ["cons_till_2", "cov_crop_2"]
+    bmp_ac = list(field_gdf["area_ac"].to_numpy() * rng.uniform(0, 1, len(field_gdf)))
+    bmp_ac[0] = [1.0, 2.0]
+
+    # only practice change steps run again
+    changed_gdf = plet.run_plet_bmp_change(field_gdf_final, bmp_name=bmp_name, bmp_ac=bmp_ac, lookups=lookups)
+
+    # full run with the new bmps
+    field_gdf["bmp_name"] = bmp_name
+    field_gdf["bmp_ac"] = bmp_ac
+    full_gdf = plet.run_plet_gdf(field_gdf, lookups=lookups)
+    assert_same(changed_gdf, full_gdf, engine.KERNEL_OUTPUTS)
+
+
+@pytest.mark.parametrize("col", ["aa_rain", "cn_value", "area_ac", "r_avg", "conc_n", "bmp_ac", "eff_val_sediment"])
+def test_incremental_kernel_matches_full_run(lookups, col):
+    # earlier run
+    cols = kernel_inputs(plet.run_plet_gdf(make_fields(200, seed=7), lookups=lookups), lookups)
+    prev_out = engine.run_kernel(cols)
+
+    # change one input for some fields
+    new_cols = dict(cols)
+    new_cols[col] = cols[col].copy()
+    new_cols[col][::3] *= 1.1
+
+    # same results as a full run
+    assert_same(engine.run_kernel(new_cols, prev=(cols, prev_out)), engine.run_kernel(new_cols), engine.KERNEL_OUTPUTS)
+
+
+def test_incremental_kernel_with_new_inputs_matches_full_run(lookups):
+    # earlier run without groundwater inputs
+    cols = kernel_inputs(plet.run_plet_gdf(make_fields(200, seed=7), lookups=lookups, groundwater=True), lookups)
+    prev_cols = {col: vals for col, vals in cols.items() if col not in engine.KERNEL_GW_INPUTS}
+    prev_out = engine.run_kernel(prev_cols)
+
+    # inputs that are not in the earlier run are changed
+    assert engine.changed_inputs(cols, prev_cols) == engine.KERNEL_GW_INPUTS
+    out_cols = engine.KERNEL_OUTPUTS + engine.KERNEL_GW_OUTPUTS
+    assert_same(engine.run_kernel(cols, prev=(prev_cols, prev_out)), engine.run_kernel(cols), out_cols)
@@ -0,0 +1,108 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_jobs.py
+
+# script description: this script tests the plet module job queue
+# (plet_jobs.py)
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+# custom plet functions
+import plet_jobs
+from conftest import make_features
+
+
+# %% ---- fixtures ----
+# job folder
+@pytest.fixture
+def job_path(tmp_path):
+    return str(tmp_path)
+
+
+# write a queued or running job status
+def write_job(job_path, status, host, pid, heartbeat_time):
+    job = {
+        "job_id": "0" * 32, "status": status, "n_fields": 4, "n_done": 0,
+        "submitted_at": "2025-01-06T00:00:00", "started_at": None,
+        "finished_at": None, "finished_time": None, "error": None,
+        "diagnostics": None, "host": host, "pid": pid,
+        "heartbeat_time": heartbeat_time}
+    plet_jobs.write_status(job, job_path)
+    return job
+
+
+# process id of a finished process
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+# %% ---- tests ----
+def test_job_with_dead_process_fails(job_path, dead_pid):
+    for status in ["queued", "running"]:
+        write_job(job_path, status, plet_jobs.HOST, dead_pid, time.time())
+        job = plet_jobs.get_job("0" * 32, job_path)
+        assert job["status"] == "failed"
+        assert str(dead_pid) in job["error"]
+        assert job["finished_time"] is not None
+
+        # failed status is written, so old failed jobs are deleted
+        with open(plet_jobs.job_file("0" * 32, "json", job_path)) as status_file:
+            assert json.load(status_file)["status"] == "failed"
+        plet_jobs.delete_old_jobs(job_path, ttl=0)
+        assert plet_jobs.get_job("0" * 32, job_path) is None
+
+
+def test_job_without_heartbeat_fails(job_path):
+    # other host (pid is not checked), old heartbeat
+    write_job(job_path, "running", "other_host", 1, time.time() - plet_jobs.JOB_STALE - 1)
+    job = plet_jobs.get_job("0" * 32, job_path)
+    assert job["status"] == "failed"
+    assert "heartbeats" in job["error"]
+
+
+def test_live_job_is_not_failed(job_path):
+    # this process, recent heartbeat
+    write_job(job_path, "running", plet_jobs.HOST, plet_jobs.os.getpid(), time.time())
+    assert plet_jobs.get_job("0" * 32, job_path)["status"] == "running"
+
+    # other host, queued (no heartbeat while queued)
+    write_job(job_path, "queued", "other_host", 1, time.time() - plet_jobs.JOB_STALE - 1)
+    assert plet_jobs.get_job("0" * 32, job_path)["status"] == "queued"
+
+
+def test_submitted_job_runs_in_other_process(job_path):
+    features = make_features(12, seed=3)
+    job = plet_jobs.submit_job(features, batch_size=5, job_path=job_path)
+    assert job["status"] == "queued"
+
+    # wait for the job process
+    deadline = time.time() + 120
+    while job["status"] in ["queued", "running"] and time.time() < deadline:
+        time.sleep(0.2)
+        job = plet_jobs.get_job(job["job_id"], job_path)
+    assert job["status"] == "done", job["error"]
+    assert job["n_done"] == 12
+    assert job["pid"] != plet_jobs.os.getpid()
+
+    # results
+    with open(plet_jobs.job_file(job["job_id"], "geojson", job_path)) as result_file:
+        result = json.load(result_file)
+    assert len(result["features"]) == 12
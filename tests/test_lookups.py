@@ -0,0 +1,56 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_lookups.py
+
+# script description: this script tests the plet module lookup registry
+# (plet_lookups.py)
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import shutil
+
+import pytest
+
+# custom plet functions
+import plet_lookups
+
+
+# %% ---- fixtures ----
+# copy of the lookup csv files (default registry is loaded again after)
+@pytest.fixture
+def lookup_copy(tmp_path):
+    lookup_path = str(tmp_path / "lookups")
+    shutil.copytree(plet_lookups.LOOKUP_PATH, lookup_path)
+    yield lookup_path
+    plet_lookups.load_lookups()
+
+
+# %% ---- tests ----
+def test_check_lookups_reloads_changed_csv(lookup_copy):
+    # no change, no reload
+    lookups = plet_lookups.load_lookups(lookup_copy, bundle_path=None)
+    assert not plet_lookups.check_lookups(force=True)
+    assert plet_lookups.get_lookups() is lookups
+
+    # changed csv file, reload
+    with open(lookup_copy + "/cn.csv", "a") as csv_file:
+        csv_file.write("\n")
+    assert plet_lookups.check_lookups(force=True)
+    assert plet_lookups.get_lookups()["version"] != lookups["version"]
+
+
+def test_check_lookups_waits(lookup_copy, monkeypatch):
+    # no check until LOOKUP_CHECK_SECONDS have passed
+    monkeypatch.setattr(plet_lookups, "LOOKUP_CHECK_SECONDS", 3600)
+    plet_lookups.load_lookups(lookup_copy, bundle_path=None)
+    with open(lookup_copy + "/cn.csv", "a") as csv_file:
+        csv_file.write("\n")
+    assert not plet_lookups.check_lookups()
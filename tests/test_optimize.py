@@ -0,0 +1,123 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_optimize.py
+
+# script description: this script tests the plet module bmp acreage
+# optimizer (plet_optimize.py) against a brute force search on small
+# farms
+
+# notes:
+# the brute force search tries every bmp (or none) for every field and
+# places the budget on the chosen bmps in order of reduction per cost
+# (the best placement for a given choice of bmps), using load
+# reductions from plet module runs with the bmp on no acres and on all
+# acres of each field
+
+# to do:
+
+
+# %% ---- load libraries ----
+import itertools
+
+import numpy as np
+import pytest
+
+# custom plet functions
+import main as plet
+import plet_optimize
+from conftest import make_fields
+
+
+# %% ---- test settings ----
+# candidate bmps
+CAND_BMPS = ["cov_crop_2", "grass_buffer_35ft", "cons_till_2"]
+
+# cost per acre of each candidate bmp
+CAND_COSTS = {"cov_crop_2": 40.0, "grass_buffer_35ft": 250.0, "cons_till_2": 15.0}
+
+
+# %% ---- helper functions ----
+# weighted load reduction per acre of each field (rows) and bmp (columns)
+def reduction_rates(field_gdf_final, weights, lookups):
+    area_ac = field_gdf_final["area_ac"].to_numpy(dtype="float64")
+    rates = np.zeros((len(field_gdf_final), len(CAND_BMPS)))
+    for j, bmp_name in enumerate(CAND_BMPS):
+        no_bmp = plet.run_plet_bmp_change(field_gdf_final, bmp_name=bmp_name, bmp_ac=0.0, lookups=lookups)
+        all_bmp = plet.run_plet_bmp_change(field_gdf_final, bmp_name=bmp_name, bmp_ac=area_ac, lookups=lookups)
+        for pollutant, weight in weights.items():
+            col = plet_optimize.OPT_LOADS[pollutant]
+            rates[:, j] += weight * np.nan_to_num((no_bmp[col].to_numpy() - all_bmp[col].to_numpy()) / area_ac)
+    return rates
+
+
+# best weighted load reduction by brute force
+def brute_force(rates, cost_ac, area_ac, budget):
+    best = 0.0
+    for choice in itertools.product(range(-1, len(CAND_BMPS)), repeat=len(area_ac)):
+        # chosen bmp of each field (fields without one are left out)
+        fields = [i for i, j in enumerate(choice) if j >= 0 and rates[i, j] > 0]
+        fields.sort(key=lambda i: -rates[i, choice[i]] / cost_ac[choice[i]])
+
+        # place the budget in order of reduction per cost
+        left = budget
+        value = 0.0
+        for i in fields:
+            acres = min(area_ac[i], left / cost_ac[choice[i]])
+            value += rates[i, choice[i]] * acres
+            left -= cost_ac[choice[i]] * acres
+        best = max(best, value)
+    return best
+
+
+# %% ---- tests ----
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("budget_frac", [0.0, 0.2, 0.5, 2.0])
+@pytest.mark.parametrize("use_cost", [False, True])
+def test_optimizer_matches_brute_force(lookups, seed, budget_frac, use_cost):
+    # small farm (cropland and pastureland fields)
+    field_gdf = make_fields(4, seed=seed)
+    field_gdf["user_lu"] = ["cropland", "pastureland", "cropland", "pastureland"]
+    field_gdf["fips"] = 17113
+    field_gdf_final = plet.run_plet_gdf(field_gdf, lookups=lookups)
+    area_ac = field_gdf_final["area_ac"].to_numpy(dtype="float64")
+
+    # budget (acres or cost)
+    weights = {"n": 1.0, "s": 10.0}
+    bmp_cost = CAND_COSTS if use_cost else None
+    cost_ac = np.array([CAND_COSTS[bmp_name] if use_cost else 1.0 for bmp_name in CAND_BMPS])
+    budget = budget_frac * float(np.sum(area_ac * cost_ac.mean()))
+
+    # optimizer
+    alloc_df = plet_optimize.run_bmp_optimizer(field_gdf_final, budget, bmp_names=CAND_BMPS, bmp_cost=bmp_cost, weights=weights, lookups=lookups)
+    assert alloc_df["bmp_cost"].sum() <= budget * (1 + 1e-12)
+    assert (alloc_df["bmp_ac"].to_numpy() <= area_ac).all()
+    value = sum(weight * alloc_df["red_" + pollutant].sum() for pollutant, weight in weights.items())
+
+    # brute force
+    rates = reduction_rates(field_gdf_final, weights, lookups)
+    best = brute_force(rates, cost_ac, area_ac, budget)
+
+    # no better than brute force, and within one field of it (exact
+    # when every field gets all of its acres or none)
+    one_field = np.max(rates * np.minimum(area_ac[:, None], budget / cost_ac[None, :]))
+    assert value <= best * (1 + 1e-9)
+    assert value >= best - one_field * (1 + 1e-9)
+    if budget_frac == 0.0 or budget_frac == 2.0:
+        assert value == pytest.approx(best, rel=1e-9)
+
+
+def test_optimizer_reductions_match_plet_runs(lookups):
+    field_gdf_final = plet.run_plet_gdf(make_fields(6, seed=4), lookups=lookups)
+    alloc_df = plet_optimize.run_bmp_optimizer(field_gdf_final, 300.0, bmp_names=CAND_BMPS, weights={"s": 1.0}, lookups=lookups)
+
+    # practice change sediment load with no bmp acres and with the
+    # allocated acres (fields without a bmp keep no bmp acres)
+    bmp_name = alloc_df["bmp_name"].fillna(CAND_BMPS[0]).to_list()
+    no_bmp = plet.run_plet_bmp_change(field_gdf_final, bmp_name=bmp_name, bmp_ac=0.0, lookups=lookups)
+    alloc = plet.run_plet_bmp_change(field_gdf_final, bmp_name=bmp_name, bmp_ac=alloc_df["bmp_ac"].to_numpy(), lookups=lookups)
+    reduction = np.nan_to_num(no_bmp["p_run_s"].to_numpy() - alloc["p_run_s"].to_numpy())
+    np.testing.assert_allclose(alloc_df["red_s"].to_numpy(), reduction, rtol=1e-9, atol=1e-12)
@@ -0,0 +1,59 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_scenarios.py
+
+# script description: this script tests that bmp scenario runs
+# (run_plet_scenarios in main.py and run_kernel_scenarios in
+# plet_engine.py) match full plet module runs with each bmp
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pytest
+
+# custom plet functions
+import main as plet
+import plet_engine as engine
+from conftest import make_fields
+
+
+# %% ---- tests ----
+@pytest.mark.parametrize(
+    "bmp_names, bmp_ac",
+    [(None, None), (["cov_crop_2", "grass_buffer_35ft", "terrace"], None), (["cons_till_2", "bioreactor"], 5.0)],
+    ids=["all_bmps", "bmp_names", "bmp_ac"])
+def test_scenarios_match_full_runs(lookups, bmp_names, bmp_ac):
+    # fields (including a field with more than one bmp)
+    field_gdf = make_fields(60, seed=10)
+    bmp_name = list(field_gdf["bmp_name"])
+    bmp_name[0] = ["cons_till_2", "cov_crop_2"]
+    bmp_ac_list = list(field_gdf["bmp_ac"])
+    bmp_ac_list[0] = [1.0, 2.0]
+    field_gdf["bmp_name"] = bmp_name
+    field_gdf["bmp_ac"] = bmp_ac_list
+    field_gdf_final = plet.run_plet_gdf(field_gdf, lookups=lookups)
+
+    # all scenarios in one pass
+    scenario_df = plet.run_plet_scenarios(field_gdf_final, bmp_names=bmp_names, bmp_ac=bmp_ac, lookups=lookups)
+    assert len(scenario_df) > len(field_gdf)
+
+    # full run of each field with the bmp of each scenario row
+    full_gdf = field_gdf.loc[scenario_df["field"].to_numpy()].reset_index(drop=True)
+    full_gdf["bmp_name"] = scenario_df["bmp_name"].astype(object).to_numpy()
+    full_gdf["bmp_ac"] = scenario_df["bmp_ac"].to_numpy()
+    full_gdf_final = plet.run_plet_gdf(full_gdf, lookups=lookups)
+
+    # same results for each row
+    for col in engine.KERNEL_OUTPUTS:
+        if col in scenario_df.columns:
+            assert np.array_equal(
+                scenario_df[col].to_numpy(dtype="float64"), full_gdf_final[col].to_numpy(dtype="float64"),
+                equal_nan=True), col
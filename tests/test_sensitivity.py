@@ -0,0 +1,79 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_sensitivity.py
+
+# script description: this script tests the plet module global
+# sensitivity analysis (plet_sensitivity.py)
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pandas as pd
+import pytest
+
+# custom plet functions
+import main as plet
+import plet_sensitivity
+from conftest import make_fields
+
+
+# %% ---- test settings ----
+# bmp efficiencies and the practice change load of each pollutant
+EFF_RANGES = {"eff_val_nitrogen": 0.25, "eff_val_phosphorus": 0.25, "eff_val_sediment": 0.25}
+EFF_OUTPUTS = {"eff_val_nitrogen": "p_run_n", "eff_val_phosphorus": "p_run_p", "eff_val_sediment": "p_run_s"}
+
+
+# %% ---- fixtures ----
+# fields that were already run
+@pytest.fixture(scope="module")
+def field_gdf_final(lookups):
+    return plet.run_plet_gdf(make_fields(40, seed=16), lookups=lookups)
+
+
+# %% ---- tests ----
+def test_own_efficiency_explains_practice_change_load(field_gdf_final, lookups):
+    tables = plet_sensitivity.run_sobol(
+        field_gdf_final, n_base=512, ranges=EFF_RANGES, outputs=list(EFF_OUTPUTS.values()), seed=1, lookups=lookups)
+    for eff_col, out_col in EFF_OUTPUTS.items():
+        # fields with a bmp efficiency value for the pollutant
+        has_eff = (field_gdf_final[eff_col].to_numpy(dtype="float64", na_value=np.nan) > 0) & field_gdf_final[out_col].notna().to_numpy()
+        assert has_eff.sum() > 5
+        table = tables[out_col]
+
+        # own efficiency explains all of the variance, others none of it
+        for input_col in EFF_RANGES:
+            input_table = table.xs(input_col, level="input")[has_eff]
+            expected = 1.0 if input_col == eff_col else 0.0
+            np.testing.assert_allclose(input_table["s1"], expected, atol=0.1, err_msg=out_col + " / " + input_col)
+            np.testing.assert_allclose(input_table["st"], expected, atol=0.1, err_msg=out_col + " / " + input_col)
+
+
+@pytest.mark.parametrize("method", ["run_sobol", "run_morris"])
+def test_process_pool_gives_same_results(field_gdf_final, lookups, monkeypatch, method):
+    # more than one chunk of fields
+    monkeypatch.setattr(plet_sensitivity, "CHUNK_ROWS", 2000)
+    run = getattr(plet_sensitivity, method)
+    one_tables = run(field_gdf_final, seed=2, n_workers=1, lookups=lookups)
+    two_tables = run(field_gdf_final, seed=2, n_workers=2, lookups=lookups)
+    for col in plet_sensitivity.SA_OUTPUTS:
+        pd.testing.assert_frame_equal(one_tables[col], two_tables[col])
+
+
+def test_constant_outputs_give_nan(field_gdf_final, lookups):
+    # baseline loads do not depend on the bmp efficiencies
+    out_cols = ["b_run_n", "b_run_p"]
+    sobol_tables = plet_sensitivity.run_sobol(
+        field_gdf_final, n_base=256, ranges=EFF_RANGES, outputs=out_cols, seed=3, lookups=lookups)
+    morris_tables = plet_sensitivity.run_morris(
+        field_gdf_final, n_traj=20, ranges=EFF_RANGES, outputs=out_cols, seed=3, lookups=lookups)
+    for col in out_cols:
+        assert sobol_tables[col].isna().all().all(), col
+        assert morris_tables[col].isna().all().all(), col
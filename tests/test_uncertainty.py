@@ -0,0 +1,69 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_uncertainty.py
+
+# script description: this script tests the plet module monte carlo
+# uncertainty engine (plet_uncertainty.py)
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# custom plet functions
+import main as plet
+import plet_uncertainty
+from conftest import make_fields
+
+
+# %% ---- tests ----
+def test_zero_spread_matches_plet_run(lookups):
+    # all parameters are sampled, but every draw is the point estimate
+    field_gdf_final = plet.run_plet_gdf(make_fields(100, seed=13), lookups=lookups)
+    distributions = {col: (distribution, 0.0) for col, (distribution, _) in plet_uncertainty.DEFAULT_DISTRIBUTIONS.items()}
+    mc_df = plet_uncertainty.run_monte_carlo(
+        field_gdf_final, n_draws=20, distributions=distributions, seed=1, chunk_rows=500, lookups=lookups)
+
+    # median is the plet module result
+    for col in plet_uncertainty.MC_OUTPUTS:
+        assert np.array_equal(
+            mc_df[col + "_p50"].to_numpy(), field_gdf_final[col].to_numpy(dtype="float64"), equal_nan=True), col
+
+
+def test_row_percentiles_match_nanpercentile():
+    # draws with some nan values (and a row that is all nan)
+    rng = np.random.default_rng(14)
+    draws = rng.lognormal(0, 1, (200, 51))
+    draws[rng.random(draws.shape) < 0.2] = np.nan
+    draws[0] = np.nan
+    draws[1, 1:] = np.nan
+    percentiles = [0, 2.5, 5, 50, 95, 97.5, 100]
+
+    # same as np.nanpercentile (which warns for the all nan row)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        expected = np.nanpercentile(draws, percentiles, axis=1).T
+    np.testing.assert_allclose(plet_uncertainty.row_percentiles(draws, percentiles), expected, rtol=1e-12)
+
+
+def test_fixed_seed_gives_same_results(lookups):
+    # more than one chunk of fields
+    field_gdf_final = plet.run_plet_gdf(make_fields(60, seed=15), lookups=lookups)
+    mc_dfs = [
+        plet_uncertainty.run_monte_carlo(field_gdf_final, n_draws=50, seed=7, chunk_rows=500, lookups=lookups)
+        for _ in range(2)]
+    pd.testing.assert_frame_equal(mc_dfs[0], mc_dfs[1])
+
+    # other seed gives other results
+    other_df = plet_uncertainty.run_monte_carlo(field_gdf_final, n_draws=50, seed=8, chunk_rows=500, lookups=lookups)
+    assert not mc_dfs[0].equals(other_df)
@@ -0,0 +1,63 @@
+# %% --- header ---
+
+# author: sheila saia
+# date created: 2025-01-06
+# email: sheila.saia@tetratech.com
+
+# script name: test_years.py
+
+# script description: this script tests that plet module runs for many
+# years of precipitation inputs (run_plet_years in main.py) match full
+# runs of each field and year
+
+# notes:
+
+# to do:
+
+
+# %% ---- load libraries ----
+import numpy as np
+import pandas as pd
+import pytest
+
+# custom plet functions
+import main as plet
+from conftest import make_fields
+
+
+# %% ---- tests ----
+@pytest.mark.parametrize("year_cols", [["aa_rain"], ["aa_rain", "r_cor", "rd_cor", "rain_days"]])
+def test_years_match_full_runs(lookups, year_cols):
+    # fields (including a field with more than one bmp)
+    field_gdf = make_fields(50, seed=17)
+    bmp_name = list(field_gdf["bmp_name"])
+    bmp_name[0] = ["cons_till_2", "cov_crop_2"]
+    bmp_ac = list(field_gdf["bmp_ac"])
+    bmp_ac[0] = [1.0, 2.0]
+    field_gdf["bmp_name"] = bmp_name
+    field_gdf["bmp_ac"] = bmp_ac
+    field_gdf_final = plet.run_plet_gdf(field_gdf, lookups=lookups)
+
+    # precipitation inputs of each field and year (some fields do not
+    # have every year)
+    rng = np.random.default_rng(17)
+    year_df = pd.DataFrame(
+        [(field, year) for field in field_gdf.index for year in [2020, 2021, 2022]], columns=["field", "year"])
+    year_df = year_df[rng.random(len(year_df)) < 0.8].reset_index(drop=True)
+    for col in year_cols:
+        year_df[col] = field_gdf.loc[year_df["field"], col].to_numpy() * rng.uniform(0.5, 1.5, len(year_df))
+    year_results = plet.run_plet_years(field_gdf_final, year_df, lookups=lookups)
+
+    # full run of one copy of each field for each year
+    full_gdf = field_gdf.loc[year_df["field"]].reset_index(drop=True)
+    for col in year_cols:
+        full_gdf[col] = year_df[col].to_numpy()
+    full_gdf_final = plet.run_plet_gdf(full_gdf, lookups=lookups)
+
+    # same results (bit for bit)
+    result_cols = [col for col in year_results.columns if col not in ["field", "year"]]
+    assert "p_run_n" in result_cols
+    for col in result_cols:
+        assert np.array_equal(
+            year_results[col].to_numpy(dtype="float64"), full_gdf_final[col].to_numpy(dtype="float64"),
+            equal_nan=True), col